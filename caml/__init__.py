@@ -1 +1,3 @@
-from caml.caml import Caml
\ No newline at end of file
+from caml.caml import AsyncCaml, Caml
+from caml.context import CamlClusters
+from caml.kube.informer import CONSISTENCY
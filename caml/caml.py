@@ -1,20 +1,103 @@
 import os
 import pathlib
 
-from kubernetes import client
+from kubernetes_asyncio import client as async_client
 
 from .config import CamlConfig
+from .kube.api import DEFAULT_POOL_SIZE, KubeApi
 from .kube.consts import CAML_COMPUTE_NAMESPACE, CAML_INFRA_NAMESPACE
-from .kube.utils import replace_yaml_placeholders
-from .modules.projects import ProjectsClient
+from .kube.informer import CONSISTENCY
+from .kube.installer import (STEP_TIMEOUT, CamlInstaller, InstallStep, is_crd_established, is_namespace_active,
+                             wait_for_resource)
+from .kube.sharding import ShardingPolicy, migrate_projects
+from .kube.templates import render_template
+from .modules.projects import AsyncProjectsClient, ProjectsClient
+from .modules.workspaces import (ROUTING_MODE, WORKSPACES, AsyncWorkspaceEventHub, IdleCuller, WarmPool,
+                                 WorkspaceGateway, get_image_cache, get_warm_pools)
+from .modules.workspaces.image_cache import apply_prepuller
+
+# Max parallel connections the asyncio api client keeps open to the API server
+ASYNC_CONNECTION_POOL_SIZE = 100
 
 
 class Caml:
-    def __init__(self, kube_config=None):
+    def __init__(self, kube_config=None, consistency=CONSISTENCY.CACHED, pool_size=DEFAULT_POOL_SIZE, sharding=None,
+                 routing=ROUTING_MODE.LOAD_BALANCER, compute_node_selector=None):
+        """
+        @param kube_config: [String] The path to the kube config file.
+        @param consistency: [CONSISTENCY] Default read consistency, CACHED reads are served by a watch backed cache
+        @param pool_size: [Integer] Max keep-alive connections to the API server, shared by all of the clients
+        @param sharding: [ShardingPolicy] The namespace placement of the projects (defaults to the compute namespace)
+        @param routing: [ROUTING_MODE] How the workspaces are reached, GATEWAY serves them all through WorkspaceGateway
+        @param compute_node_selector: [Dict] Labels of the compute nodes, the selector CAML was deployed with
+                                      (defaults to every node)
+        """
         self.config = CamlConfig(kube_config)
+        self.consistency = consistency
+        self.sharding = sharding or ShardingPolicy()
+        self.routing = routing
+        self.api = KubeApi(configuration=self.config.configuration, pool_size=pool_size)
+        # Shared with the workspaces clients of the api, only the nodes the pre-puller runs on decide on pinning
+        self.image_cache = get_image_cache(self.api, node_selector=compute_node_selector)
 
         self._init_clients()
 
+    def pool_stats(self):
+        """
+        @return: [Dict] Per host statistics of the shared connection pool
+        """
+        return self.api.pool_stats()
+
+    def close(self):
+        """
+        Stops the projects cache and closes the pooled connections
+        @return: None
+        """
+        self.projects.close()
+        self.api.close()
+
+    def add_warm_pool(self, ws_class, size, namespace=None, **resources):
+        """
+        Keeps idle, ready pods of a workspace profile, so new workspaces of the profile start without a cold start
+        @param ws_class: The workspace class (for example WORKSPACES.JUPYTER_NOTEBOOK)
+        @param size: [Integer] Number of idle pods to keep
+        @param namespace: [String] The namespace of the workspaces the pool serves (defaults to the compute namespace)
+        @param resources: The workspace arguments of the profile (for example cpu=4, memory=8)
+        @return: [WarmPool] The started pool, see WarmPool.stats() for its hit rate and claim latency
+        """
+        if hasattr(ws_class, "IMAGE") and "image" not in resources:
+            # The pods must run the image reference and pull policy the workspaces clients start the workspaces with
+            image, image_pull_policy = self.image_cache.resolve(ws_class.IMAGE)
+            resources.update(image=image, image_pull_policy=image_pull_policy)
+        pool = WarmPool(ws_class, size, namespace=namespace or self.sharding.namespace, api=self.api,
+                        routing=self.routing, **resources)
+        return get_warm_pools().add(pool)
+
+    def image_cache_status(self, images=None):
+        """
+        Reports which workspace images every compute node holds (kept pulled by the image pre-puller)
+        @param images: [List] The images to check (defaults to the images of every registered workspace type)
+        @return: [List] NodeImageStatus per node
+        """
+        return self.image_cache.status(images or WORKSPACES.images())
+
+    def create_idle_culler(self, **kwargs):
+        """
+        Creates a culler that scales the idle workspaces of this instance's projects to zero, start() it to run it
+        in the background or call run_once()
+        @param kwargs: The IdleCuller arguments (probes, idle_timeout, interval, dry_run)
+        @return: IdleCuller
+        """
+        return IdleCuller(api=self.api, sharding=self.sharding, **kwargs)
+
+    def migrate_projects(self, dry_run=False):
+        """
+        Moves the existing projects and their workspaces to the namespaces of this instance's sharding policy
+        @param dry_run: [Boolean] Only report the projects that would be moved
+        @return: [List] MigrationResult per moved project
+        """
+        return migrate_projects(self.sharding, api=self.api, dry_run=dry_run)
+
     @staticmethod
     def deploy_caml(kube_config: str, **kwargs):
         """
@@ -24,42 +107,72 @@ class Caml:
 
         :param caml_infra_namespace: [String] Override default caml infra namespace.
         :param caml_compute_namespace: [String] Override default caml compute namespace.
-        :return: None
+        :param step_timeout: [Integer] Max seconds to wait for each resource to become ready.
+        :param sharding: [ShardingPolicy] Pre-creates the shard namespaces of a policy with a fixed set of them.
+        :param prepull_images: [Boolean] Keep the workspace images pulled on every compute node (default True).
+        :param compute_node_selector: [Dict] Labels of the compute nodes (defaults to every node), pass the same
+                                      selector to Caml.
+        :return: [List] The install steps and their timings
         """
 
         # Handle kwargs
         caml_infra_namespace = kwargs.get("caml_infra_namespace", CAML_INFRA_NAMESPACE)
         caml_compute_namespace = kwargs.get("caml_compute_namespace", CAML_COMPUTE_NAMESPACE)
+        step_timeout = kwargs.get("step_timeout", STEP_TIMEOUT)
+        sharding = kwargs.get("sharding") or ShardingPolicy(namespace=caml_compute_namespace)
+        prepull_images = kwargs.get("prepull_images", True)
+        compute_node_selector = kwargs.get("compute_node_selector")
 
         print("init kube config")
-        CamlConfig(kube_config)
+        api = KubeApi(configuration=CamlConfig(kube_config).configuration)
 
-        core_api = client.CoreV1Api()
-        api_reg_api = client.ApiextensionsV1Api()
+        core_api = api.core
+        api_reg_api = api.apiextensions
         schema_path = os.path.join(pathlib.Path(__file__).parent, "kube/schemas")
 
-        print("creating infra namespace")
-        infra_namespace_body = replace_yaml_placeholders(f"{schema_path}/namespace.yml", {
-            "NAMESPACE_NAME": caml_infra_namespace
-        })
-        infra_namespace = core_api.create_namespace(body=infra_namespace_body)
+        def namespace_step(name, body=None):
+            body = body or render_template(f"{schema_path}/namespace.yml", {"NAMESPACE_NAME": name})
+            return InstallStep(
+                name=f"namespace/{name}",
+                create=lambda: core_api.create_namespace(body=body),
+                wait_ready=lambda timeout: wait_for_resource(core_api.list_namespace, name, is_namespace_active,
+                                                             timeout),
+                timeout=step_timeout
+            )
 
-        print("creating compute namespace")
-        compute_namespace_body = replace_yaml_placeholders(f"{schema_path}/namespace.yml", {
-            "NAMESPACE_NAME": caml_compute_namespace
-        })
-        compute_namespace = core_api.create_namespace(body=compute_namespace_body)
+        project_resource_body = render_template(f"{schema_path}/project.yml", {})
+        project_resource_name = project_resource_body["metadata"]["name"]
 
-        print("creating custom resources")
-        # Projects
-        project_resource_body = replace_yaml_placeholders(f"{schema_path}/project.yml", {})
-        api_reg_api.create_custom_resource_definition(project_resource_body)
+        # The per project shards are created with their project
+        shard_steps = [namespace_step(name, sharding.namespace_body(name))
+                       for name in (sharding.namespaces() or []) if name != caml_compute_namespace]
 
-        if infra_namespace.status.phase == "Active" and compute_namespace.status.phase == "Active":
-            print("yayy")
-        else:
-            print("nayy")
+        # Pulling the images may take minutes, the nodes report their progress (see image_cache_status)
+        prepuller_steps = [InstallStep(
+            name="daemonset/image-prepuller",
+            create=lambda: apply_prepuller(api, WORKSPACES.images(), caml_infra_namespace, compute_node_selector),
+            depends_on=[f"namespace/{caml_infra_namespace}"],
+            timeout=step_timeout
+        )] if prepull_images else []
 
+        installer = CamlInstaller([
+            namespace_step(caml_infra_namespace),
+            namespace_step(caml_compute_namespace),
+            *shard_steps,
+            InstallStep(
+                name="crd/projects",
+                create=lambda: api_reg_api.create_custom_resource_definition(project_resource_body),
+                wait_ready=lambda timeout: wait_for_resource(api_reg_api.list_custom_resource_definition,
+                                                             project_resource_name, is_crd_established, timeout),
+                timeout=step_timeout
+            ),
+            *prepuller_steps,
+        ])
+
+        print("installing caml")
+        steps = installer.run()
+        print(installer.report())
+        return steps
 
     @staticmethod
     def destroy_caml(kube_config: str, **kwargs):
@@ -70,16 +183,14 @@ class Caml:
         :return:
         """
         print("init kube config")
-        CamlConfig(kube_config)
+        api = KubeApi(configuration=CamlConfig(kube_config).configuration)
 
         # TODO: fix
         print("deleting caml")
-        core_api = client.CoreV1Api()
-        core_api.delete_namespace(name=CAML_INFRA_NAMESPACE)
-        core_api.delete_namespace(name=CAML_COMPUTE_NAMESPACE)
+        api.core.delete_namespace(name=CAML_INFRA_NAMESPACE)
+        api.core.delete_namespace(name=CAML_COMPUTE_NAMESPACE)
 
-        api_reg_api = client.ApiextensionsV1Api()
-        api_reg_api.delete_custom_resource_definition(name="projects.extensions.caml.io")
+        api.apiextensions.delete_custom_resource_definition(name="projects.extensions.caml.io")
 
 
     @staticmethod
@@ -92,5 +203,91 @@ class Caml:
         @return: None
         """
 
-        self.projects = ProjectsClient()
+        self.projects = ProjectsClient(consistency=self.consistency, api=self.api, sharding=self.sharding,
+                                       routing=self.routing)
+
+
+class AsyncCaml:
+    """
+    The asyncio entrypoint of the SDK.
+    All of the clients share a single non-blocking api client (and its connection pool), call connect() before use.
+    """
+
+    def __init__(self, kube_config=None, consistency=CONSISTENCY.CACHED, pool_size=ASYNC_CONNECTION_POOL_SIZE,
+                 sharding=None, routing=ROUTING_MODE.LOAD_BALANCER):
+        """
+        @param kube_config: [String] The path to the kube config file.
+        @param consistency: [CONSISTENCY] Default read consistency, CACHED reads are served by a watch backed cache
+        @param pool_size: [Integer] Max parallel connections to the API server
+        @param sharding: [ShardingPolicy] The namespace placement of the projects (defaults to the compute namespace)
+        @param routing: [ROUTING_MODE] How the workspaces are reached, GATEWAY serves them all through WorkspaceGateway
+        """
+        self.kube_config = kube_config
+        self.consistency = consistency
+        self.pool_size = pool_size
+        self.sharding = sharding or ShardingPolicy()
+        self.routing = routing
+
+        self.api_client = None
+        self.projects = None
+        self.workspace_events = None
+
+    async def connect(self):
+        """
+        Loads the kube config and opens the shared api client
+        @return: None
+        """
+        configuration = async_client.Configuration()
+        await CamlConfig.load_async_kube_config(configuration, self.kube_config)
+        configuration.connection_pool_maxsize = self.pool_size
+
+        self.api_client = async_client.ApiClient(configuration)
+        self._init_clients()
+
+    def create_gateway(self, **kwargs):
+        """
+        Creates the gateway that routes /{project}/{workspace}/ to the workspaces, serve its app() (or run_gateway)
+        from the connected event loop
+        @param kwargs: The WorkspaceGateway arguments (resume_timeout, activity_interval, pool_size, pool_size_per_host)
+        @return: WorkspaceGateway
+        """
+        return WorkspaceGateway(self.api_client, sharding=self.sharding, events=self.workspace_events, **kwargs)
+
+    async def close(self):
+        """
+        Closes the shared api client and its connections
+        @return: None
+        """
+        if self.projects and self.projects.informer:
+            self.projects.informer.stop()
+        if self.workspace_events:
+            # The watch uses the api client, stop it first
+            await self.workspace_events.close()
+            self.workspace_events = None
+        if self.api_client:
+            await self.api_client.close()
+            self.api_client = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _init_clients(self):
+        """
+        Sets up the clients that are exposed to the user.
+        @return: None
+        """
+        informer = None
+        if self.consistency == CONSISTENCY.CACHED:
+            # The cache is fed by a background watch thread, reads from it never block the event loop
+            api = KubeApi(configuration=CamlConfig(self.kube_config).configuration)
+            informer = ProjectsClient(consistency=self.consistency, api=api, sharding=self.sharding).informer
 
+        # Lazy, the pod watch starts with the first subscriber
+        self.workspace_events = AsyncWorkspaceEventHub(self.api_client, sharding=self.sharding)
+        self.projects = AsyncProjectsClient(self.api_client, informer=informer, consistency=self.consistency,
+                                            sharding=self.sharding, events=self.workspace_events,
+                                            routing=self.routing)
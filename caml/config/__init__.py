@@ -1 +1,2 @@
 from .config import CamlConfig
+from .credentials import CredentialManager, get_credential_manager
@@ -1,6 +1,9 @@
 import os
 
-from kubernetes import config
+from kubernetes import client
+from kubernetes_asyncio import config as async_config
+
+from .credentials import get_credential_manager
 
 CONFIG_FOLDER = os.path.join(os.path.expanduser("~"), ".caml")
 CONFIG_FILE_NAME = os.path.join(CONFIG_FOLDER, "config.json")
@@ -10,18 +13,46 @@ CONFIG_KUBE_FILE_NAME = os.path.join(CONFIG_FOLDER, "caml-kube-config")
 class CamlConfig:
     def __init__(self, kube_config=None):
         # Init the kube config globally
-        CamlConfig.load_kube_config(kube_config)
+        self.configuration = CamlConfig.load_kube_config(kube_config)
+
+    @staticmethod
+    def resolve_kube_config(kube_config=None):
+        """
+        Returns the kube config file to use: the given config, the local setup or None inside of the cluster
+        :param kube_config: [String] The path to the kube config file.
+        :return: [String] The kube config path, None for the in-cluster config
+        """
+        if kube_config:
+            return kube_config
+        if os.path.exists(CONFIG_KUBE_FILE_NAME):
+            return CONFIG_KUBE_FILE_NAME
+        # To use the CLI/SDK inside of the cluster
+        return None
 
     @staticmethod
     def load_kube_config(kube_config=None):
         """
-        Inits the kube config from either the given config, local setup or kubernetes cloud
+        Inits the kube config from either the given config, local setup or kubernetes cloud.
+        The config is loaded once per process (and again only if the file changes), its tokens are refreshed
+        in the background by the credential manager.
+        :param kube_config: [String] The path to the kube config file.
+        :return: [kubernetes.client.Configuration] The shared configuration
+        """
+        configuration = get_credential_manager().get_configuration(CamlConfig.resolve_kube_config(kube_config))
+        client.Configuration.set_default(configuration)
+        return configuration
+
+    @staticmethod
+    async def load_async_kube_config(client_configuration, kube_config=None):
+        """
+        Loads the kube config into the given asyncio client configuration, using the same lookup order
+        :param client_configuration: [kubernetes_asyncio.client.Configuration] The configuration to fill
+        :param kube_config: [String] The path to the kube config file.
         :return: None
         """
+        kube_config = CamlConfig.resolve_kube_config(kube_config)
         if kube_config:
-            config.load_kube_config(config_file=kube_config)
-        elif os.path.exists(CONFIG_KUBE_FILE_NAME):
-            config.load_kube_config(config_file=CONFIG_KUBE_FILE_NAME)
+            await async_config.load_kube_config(config_file=kube_config, client_configuration=client_configuration)
         else:
             # To use the CLI/SDK inside of the cluster
-            config.load_incluster_config()
+            async_config.load_incluster_config(client_configuration=client_configuration)
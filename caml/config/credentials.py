@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import yaml
+from kubernetes import client, config
+from kubernetes.config.kube_config import KubeConfigLoader
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a token expires that it is refreshed in the background
+TOKEN_REFRESH_MARGIN = 60
+# Seconds to wait before retrying a refresh that failed
+TOKEN_RETRY_INTERVAL = 10
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+class _Credentials:
+    def __init__(self, path, configuration):
+        self.path = path
+        self.configuration = configuration
+        self.file_version = None
+        self.loader = None
+        self.retry_at = None
+
+    @property
+    def expiry(self):
+        """
+        :return: [datetime] When the current token expires, None for tokens that do not expire
+        """
+        expiry = getattr(self.loader, "expiry", None)
+        if expiry is not None and expiry.tzinfo is None:
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        return expiry
+
+
+class CredentialManager:
+    """
+    Process wide cache of the loaded kube configs.
+    Every kube config is parsed (and its auth plugin executed) once, later loads return the same
+    kubernetes Configuration as long as the file did not change.
+    Short lived tokens are refreshed in the background shortly before they expire, in place, so every api client
+    that was built from the configuration keeps working without paying for the refresh on a request.
+    """
+
+    def __init__(self, refresh_margin=TOKEN_REFRESH_MARGIN, retry_interval=TOKEN_RETRY_INTERVAL):
+        """
+        :param refresh_margin: [Float] Seconds before a token expires that it is refreshed
+        :param retry_interval: [Float] Seconds to wait before retrying a refresh that failed
+        """
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+
+        self._credentials = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def get_configuration(self, path=None):
+        """
+        Returns the configuration of the given kube config, it is loaded only on first use or after the file changed
+        :param path: [String] The kube config file path, None for the in-cluster service account
+        :return: [kubernetes.client.Configuration] The cached configuration (shared, do not modify)
+        """
+        path = os.path.abspath(path) if path else None
+        file_version = self._file_version(path)
+
+        with self._condition:
+            credentials = self._credentials.get(path)
+            if credentials and credentials.file_version == file_version:
+                return credentials.configuration
+
+            if credentials is None:
+                credentials = _Credentials(path, client.Configuration())
+
+            # A changed file is reloaded into the same configuration so existing api clients pick up the new token
+            self._load(credentials)
+            credentials.file_version = file_version
+            self._credentials[path] = credentials
+
+            if credentials.expiry:
+                self._start()
+            self._condition.notify()
+            return credentials.configuration
+
+    def invalidate(self, path=None):
+        """
+        Drops the cached configuration, the next get_configuration() loads it again
+        :param path: [String] The kube config file path, None for the in-cluster service account
+        :return: None
+        """
+        with self._condition:
+            self._credentials.pop(os.path.abspath(path) if path else None, None)
+
+    def stop(self):
+        """
+        Stops the background refresh thread
+        :return: None
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    @staticmethod
+    def _file_version(path):
+        if path is None:
+            return None
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _load(credentials):
+        if credentials.path is None:
+            # The in-cluster loader already re-reads the projected service account token on its own
+            config.load_incluster_config(client_configuration=credentials.configuration)
+            return
+
+        with open(credentials.path) as f:
+            config_dict = yaml.safe_load(f)
+
+        loader = KubeConfigLoader(config_dict=config_dict,
+                                  config_base_path=os.path.dirname(credentials.path))
+        loader.load_and_set(credentials.configuration)
+        credentials.loader = loader
+        credentials.retry_at = None
+
+    def _start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._refresh_loop, name="caml-credentials", daemon=True)
+        self._thread.start()
+
+    def _next_refresh(self, credentials):
+        if credentials.retry_at:
+            return credentials.retry_at
+        expiry = credentials.expiry
+        return expiry.timestamp() - self.refresh_margin if expiry else None
+
+    def _refresh_loop(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                now = datetime.now(timezone.utc).timestamp()
+                due = []
+                timeout = None
+
+                for credentials in self._credentials.values():
+                    refresh_at = self._next_refresh(credentials)
+                    if refresh_at is None:
+                        continue
+                    if refresh_at <= now:
+                        due.append(credentials)
+                        continue
+                    remaining = refresh_at - now
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+
+                if not due:
+                    self._condition.wait(timeout)
+                    continue
+
+            # The auth plugin may take seconds, get_configuration() must not wait for it
+            for credentials in due:
+                self._refresh(credentials, now)
+
+    def _refresh(self, credentials, now):
+        try:
+            credentials.loader.load_and_set(credentials.configuration)
+            credentials.retry_at = None
+            logger.debug(f"refreshed the credentials of {credentials.path}, valid until {credentials.expiry}")
+        except Exception as e:
+            # The token is still valid until it expires, requests also refresh it on their own once it does
+            logger.warning(f"failed to refresh the credentials of {credentials.path}: {e}")
+            credentials.retry_at = now + self.retry_interval
+            return
+
+        expiry = credentials.expiry
+        if expiry and expiry.timestamp() - self.refresh_margin <= now:
+            # A token that is shorter lived than the margin is refreshed on every retry interval instead of busy looping
+            credentials.retry_at = now + self.retry_interval
+
+
+def get_credential_manager():
+    """
+    Returns the process wide CredentialManager
+    :return: CredentialManager
+    """
+    global _default_manager
+    if _default_manager is None:
+        with _default_manager_lock:
+            if _default_manager is None:
+                _default_manager = CredentialManager()
+    return _default_manager
@@ -0,0 +1 @@
+from .clusters import CamlClusters, ClusterResult, FanOutResult
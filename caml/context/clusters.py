@@ -0,0 +1,248 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from caml.caml import Caml
+from caml.errors import CamlArgumentsError, CamlConflictError, CamlError, CamlNotFoundError
+from caml.kube.utils import list_partial_metadata
+from caml.modules.workspaces import WorkspacesClient
+
+# Max seconds a fan out waits for a single cluster before reporting it as timed out
+DEFAULT_FAN_OUT_TIMEOUT = 30
+# Threads shared by all of the fan out calls
+DEFAULT_FAN_OUT_WORKERS = 32
+
+
+class ClusterResult:
+    """
+    The outcome of an operation on a single cluster
+    """
+
+    __slots__ = ("cluster", "value", "error", "latency")
+
+    def __init__(self, cluster, value=None, error=None, latency=None):
+        self.cluster = cluster
+        self.value = value
+        self.error = error
+        self.latency = latency
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error: {self.error!r}"
+        latency = "-" if self.latency is None else f"{self.latency * 1000:.0f}ms"
+        return f"ClusterResult({self.cluster}, {status}, {latency})"
+
+
+class FanOutResult:
+    """
+    The per cluster results of a fan out, with the successful values merged
+    """
+
+    def __init__(self, results):
+        """
+        @param results: [List] ClusterResult objects
+        """
+        self.results = results
+
+    @property
+    def ok(self):
+        return all(result.ok for result in self.results)
+
+    @property
+    def errors(self):
+        """
+        @return: [Dict] cluster name -> error of the clusters that failed or timed out
+        """
+        return {result.cluster: result.error for result in self.results if not result.ok}
+
+    @property
+    def latencies(self):
+        """
+        @return: [Dict] cluster name -> seconds (None for clusters that timed out)
+        """
+        return {result.cluster: result.latency for result in self.results}
+
+    def values(self):
+        """
+        @return: [Dict] cluster name -> value of the clusters that succeeded
+        """
+        return {result.cluster: result.value for result in self.results if result.ok}
+
+    def merged(self):
+        """
+        Flattens the list values of the clusters that succeeded
+        @return: [List] (cluster name, item) tuples
+        """
+        return [(result.cluster, item) for result in self.results if result.ok for item in result.value]
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __repr__(self):
+        return f"FanOutResult({self.results})"
+
+
+class CamlClusters:
+    """
+    A set of named CAML clusters that operations are fanned out to concurrently.
+    Every cluster has its own Caml (kube config, credentials and connection pool). A slow or failing cluster
+    only shows up in its own ClusterResult and never holds back the results of the others.
+    """
+
+    def __init__(self, timeout=DEFAULT_FAN_OUT_TIMEOUT, workers=DEFAULT_FAN_OUT_WORKERS):
+        """
+        @param timeout: [Float] Default max seconds to wait for a single cluster
+        @param workers: [Integer] Threads shared by all of the fan out calls
+        """
+        self.timeout = timeout
+
+        self._clusters = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="caml-fan-out")
+
+    @property
+    def names(self):
+        return list(self._clusters.keys())
+
+    def register(self, name, kube_config=None, **kwargs):
+        """
+        Adds a cluster
+        @param name: [String] A unique name for the cluster
+        @param kube_config: [String] The path to the cluster's kube config file
+        @param kwargs: Additional Caml arguments (consistency, pool_size, sharding)
+        @raise CamlConflictError: if a cluster with the same name is already registered
+        @return: Caml object of the cluster
+        """
+        with self._lock:
+            if name in self._clusters:
+                raise CamlConflictError(f"Cluster {name} is already registered")
+            caml = Caml(kube_config=kube_config, **kwargs)
+            self._clusters[name] = caml
+        return caml
+
+    def unregister(self, name):
+        """
+        Removes a cluster and closes its connections
+        @param name: [String] The cluster name
+        @raise CamlNotFoundError: if the cluster is not registered
+        @return: None
+        """
+        with self._lock:
+            caml = self._clusters.pop(name, None)
+        if caml is None:
+            raise CamlNotFoundError(f"Cluster {name} is not registered")
+        caml.close()
+
+    def get(self, name):
+        """
+        @param name: [String] The cluster name
+        @raise CamlNotFoundError: if the cluster is not registered
+        @return: Caml object of the cluster
+        """
+        caml = self._clusters.get(name)
+        if caml is None:
+            raise CamlNotFoundError(f"Cluster {name} is not registered")
+        return caml
+
+    def fan_out(self, func, clusters=None, timeout=None):
+        """
+        Calls func(caml) on every cluster concurrently
+        @param func: [Function] (caml) -> value, executed once per cluster
+        @param clusters: [List] Cluster names to run on (defaults to all of the registered clusters)
+        @param timeout: [Float] Max seconds to wait for a cluster (defaults to the instance timeout)
+        @return: FanOutResult, clusters that raised or timed out carry the error instead of a value
+        """
+        timeout = self.timeout if timeout is None else timeout
+        targets = {name: self.get(name) for name in (clusters if clusters is not None else self.names)}
+
+        futures = {name: self._executor.submit(self._timed_call, func, caml) for name, caml in targets.items()}
+
+        # A single deadline for all of the clusters, the calls that are still running are left in the background
+        wait(futures.values(), timeout=timeout)
+
+        results = []
+        for name, future in futures.items():
+            if future.done():
+                results.append(ClusterResult(name, *future.result()))
+            else:
+                future.cancel()
+                results.append(ClusterResult(name, error=CamlError(f"Timed out after {timeout} seconds")))
+        return FanOutResult(results)
+
+    def list_projects(self, consistency=None, clusters=None, timeout=None):
+        """
+        Lists the projects of all of the clusters
+        @param consistency: [CONSISTENCY] Override the clusters' default read consistency
+        @param clusters: [List] Cluster names to list (defaults to all of the registered clusters)
+        @param timeout: [Float] Max seconds to wait for a cluster
+        @return: FanOutResult of Project lists, merged() returns (cluster name, Project) tuples
+        """
+        return self.fan_out(lambda caml: caml.projects.list(consistency=consistency), clusters, timeout)
+
+    def workspace_counts(self, clusters=None, timeout=None):
+        """
+        Counts the workspaces of every cluster, only the deployments' metadata is fetched
+        @param clusters: [List] Cluster names to count (defaults to all of the registered clusters)
+        @param timeout: [Float] Max seconds to wait for a cluster
+        @return: FanOutResult of workspace counts
+        """
+        return self.fan_out(_count_workspaces, clusters, timeout)
+
+    def create_workspace(self, project, ws_class, name, clusters=None, load_func=None, timeout=None):
+        """
+        Creates a workspace on the least loaded cluster
+        @param project: [String] The project name
+        @param ws_class: [WORKSPACES] The workspace type
+        @param name: [String] The workspace name
+        @param clusters: [List] Candidate cluster names (defaults to all of the registered clusters)
+        @param load_func: [Function] (caml) -> comparable load, defaults to the cluster's workspace count
+        @param timeout: [Float] Max seconds to wait for a cluster's load
+        @raise CamlArgumentsError: if no cluster reported its load
+        @return: (cluster name, Workspace) tuple
+        """
+        loads = self.fan_out(load_func or _count_workspaces, clusters, timeout)
+        available = loads.values()
+        if not available:
+            raise CamlArgumentsError(f"No cluster is available, errors: {loads.errors}")
+
+        cluster = min(available, key=lambda cluster_name: available[cluster_name])
+        caml = self.get(cluster)
+        workspaces = WorkspacesClient(project=project, api=caml.api, namespace=caml.sharding.namespace_for(project),
+                                      routing=caml.routing)
+        return cluster, workspaces.create(ws_class, name)
+
+    def close(self):
+        """
+        Stops the clusters' informers and closes their connections
+        @return: None
+        """
+        for name in self.names:
+            self.unregister(name)
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _timed_call(func, caml):
+        """
+        @return: (value, error, latency) tuple
+        """
+        start = time.monotonic()
+        try:
+            return func(caml), None, time.monotonic() - start
+        except Exception as e:
+            return None, e, time.monotonic() - start
+
+
+def _count_workspaces(caml):
+    """
+    @param caml: [Caml] The cluster
+    @return: [Integer] The number of workspace deployments on the cluster
+    """
+    if caml.sharding.is_sharded:
+        path = "/apis/apps/v1/deployments"
+    else:
+        path = f"/apis/apps/v1/namespaces/{caml.sharding.namespace}/deployments"
+    response = list_partial_metadata(caml.api.api_client, path, labelSelector="project")
+    return len(response["items"])
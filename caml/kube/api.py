@@ -0,0 +1,93 @@
+import copy
+import threading
+
+from kubernetes import client
+
+# Max keep-alive connections to the API server, also the max parallel requests before callers queue on the pool
+DEFAULT_POOL_SIZE = 50
+
+_default_api = None
+_default_api_lock = threading.Lock()
+
+
+class KubeApi:
+    """
+    A single kubernetes ApiClient (and urllib3 connection pool) shared by every SDK object.
+    The typed api wrappers are created on first use and then reused.
+    """
+
+    def __init__(self, configuration=None, pool_size=DEFAULT_POOL_SIZE):
+        """
+        @param configuration: [kubernetes.client.Configuration] Copied, defaults to a copy of the loaded kube config
+        @param pool_size: [Integer] Max keep-alive connections to the API server
+        """
+        # The given configuration may be shared (see CredentialManager), the pool size only applies to this api.
+        # The shallow copy shares the api_key dict, so tokens refreshed in place still reach this api.
+        configuration = copy.copy(configuration) if configuration else client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = pool_size
+
+        self.pool_size = pool_size
+        self.api_client = client.ApiClient(configuration)
+
+        self._apis = {}
+        self._lock = threading.Lock()
+
+    @property
+    def core(self):
+        return self._get_api(client.CoreV1Api)
+
+    @property
+    def apps(self):
+        return self._get_api(client.AppsV1Api)
+
+    @property
+    def custom_objects(self):
+        return self._get_api(client.CustomObjectsApi)
+
+    @property
+    def apiextensions(self):
+        return self._get_api(client.ApiextensionsV1Api)
+
+    def pool_stats(self):
+        """
+        @return: [Dict] Per host connection pool statistics
+        """
+        pool_manager = self.api_client.rest_client.pool_manager
+        stats = {}
+        for key in pool_manager.pools.keys():
+            pool = pool_manager.pools[key]
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "max_size": self.pool_size,
+                # Unused slots of the pool queue hold None
+                "idle_connections": sum(1 for conn in pool.pool.queue if conn is not None) if pool.pool else 0,
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+            }
+        return stats
+
+    def close(self):
+        """
+        Closes the pooled connections
+        @return: None
+        """
+        self.api_client.rest_client.pool_manager.clear()
+
+    def _get_api(self, api_class):
+        api = self._apis.get(api_class)
+        if api is None:
+            with self._lock:
+                api = self._apis.setdefault(api_class, api_class(self.api_client))
+        return api
+
+
+def get_default_api():
+    """
+    Returns the process wide KubeApi used by SDK objects that were created without one
+    @return: KubeApi
+    """
+    global _default_api
+    if _default_api is None:
+        with _default_api_lock:
+            if _default_api is None:
+                _default_api = KubeApi()
+    return _default_api
@@ -1,17 +1,18 @@
-from kubernetes import client, config
-
-from
+from caml.config import CamlConfig
+from caml.kube.tasks import KubeTaskScheduler
 
 
 class CamlKubeController:
     def __init__(self, kube_config=None):
-        # Init the kube config
-        if kube_config:
-            config.load_kube_config(config_file=kube_config)
-        else:
-            # To use the CLI/SDK inside of the cluster
-            config.load_incluster_config()
+        # Init the kube config (shared with the SDK, falls back to the in-cluster config)
+        self.config = CamlConfig(kube_config)
 
         self._init_tasks()
 
     def _init_tasks(self):
+        """
+        Starts the scheduler that drives the controller's kube tasks
+        @return: None
+        """
+        self.scheduler = KubeTaskScheduler()
+        self.scheduler.start()
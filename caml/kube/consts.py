@@ -2,3 +2,28 @@ CAML_EXTENSION_GROUP = "extensions.caml.io"
 
 CAML_INFRA_NAMESPACE = "caml-infra"
 CAML_COMPUTE_NAMESPACE = "caml-compute"
+
+# Set on sharded project resources and namespaces, holds the namespace the project is placed in
+CAML_SHARD_LABEL = f"{CAML_EXTENSION_GROUP}/shard"
+
+# Set on a workspace's deployment, pods and service selector, holds the workspace's resource name
+CAML_WORKSPACE_LABEL = f"{CAML_EXTENSION_GROUP}/workspace"
+
+# Set on the idle pods of a warm pool, holds the pool's profile (removed when a workspace claims the pod)
+CAML_POOL_LABEL = f"{CAML_EXTENSION_GROUP}/pool"
+
+# Set on a workspace's deployment once it is ready, holds the provisioning phase breakdown (json, in seconds)
+CAML_PROVISIONING_ANNOTATION = f"{CAML_EXTENSION_GROUP}/provisioning"
+
+# The DaemonSet that keeps the workspace images pulled on every compute node
+CAML_PREPULLER_NAME = "caml-image-prepuller"
+
+# Set on a culled (scaled to zero) workspace's deployment, hold when it was culled and its replicas before that
+CAML_CULLED_ANNOTATION = f"{CAML_EXTENSION_GROUP}/culled-at"
+CAML_REPLICAS_ANNOTATION = f"{CAML_EXTENSION_GROUP}/replicas"
+# Set on a workspace's deployment when it is resumed, the idle time is counted from it
+CAML_RESUMED_ANNOTATION = f"{CAML_EXTENSION_GROUP}/resumed-at"
+# The last activity reported for a workspace from outside of it (for example by the gateway), epoch seconds
+CAML_ACTIVITY_ANNOTATION = f"{CAML_EXTENSION_GROUP}/last-activity"
+# The path a workspace is served under when it is reached through the CAML gateway
+CAML_BASE_URL_ANNOTATION = f"{CAML_EXTENSION_GROUP}/base-url"
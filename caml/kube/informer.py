@@ -0,0 +1,212 @@
+import logging
+import threading
+
+from kubernetes import watch
+from kubernetes.client.exceptions import ApiException
+
+from caml.kube.utils import HTTP_STATUS_GONE
+
+logger = logging.getLogger(__name__)
+
+
+class CONSISTENCY:
+    """
+    Read consistency levels supported by the informer backed clients
+    """
+
+    # Serve the read from the in-memory cache (may lag the API server by a watch event)
+    CACHED = "cached"
+    # Always perform a live read against the API server
+    LIVE = "live"
+
+
+class KubeInformer:
+    """
+    Keeps an in-memory copy of a kubernetes resource list.
+    The informer performs one initial list and then follows the watch events from the returned resourceVersion.
+    When the watch expires (410 Gone) the informer relists and resumes watching.
+    """
+
+    def __init__(self, list_func, watch_timeout=300, retry_interval=5, **list_kwargs):
+        """
+        @param list_func: The kubernetes list function (for example list_namespaced_custom_object)
+        @param watch_timeout: [Integer] Seconds before the server closes a single watch request
+        @param retry_interval: [Integer] Seconds to wait before reconnecting after an unexpected error
+        @param list_kwargs: Arguments passed to the list function on every list and watch call
+        """
+        self._list_func = list_func
+        self._list_kwargs = list_kwargs
+        self._watch_timeout = watch_timeout
+        self._retry_interval = retry_interval
+
+        self._items = {}
+        self._revision = 0
+        self._indexes = {}
+        self._resource_version = None
+        self._content_version = None
+        self._lock = threading.RLock()
+        self._synced = threading.Event()
+        # Set once the initial list succeeded or failed, so readers stop waiting for a cache that cannot load
+        self._attempted = threading.Event()
+        self._stopped = threading.Event()
+        self._watch = None
+        self._thread = None
+
+    @property
+    def resource_version(self):
+        return self._resource_version
+
+    @property
+    def content_version(self):
+        """
+        The resourceVersion of the last change to the cached objects (bookmarks only move resource_version)
+        """
+        return self._content_version
+
+    @property
+    def is_synced(self):
+        return self._synced.is_set()
+
+    def start(self):
+        """
+        Starts the informer background thread (no-op if it is already running)
+        @return: None
+        """
+        with self._lock:
+            if self._thread and self._thread.is_alive() and not self._stopped.is_set():
+                return
+
+            # A stopped thread may still be blocked in its watch, it ends with its own stop event and never touches
+            # the state of the new run
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stopped,), name="caml-informer",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops following the watch events and drops the cache, a later start() lists the objects again
+        @return: None
+        """
+        with self._lock:
+            self._stopped.set()
+            self._synced.clear()
+            self._attempted.clear()
+            self._items = {}
+            self._indexes = {}
+            self._revision += 1
+            self._resource_version = None
+            self._content_version = None
+            if self._watch:
+                self._watch.stop()
+
+    def wait_for_sync(self, timeout=None):
+        """
+        Blocks until the initial list was loaded into the cache, returns right away once a list attempt failed
+        (the informer keeps retrying in the background)
+        @param timeout: [Float] Max seconds to wait
+        @return: [Boolean] True if the cache is synced
+        """
+        self._attempted.wait(timeout)
+        return self._synced.is_set()
+
+    def list(self):
+        """
+        @return: [List] The cached objects
+        """
+        with self._lock:
+            return list(self._items.values())
+
+    def get(self, name):
+        """
+        @param name: [String] The object name
+        @return: [Dict] The cached object or None
+        """
+        with self._lock:
+            return self._items.get(name)
+
+    def sorted_index(self, name, key):
+        """
+        Returns the cached objects sorted by key, the index is rebuilt only on the first read after a change
+        @param name: [String] The index name
+        @param key: [Function] (object) -> sort key
+        @return: ([List] objects, [List] their keys, [String] the content_version of the objects),
+                 objects and keys in ascending order (shared, do not modify)
+        """
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is None or index[0] != self._revision:
+                items = sorted(self._items.values(), key=key)
+                index = (self._revision, items, [key(item) for item in items], self._content_version)
+                self._indexes[name] = index
+            return index[1], index[2], index[3]
+
+    def _run(self, stopped):
+        """
+        @param stopped: [threading.Event] The stop event of this run
+        """
+        while not stopped.is_set():
+            try:
+                if self._resource_version is None:
+                    self._relist(stopped)
+                self._follow(stopped)
+            except ApiException as e:
+                if e.status == HTTP_STATUS_GONE:
+                    logger.info("informer watch expired, relisting")
+                    with self._lock:
+                        if not stopped.is_set():
+                            self._resource_version = None
+                    continue
+                self._failed(stopped, e)
+            except Exception as e:
+                self._failed(stopped, e)
+
+    def _failed(self, stopped, error):
+        logger.warning(f"informer watch failed: {error}")
+        with self._lock:
+            if not stopped.is_set():
+                self._attempted.set()
+        stopped.wait(self._retry_interval)
+
+    def _relist(self, stopped):
+        response = self._list_func(**self._list_kwargs)
+        items = {item["metadata"]["name"]: item for item in response["items"]}
+
+        with self._lock:
+            if stopped.is_set():
+                return
+            self._items = items
+            self._revision += 1
+            self._resource_version = response["metadata"]["resourceVersion"]
+            self._content_version = self._resource_version
+            self._synced.set()
+            self._attempted.set()
+
+    def _follow(self, stopped):
+        with self._lock:
+            if stopped.is_set():
+                return
+            self._watch = watch.Watch()
+            stream = self._watch.stream(
+                self._list_func,
+                resource_version=self._resource_version,
+                timeout_seconds=self._watch_timeout,
+                allow_watch_bookmarks=True,
+                **self._list_kwargs
+            )
+
+        for event in stream:
+            obj = event["raw_object"]
+            with self._lock:
+                if stopped.is_set():
+                    break
+                # Bookmarks only carry a fresh resourceVersion
+                if event["type"] in ("ADDED", "MODIFIED"):
+                    self._items[obj["metadata"]["name"]] = obj
+                    self._revision += 1
+                elif event["type"] == "DELETED":
+                    self._items.pop(obj["metadata"]["name"], None)
+                    self._revision += 1
+                if event["type"] != "BOOKMARK":
+                    self._content_version = obj["metadata"]["resourceVersion"]
+                self._resource_version = obj["metadata"]["resourceVersion"]
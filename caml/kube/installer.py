@@ -0,0 +1,155 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from kubernetes import watch
+from kubernetes.client.exceptions import ApiException
+
+from caml.errors import CamlError
+
+# Default max seconds a single step may wait for its resource to become ready
+STEP_TIMEOUT = 120
+
+
+class InstallStep:
+    """
+    A single platform resource: how to create it and how to know it is ready
+    """
+
+    def __init__(self, name, create, wait_ready=None, depends_on=(), timeout=STEP_TIMEOUT):
+        """
+        @param name: [String] Unique step name
+        @param create: [Function] Creates the resource, an already existing resource (409) is not an error
+        @param wait_ready: [Function] (timeout) -> None, blocks until the resource is ready or raises on timeout
+        @param depends_on: [List] Names of steps that must be ready before this step starts
+        @param timeout: [Integer] Max seconds to wait for readiness
+        """
+        self.name = name
+        self.create = create
+        self.wait_ready = wait_ready
+        self.depends_on = tuple(depends_on)
+        self.timeout = timeout
+
+        # Timings relative to the installer start (seconds)
+        self.started_at = None
+        self.created_at = None
+        self.ready_at = None
+
+
+class CamlInstaller:
+    """
+    Installs a dependency graph of resources, independent steps are created and awaited concurrently
+    so the install takes as long as the critical path of the graph.
+    """
+
+    def __init__(self, steps, max_workers=8):
+        """
+        @param steps: [List] InstallStep objects
+        @param max_workers: [Integer] Max steps running at the same time
+        """
+        self.steps = {step.name: step for step in steps}
+        self.max_workers = max_workers
+        self._start = None
+
+        for step in steps:
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise CamlError(f"Install step {step.name} depends on unknown step {dependency}")
+
+    def run(self):
+        """
+        Runs all of the steps
+        @raise CamlError: if a step failed or did not become ready in time
+        @return: [List] The steps, with their timings filled
+        """
+        self._start = time.monotonic()
+        pending = dict(self.steps)
+        done = set()
+        running = {}
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    if all(dependency in done for dependency in step.depends_on):
+                        running[executor.submit(self._run_step, step)] = step
+                        del pending[name]
+
+                if not running:
+                    raise CamlError(f"Install steps have unresolvable dependencies: {', '.join(pending)}")
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    error = future.exception()
+                    if error:
+                        raise CamlError(f"Install step {step.name} failed: {error}")
+                    done.add(step.name)
+        except BaseException:
+            # No new step is submitted and the queued ones never start, the running ones are waited for
+            executor.shutdown(cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        return list(self.steps.values())
+
+    def report(self):
+        """
+        @return: [String] A per step timing table
+        """
+        lines = [f"{'step':<24}{'start':>8}{'created':>10}{'ready':>8}"]
+        for step in sorted(self.steps.values(), key=lambda s: s.started_at or 0):
+            lines.append(f"{step.name:<24}{step.started_at:>7.2f}s{step.created_at:>9.2f}s{step.ready_at:>7.2f}s")
+
+        total = max(step.ready_at for step in self.steps.values())
+        lines.append(f"total: {total:.2f}s")
+        return "\n".join(lines)
+
+    def _run_step(self, step):
+        step.started_at = self._elapsed()
+        try:
+            step.create()
+        except ApiException as e:
+            if e.status != 409:
+                raise e
+        step.created_at = self._elapsed()
+
+        if step.wait_ready:
+            step.wait_ready(step.timeout)
+        step.ready_at = self._elapsed()
+
+    def _elapsed(self):
+        return time.monotonic() - self._start
+
+
+def wait_for_resource(list_func, name, is_ready, timeout):
+    """
+    Watches a single resource until it is ready
+    @param list_func: The kubernetes list function of the resource (for example list_namespace)
+    @param name: [String] The resource name
+    @param is_ready: [Function] (resource) -> Boolean
+    @param timeout: [Integer] Max seconds to wait
+    @raise CamlError: if the resource is not ready within the timeout
+    @return: None
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = int(deadline - time.monotonic())
+        if remaining <= 0:
+            raise CamlError(f"Timed out waiting for {name} to become ready")
+
+        # A watch without a resourceVersion starts with the current state of the resource
+        resource_watch = watch.Watch()
+        for event in resource_watch.stream(list_func, field_selector=f"metadata.name={name}",
+                                           timeout_seconds=remaining):
+            if event["type"] != "DELETED" and is_ready(event["object"]):
+                resource_watch.stop()
+                return
+
+
+def is_namespace_active(namespace):
+    return namespace.status is not None and namespace.status.phase == "Active"
+
+
+def is_crd_established(crd):
+    conditions = (crd.status and crd.status.conditions) or []
+    return any(condition.type == "Established" and condition.status == "True" for condition in conditions)
@@ -0,0 +1,349 @@
+import base64
+import bisect
+import hashlib
+import json
+import re
+
+from caml.errors import CamlArgumentsError
+from caml.kube.utils import HTTP_STATUS_GONE
+
+# Upper bound of a single page
+MAX_PAGE_SIZE = 1000
+
+# Fields the API server can select on for every resource, custom resources add their selectableFields
+NATIVE_SELECTABLE_FIELDS = ("metadata.name", "metadata.namespace")
+
+_REQUIREMENT = re.compile(r"^(?P<negate>!?)(?P<key>[^=!\s]+)(?:(?P<op>==|=|!=)(?P<value>.*))?$")
+_FIELD_PREFIXES = ("metadata.", "spec.", "status.")
+
+
+class SORT:
+    """
+    The supported sort orders, prefix with "-" for a descending order
+    """
+
+    NAME = "name"
+    CREATED = "created"
+
+
+# Every key ends with the name so the order is total and can be resumed from the last key
+SORT_KEYS = {
+    SORT.NAME: lambda item: (item["metadata"]["name"],),
+    SORT.CREATED: lambda item: (item["metadata"].get("creationTimestamp") or "", item["metadata"]["name"]),
+}
+
+
+class CURSOR_MODE:
+    # The cursor holds a kubernetes continue token
+    SERVER = "s"
+    # The cursor holds the last sort key of an in-memory index
+    INDEX = "i"
+
+
+class QUERY_PLAN:
+    # The page is cut from a sorted index of the warm informer cache
+    CACHE = "cache"
+    # The API server answers the query on its own (selectors, limit and continue)
+    PUSH_DOWN = "push_down"
+    # The page is cut from a one-off sort of a live list
+    LIVE = "live"
+
+
+def native_sorts(cluster_wide):
+    """
+    @param cluster_wide: [Boolean] True for a list across every namespace
+    @return: [Tuple] The sorts that match the API server's list order (a namespaced list is ordered by name, a
+             cluster wide list by namespace and then name)
+    """
+    return () if cluster_wide else (SORT.NAME,)
+
+
+class ListPage:
+    """
+    A single page of a list query
+    """
+
+    def __init__(self, items, next_cursor=None, version=None):
+        """
+        @param items: [List] The page items
+        @param next_cursor: [String] Opaque cursor of the next page, None on the last page
+        @param version: [String] The version of the cached collection the page was cut from (None for live reads)
+        """
+        self.items = items
+        self.next_cursor = next_cursor
+        self.version = version
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return f"ListPage({len(self.items)} items, more={self.next_cursor is not None})"
+
+
+class ListQuery:
+    """
+    A filtered, sorted and paginated list request.
+    Filters are kubernetes style requirements ("env=prod", "tier!=web", "gpu", "!gpu", "spec.name=demo"),
+    keys under metadata., spec. or status. are field requirements, any other key is a label requirement.
+    """
+
+    def __init__(self, limit=None, cursor=None, sort=None, filters=()):
+        """
+        @param limit: [Integer] Max items per page (None for everything)
+        @param cursor: [String] The next_cursor of the previous page
+        @param sort: [SORT] The sort order, "-" prefixed for descending (None for the server's order)
+        @param filters: [List] Label and field requirements
+        @raise CamlArgumentsError: on an invalid limit, sort, filter or cursor
+        """
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            raise CamlArgumentsError(f"The limit must be between 1 and {MAX_PAGE_SIZE}")
+        self.limit = limit
+
+        self.sort = sort
+        self.descending = bool(sort) and sort.startswith("-")
+        self.sort_field = sort.lstrip("-") if sort else None
+        if self.sort_field is not None and self.sort_field not in SORT_KEYS:
+            raise CamlArgumentsError(f"Unsupported sort {sort}, expected one of {sorted(SORT_KEYS)}")
+
+        self.labels = []
+        self.fields = []
+        for requirement in filters:
+            self._add_requirement(requirement)
+
+        self.fingerprint = hashlib.sha1(
+            json.dumps([self.sort, self.labels, self.fields]).encode()
+        ).hexdigest()[:12]
+        self.cursor_mode, self.cursor_position = self._decode_cursor(cursor) if cursor else (None, None)
+
+    @property
+    def index_name(self):
+        """
+        @return: [String] The sort field of the in-memory index (name if the query is unsorted)
+        """
+        return self.sort_field or SORT.NAME
+
+    @property
+    def sort_key(self):
+        return SORT_KEYS[self.index_name]
+
+    @property
+    def label_selector(self):
+        """
+        @return: [String] The label requirements as a kubernetes label selector (None if there are none)
+        """
+        parts = []
+        for key, op, value in self.labels:
+            if op == "exists":
+                parts.append(key)
+            elif op == "!exists":
+                parts.append(f"!{key}")
+            else:
+                parts.append(f"{key}{op}{value}")
+        return ",".join(parts) or None
+
+    @property
+    def field_selector(self):
+        """
+        @return: [String] The field requirements as a kubernetes field selector (None if there are none)
+        """
+        return ",".join(f"{key}{op}{value}" for key, op, value in self.fields) or None
+
+    def can_push_down(self, selectable_fields=NATIVE_SELECTABLE_FIELDS, native_sorts=()):
+        """
+        Checks if the API server can answer the query on its own
+        @param selectable_fields: [List] Fields the resource can be selected on
+        @param native_sorts: [List] Sorts that match the API server's list order
+        @return: [Boolean]
+        """
+        if self.cursor_mode == CURSOR_MODE.INDEX:
+            return False
+        if self.sort is not None and self.sort not in native_sorts:
+            return False
+        return all(key in selectable_fields and op in ("=", "!=") for key, op, _ in self.fields)
+
+    def plan(self, use_cache, selectable_fields=NATIVE_SELECTABLE_FIELDS, native_sorts=()):
+        """
+        Picks how the query is answered. A warm cache answers every query, except for the next pages of a listing
+        that started on the API server.
+        @param use_cache: [Function] Returns True if the read may be served from the cache (only called when the
+                          cursor allows it)
+        @param selectable_fields: [List] Fields the resource can be selected on
+        @param native_sorts: [List] Sorts that match the API server's list order
+        @return: [QUERY_PLAN]
+        """
+        if self.cursor_mode != CURSOR_MODE.SERVER and use_cache():
+            return QUERY_PLAN.CACHE
+        if self.can_push_down(selectable_fields, native_sorts):
+            return QUERY_PLAN.PUSH_DOWN
+        return QUERY_PLAN.LIVE
+
+    @property
+    def list_args(self):
+        """
+        @return: [Dict] The list call arguments of a pushed down query
+        """
+        return {
+            "label_selector": self.label_selector,
+            "field_selector": self.field_selector,
+            "limit": self.limit,
+            "_continue": self.cursor_position,
+        }
+
+    def server_page(self, response):
+        """
+        @param response: [Dict] The API server's answer to a pushed down query
+        @return: ([List] page items, [String] next cursor)
+        """
+        return response["items"], self.server_cursor(response["metadata"].get("continue"))
+
+    def can_fall_back(self, status):
+        """
+        Checks if a pushed down query that the API server rejected can be answered by a live sort instead
+        @param status: [Integer] The HTTP status of the API server's error
+        @raise CamlArgumentsError: if the cursor has expired
+        @return: [Boolean] False if the error must be raised
+        """
+        if status == HTTP_STATUS_GONE:
+            raise CamlArgumentsError("The cursor has expired, restart the listing")
+        # API servers without selectable fields reject spec field selectors
+        return status == 400 and bool(self.fields) and self.cursor_mode != CURSOR_MODE.SERVER
+
+    def cached_page(self, informer):
+        """
+        @param informer: [KubeInformer] The warm cache
+        @return: ([List] page items, [String] next cursor, [String] the version of the cached collection)
+        """
+        items, keys, version = informer.sorted_index(self.index_name, self.sort_key)
+        items, next_cursor = self.page_sorted(items, keys)
+        return items, next_cursor, version
+
+    def live_page(self, items):
+        """
+        @param items: [List] The raw resources of a live list
+        @return: ([List] page items, [String] next cursor)
+        """
+        return self.page_sorted(*self.sort_items(items))
+
+    def matches(self, item):
+        """
+        Evaluates the filters against a raw resource (for the in-memory fallback)
+        @param item: [Dict] The raw resource
+        @return: [Boolean]
+        """
+        labels = item["metadata"].get("labels") or {}
+        for key, op, value in self.labels:
+            if not _compare(key in labels, labels.get(key), op, value):
+                return False
+
+        for key, op, value in self.fields:
+            found, current = _get_path(item, key)
+            if not _compare(found, None if current is None else str(current), op, value):
+                return False
+        return True
+
+    def server_cursor(self, token):
+        """
+        @param token: [String] The kubernetes continue token of the next page
+        @return: [String] The opaque cursor (None if there are no more pages)
+        """
+        return self._encode_cursor(CURSOR_MODE.SERVER, token) if token else None
+
+    def page_sorted(self, items, keys):
+        """
+        Returns the requested page of an index that is sorted in ascending order.
+        The page starts after the cursor's key, so concurrent changes never shift or repeat items.
+        @param items: [List] The raw resources in ascending order
+        @param keys: [List] Their sort keys (same order)
+        @return: ([List] page items, [String] next cursor)
+        """
+        if self.cursor_mode == CURSOR_MODE.SERVER:
+            raise CamlArgumentsError("The cursor does not belong to this query")
+
+        last_key = tuple(self.cursor_position) if self.cursor_position is not None else None
+        if self.descending:
+            start = len(keys) - 1 if last_key is None else bisect.bisect_left(keys, last_key) - 1
+            positions = range(start, -1, -1)
+        else:
+            start = 0 if last_key is None else bisect.bisect_right(keys, last_key)
+            positions = range(start, len(keys))
+
+        page = []
+        last_position = None
+        for position in positions:
+            if not self.matches(items[position]):
+                continue
+            if self.limit is not None and len(page) == self.limit:
+                # Another match exists, so there is a next page
+                return page, self._encode_cursor(CURSOR_MODE.INDEX, list(keys[last_position]))
+            page.append(items[position])
+            last_position = position
+        return page, None
+
+    def sort_items(self, items):
+        """
+        Builds a one-off index for the query (when no cached index is available)
+        @param items: [List] The raw resources
+        @return: ([List] objects, [List] their keys), both in ascending order
+        """
+        items = sorted(items, key=self.sort_key)
+        return items, [self.sort_key(item) for item in items]
+
+    def _add_requirement(self, requirement):
+        match = _REQUIREMENT.match(requirement.strip())
+        if not match:
+            raise CamlArgumentsError(f"Invalid filter {requirement}")
+
+        key, op, value = match.group("key"), match.group("op"), match.group("value")
+        is_field = key.startswith(_FIELD_PREFIXES)
+        if op is None:
+            if is_field:
+                raise CamlArgumentsError(f"Field filter {requirement} must compare to a value")
+            op = "!exists" if match.group("negate") else "exists"
+        elif match.group("negate"):
+            raise CamlArgumentsError(f"Invalid filter {requirement}")
+        elif op == "==":
+            op = "="
+
+        (self.fields if is_field else self.labels).append((key, op, value))
+
+    def _encode_cursor(self, mode, position):
+        raw = json.dumps({"m": mode, "q": self.fingerprint, "p": position}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def _decode_cursor(self, cursor):
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            mode, fingerprint, position = raw["m"], raw["q"], raw["p"]
+        except Exception:
+            raise CamlArgumentsError("Invalid cursor")
+
+        if fingerprint != self.fingerprint:
+            raise CamlArgumentsError("The cursor does not belong to this query")
+        return mode, position
+
+
+def _compare(found, current, op, value):
+    if op == "exists":
+        return found
+    if op == "!exists":
+        return not found
+    if op == "=":
+        return found and current == value
+    return not found or current != value
+
+
+def _get_path(item, path):
+    """
+    @param item: [Dict] A raw resource
+    @param path: [String] A dotted field path (for example spec.name)
+    @return: ([Boolean] found, value)
+    """
+    current = item
+    for part in path.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return False, None
+        current = current[part]
+    return True, current
@@ -0,0 +1,268 @@
+import logging
+import os
+import pathlib
+import threading
+import zlib
+
+from kubernetes.client.exceptions import ApiException
+
+from caml.errors import CamlArgumentsError
+from caml.kube.api import get_default_api
+from caml.kube.consts import CAML_COMPUTE_NAMESPACE, CAML_EXTENSION_GROUP, CAML_SHARD_LABEL
+from caml.kube.templates import render_template
+from caml.kube.utils import read_raw_json
+
+logger = logging.getLogger(__name__)
+
+# Number of namespaces the projects are spread over by the HASH strategy
+DEFAULT_HASH_BUCKETS = 16
+# Kubernetes namespace names are DNS labels
+MAX_NAMESPACE_LENGTH = 63
+
+NAMESPACE_SCHEMA = os.path.join(pathlib.Path(__file__).parent, "schemas/namespace.yml")
+
+# Server populated fields that must not be sent when a resource is re-created in another namespace
+_SERVER_ANNOTATIONS = ("deployment.kubernetes.io/revision",)
+
+
+class SHARDING:
+    """
+    The strategies that place projects (and their workspaces) in namespaces
+    """
+
+    # Every project in the compute namespace (the original layout)
+    SINGLE = "single"
+    # A namespace per project: <compute namespace>-<project>
+    PROJECT = "project"
+    # A fixed number of namespaces, projects are placed by the hash of their name: <compute namespace>-<bucket>
+    HASH = "hash"
+
+
+class ShardingPolicy:
+    """
+    Maps a project to the namespace that holds its project resource, deployments and services.
+    The mapping is a pure function of the project name, so a project is found without a lookup.
+    It is also recorded in the project resource (spec.namespace and the shard label).
+    """
+
+    def __init__(self, strategy=SHARDING.SINGLE, buckets=DEFAULT_HASH_BUCKETS, namespace=CAML_COMPUTE_NAMESPACE):
+        """
+        @param strategy: [SHARDING] The placement strategy
+        @param buckets: [Integer] Number of namespaces used by the HASH strategy
+        @param namespace: [String] The compute namespace, also the prefix of the sharded namespaces
+        """
+        if strategy not in (SHARDING.SINGLE, SHARDING.PROJECT, SHARDING.HASH):
+            raise CamlArgumentsError(f"Unknown sharding strategy {strategy}")
+        if buckets < 1:
+            raise CamlArgumentsError("The number of hash buckets must be positive")
+
+        self.strategy = strategy
+        self.buckets = buckets
+        self.namespace = namespace
+
+        self._ensured = set()
+        self._lock = threading.Lock()
+
+    @property
+    def is_sharded(self):
+        return self.strategy != SHARDING.SINGLE
+
+    def namespace_for(self, project):
+        """
+        @param project: [String] The project name
+        @raise CamlArgumentsError: if the project name does not fit in a namespace name
+        @return: [String] The namespace of the project
+        """
+        if self.strategy == SHARDING.SINGLE:
+            return self.namespace
+
+        if self.strategy == SHARDING.PROJECT:
+            namespace = f"{self.namespace}-{project}"
+            if len(namespace) > MAX_NAMESPACE_LENGTH:
+                raise CamlArgumentsError(f"Project name {project} is too long for a namespace per project")
+            return namespace
+
+        # crc32 is stable across processes, unlike hash()
+        return f"{self.namespace}-{zlib.crc32(project.encode()) % self.buckets}"
+
+    def namespaces(self):
+        """
+        @return: [List] Every namespace the policy can place projects in, None if it is unbounded (PROJECT)
+        """
+        if self.strategy == SHARDING.SINGLE:
+            return [self.namespace]
+        if self.strategy == SHARDING.HASH:
+            return [f"{self.namespace}-{bucket}" for bucket in range(self.buckets)]
+        return None
+
+    def namespace_body(self, namespace):
+        """
+        @param namespace: [String] The namespace name
+        @return: [Dict] The namespace manifest of a shard
+        """
+        body = render_template(NAMESPACE_SCHEMA, {"NAMESPACE_NAME": namespace})
+        body["metadata"]["labels"][CAML_SHARD_LABEL] = namespace
+        return body
+
+    def ensure_namespace(self, core_api, namespace):
+        """
+        Creates a shard namespace on first use, the compute namespace itself is created by deploy_caml
+        @param core_api: [kubernetes.client.CoreV1Api] The api to create the namespace with
+        @param namespace: [String] The namespace name
+        @return: None
+        """
+        if namespace == self.namespace or namespace in self._ensured:
+            return
+
+        try:
+            core_api.create_namespace(body=self.namespace_body(namespace))
+        except ApiException as e:
+            if e.status != 409:
+                raise e
+
+        with self._lock:
+            self._ensured.add(namespace)
+
+    def mark_namespace(self, namespace):
+        """
+        Records a namespace that is known to exist (for callers that create it on their own)
+        @param namespace: [String] The namespace name
+        @return: None
+        """
+        with self._lock:
+            self._ensured.add(namespace)
+
+    def is_ensured(self, namespace):
+        return namespace == self.namespace or namespace in self._ensured
+
+    def __repr__(self):
+        return f"ShardingPolicy({self.strategy}, namespace={self.namespace}, buckets={self.buckets})"
+
+
+class MigrationResult:
+    """
+    The outcome of moving a single project to its shard
+    """
+
+    def __init__(self, project, source, target):
+        self.project = project
+        self.source = source
+        self.target = target
+        self.workspaces = []
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error: {self.error}"
+        workspaces = f"{len(self.workspaces)} workspaces"
+        return f"MigrationResult({self.project}, {self.source} -> {self.target}, {workspaces}, {status})"
+
+
+def migrate_projects(sharding, api=None, dry_run=False):
+    """
+    Moves the existing projects and their workspaces to the namespaces of the given sharding policy.
+    Every workspace is re-created in the target namespace before it is deleted from the source namespace
+    (its pods are restarted), the project resource is moved last so an interrupted migration can be run again.
+    @param sharding: [ShardingPolicy] The target placement
+    @param api: [KubeApi] The kubernetes api (defaults to the process wide one)
+    @param dry_run: [Boolean] Only report the projects that would be moved
+    @return: [List] MigrationResult per project that is not in its target namespace
+    """
+    api = api or get_default_api()
+    projects = api.custom_objects.list_cluster_custom_object(group=CAML_EXTENSION_GROUP, version="v1",
+                                                             plural="projects")["items"]
+
+    results = []
+    for project in projects:
+        name = project["metadata"]["name"]
+        source = project["metadata"]["namespace"]
+        target = sharding.namespace_for(name)
+        if source == target and project.get("spec", {}).get("namespace") == target:
+            continue
+
+        result = MigrationResult(name, source, target)
+        results.append(result)
+        if dry_run:
+            continue
+
+        try:
+            _migrate_project(api, sharding, project, result)
+        except Exception as e:
+            logger.warning(f"failed to migrate project {name}: {e}")
+            result.error = e
+    return results
+
+
+def _migrate_project(api, sharding, project, result):
+    sharding.ensure_namespace(api.core, result.target)
+
+    if result.source != result.target:
+        response = api.apps.list_namespaced_deployment(namespace=result.source,
+                                                       label_selector=f"project={result.project}",
+                                                       _preload_content=False)
+        for deployment in read_raw_json(response)["items"]:
+            resource_name = deployment["metadata"]["name"]
+            service = read_raw_json(api.core.read_namespaced_service(name=resource_name, namespace=result.source,
+                                                                     _preload_content=False))
+
+            _create_ignore_conflict(api.apps.create_namespaced_deployment, result.target, _copy_resource(deployment))
+            _create_ignore_conflict(api.core.create_namespaced_service, result.target, _copy_service(service))
+            api.apps.delete_namespaced_deployment(name=resource_name, namespace=result.source)
+            api.core.delete_namespaced_service(name=resource_name, namespace=result.source)
+            result.workspaces.append(resource_name)
+
+    body = _copy_resource(project)
+    body["spec"]["namespace"] = result.target
+    body["metadata"].setdefault("labels", {})[CAML_SHARD_LABEL] = result.target
+    resource_args = {"group": CAML_EXTENSION_GROUP, "version": "v1", "plural": "projects"}
+
+    if result.source == result.target:
+        api.custom_objects.patch_namespaced_custom_object(**resource_args, namespace=result.target,
+                                                          name=result.project, body=body)
+        return
+
+    _create_ignore_conflict(api.custom_objects.create_namespaced_custom_object, result.target, body,
+                            **resource_args)
+    api.custom_objects.delete_namespaced_custom_object(**resource_args, namespace=result.source,
+                                                       name=result.project)
+
+
+def _create_ignore_conflict(create_func, namespace, body, **kwargs):
+    try:
+        create_func(namespace=namespace, body=body, **kwargs)
+    except ApiException as e:
+        # Created by an earlier (interrupted) run
+        if e.status != 409:
+            raise e
+
+
+def _copy_resource(resource):
+    """
+    @param resource: [Dict] A raw resource as returned by the API server
+    @return: [Dict] A copy without the server populated fields, ready to be created in another namespace
+    """
+    metadata = resource["metadata"]
+    annotations = {key: value for key, value in (metadata.get("annotations") or {}).items()
+                   if key not in _SERVER_ANNOTATIONS}
+    copy = {
+        "apiVersion": resource["apiVersion"],
+        "kind": resource["kind"],
+        "metadata": {"name": metadata["name"], "labels": dict(metadata.get("labels") or {})},
+        "spec": dict(resource.get("spec") or {}),
+    }
+    if annotations:
+        copy["metadata"]["annotations"] = annotations
+    return copy
+
+
+def _copy_service(service):
+    copy = _copy_resource(service)
+    # The cluster ips and node ports are allocated again for the new service
+    for key in ("clusterIP", "clusterIPs", "healthCheckNodePort"):
+        copy["spec"].pop(key, None)
+    copy["spec"]["ports"] = [{key: value for key, value in port.items() if key != "nodePort"}
+                             for port in copy["spec"].get("ports", [])]
+    return copy
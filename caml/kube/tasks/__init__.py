@@ -1 +1,3 @@
-from deploy_caml import KubeCamlDeployer
\ No newline at end of file
+from .base_task import TASK_STATUS, BaseKubeTask
+from .caml_deployer import KubeTaskCamlDeployer
+from .scheduler import KubeTaskScheduler
@@ -1,10 +1,18 @@
 from abc import ABCMeta, abstractmethod
 
 
+class TASK_STATUS:
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
 class BaseKubeTask(metaclass=ABCMeta):
     def __init__(self, config):
         self.config = config
-        self.status = "pending"
+        self.status = TASK_STATUS.PENDING
+        self.error = None
 
     @abstractmethod
     def run(self, *args, **kwargs):
@@ -17,5 +25,6 @@ class BaseKubeTask(metaclass=ABCMeta):
     def wait(self, *args, **kwargs):
         """
         The status logic - must be non-blocking polling
+        Returns True once the task is done, False while it is still in progress and raises if it failed
         """
         pass
@@ -0,0 +1,190 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from caml.errors import CamlError
+from caml.kube.tasks.base_task import TASK_STATUS
+
+logger = logging.getLogger(__name__)
+
+
+class _ScheduledTask:
+    def __init__(self, task, depends_on, args, kwargs, poll_interval):
+        self.task = task
+        self.depends_on = depends_on
+        self.args = args
+        self.kwargs = kwargs
+        self.poll_interval = poll_interval
+
+
+class KubeTaskScheduler:
+    """
+    Drives BaseKubeTask objects: run() is called once, then wait() is polled with a per task exponential backoff.
+    A single scheduler thread keeps the timers, run() and wait() calls are executed on a small shared worker pool,
+    so a long task never holds a thread while it is waiting.
+    """
+
+    def __init__(self, max_concurrency=100, workers=8, min_poll_interval=1, max_poll_interval=30,
+                 on_transition=None):
+        """
+        @param max_concurrency: [Integer] Max tasks in the running state at the same time
+        @param workers: [Integer] Threads executing run() and wait() calls
+        @param min_poll_interval: [Float] Seconds before the first wait() poll
+        @param max_poll_interval: [Float] Upper bound of the backoff between polls
+        @param on_transition: [Function] (task, old_status, new_status) called on every status change
+        """
+        self.max_concurrency = max_concurrency
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.on_transition = on_transition
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="caml-task")
+        self._condition = threading.Condition()
+        self._pending = []
+        self._polls = []
+        self._sequence = itertools.count()
+        self._entries = {}
+        self._running = 0
+        self._stopped = False
+        self._thread = None
+
+    def add(self, task, depends_on=(), args=(), kwargs=None):
+        """
+        Schedules a task
+        @param task: [BaseKubeTask] The task to schedule
+        @param depends_on: [List] Tasks that must be done before this task starts
+        @param args: [Tuple] Positional arguments passed to run() and wait()
+        @param kwargs: [Dict] Keyword arguments passed to run() and wait()
+        @return: The task
+        """
+        with self._condition:
+            for dependency in depends_on:
+                if id(dependency) not in self._entries:
+                    raise CamlError("Task dependencies must be added to the scheduler first")
+
+            entry = _ScheduledTask(task, tuple(depends_on), args, kwargs or {}, self.min_poll_interval)
+            self._entries[id(task)] = entry
+            self._pending.append(entry)
+            self._condition.notify()
+        return task
+
+    def start(self):
+        """
+        Starts the scheduler thread
+        @return: None
+        """
+        with self._condition:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._loop, name="caml-task-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops scheduling, tasks that are already running are left as is
+        @return: None
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._executor.shutdown(wait=False)
+
+    def join(self, timeout=None):
+        """
+        Blocks until every scheduled task is done or failed
+        @param timeout: [Float] Max seconds to wait
+        @return: [Boolean] True if all of the tasks finished
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._all_finished():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def _all_finished(self):
+        return all(entry.task.status in (TASK_STATUS.DONE, TASK_STATUS.FAILED) for entry in self._entries.values())
+
+    def _loop(self):
+        with self._condition:
+            while not self._stopped:
+                self._start_ready_tasks()
+
+                now = time.monotonic()
+                while self._polls and self._polls[0][0] <= now:
+                    _, _, entry = heapq.heappop(self._polls)
+                    self._executor.submit(self._poll, entry)
+
+                timeout = self._polls[0][0] - now if self._polls else None
+                self._condition.wait(timeout)
+
+    def _start_ready_tasks(self):
+        for entry in list(self._pending):
+            dependency_statuses = [dependency.status for dependency in entry.depends_on]
+            if TASK_STATUS.FAILED in dependency_statuses:
+                self._pending.remove(entry)
+                entry.task.error = CamlError("A task dependency failed")
+                self._transition(entry.task, TASK_STATUS.FAILED)
+                self._condition.notify_all()
+            elif all(status == TASK_STATUS.DONE for status in dependency_statuses):
+                if self._running >= self.max_concurrency:
+                    return
+                self._pending.remove(entry)
+                self._running += 1
+                self._transition(entry.task, TASK_STATUS.RUNNING)
+                self._executor.submit(self._run, entry)
+
+    def _run(self, entry):
+        try:
+            entry.task.run(*entry.args, **entry.kwargs)
+        except Exception as e:
+            self._finish(entry, e)
+            return
+
+        with self._condition:
+            self._schedule_poll(entry)
+
+    def _poll(self, entry):
+        try:
+            is_done = entry.task.wait(*entry.args, **entry.kwargs)
+        except Exception as e:
+            self._finish(entry, e)
+            return
+
+        if is_done:
+            self._finish(entry)
+            return
+
+        with self._condition:
+            entry.poll_interval = min(entry.poll_interval * 2, self.max_poll_interval)
+            self._schedule_poll(entry)
+
+    def _schedule_poll(self, entry):
+        # Jitter spreads the polls of tasks that were started together
+        delay = random.uniform(entry.poll_interval / 2, entry.poll_interval)
+        heapq.heappush(self._polls, (time.monotonic() + delay, next(self._sequence), entry))
+        self._condition.notify_all()
+
+    def _finish(self, entry, error=None):
+        with self._condition:
+            self._running -= 1
+            entry.task.error = error
+            self._transition(entry.task, TASK_STATUS.FAILED if error else TASK_STATUS.DONE)
+            self._condition.notify_all()
+
+    def _transition(self, task, status):
+        old_status = task.status
+        task.status = status
+        logger.debug(f"task {type(task).__name__} {old_status} -> {status}")
+        if self.on_transition:
+            try:
+                self.on_transition(task, old_status, status)
+            except Exception:
+                logger.exception("task transition callback failed")
@@ -0,0 +1,101 @@
+import re
+from functools import lru_cache
+from os import path
+
+import yaml
+
+from caml.errors import CamlArgumentsError
+
+PLACEHOLDER_PATTERN = re.compile(r"{([A-Z0-9_]+)}")
+
+
+class ManifestTemplate:
+    """
+    A kubernetes manifest template that is parsed once and rendered structurally.
+    Placeholders are written as {NAME}. A value that is only a placeholder is replaced by the typed value as is,
+    a placeholder embedded in a longer string is formatted into it.
+    """
+
+    def __init__(self, document):
+        """
+        @param document: The parsed yaml document
+        """
+        self.placeholders = set()
+        self._render = self._compile(document)
+
+    def render(self, placeholders):
+        """
+        Renders a new manifest, the returned object is never shared between renders
+        @param placeholders: [Dict] configuration placeholders and values
+        @raise CamlArgumentsError: if a placeholder of the template was not supplied
+        @return: [Dict] json representation of the manifest
+        """
+        missing = self.placeholders - placeholders.keys()
+        if missing:
+            raise CamlArgumentsError(f"Missing template placeholders: {', '.join(sorted(missing))}")
+
+        return self._render(placeholders)
+
+    def _compile(self, node):
+        """
+        Compiles a yaml node into a render function
+        @param node: The parsed yaml node
+        @return: [Function] values -> rendered node
+        """
+        if isinstance(node, dict):
+            # An unquoted {NAME} scalar is parsed by yaml as the flow mapping {NAME: None}
+            if len(node) == 1:
+                key, value = next(iter(node.items()))
+                if value is None and isinstance(key, str) and PLACEHOLDER_PATTERN.fullmatch(f"{{{key}}}"):
+                    return self._compile(f"{{{key}}}")
+
+            items = [(key, self._compile(value)) for key, value in node.items()]
+            return lambda values: {key: render(values) for key, render in items}
+
+        if isinstance(node, list):
+            items = [self._compile(value) for value in node]
+            return lambda values: [render(values) for render in items]
+
+        if isinstance(node, str):
+            return self._compile_string(node)
+
+        return lambda values: node
+
+    def _compile_string(self, node):
+        match = PLACEHOLDER_PATTERN.fullmatch(node)
+        if match:
+            key = match.group(1)
+            self.placeholders.add(key)
+            return lambda values: values[key]
+
+        # Odd indexes of the split are placeholder names, even indexes are literal text
+        parts = PLACEHOLDER_PATTERN.split(node)
+        if len(parts) == 1:
+            return lambda values: node
+
+        keys = parts[1::2]
+        self.placeholders.update(keys)
+        return lambda values: "".join(
+            part if i % 2 == 0 else str(values[part]) for i, part in enumerate(parts)
+        )
+
+
+@lru_cache(maxsize=None)
+def load_template(file):
+    """
+    Loads and compiles a manifest template, each file is only read and parsed once per process
+    @param file: [String] path to the configuration file (relative paths are resolved from caml/kube)
+    @return: ManifestTemplate
+    """
+    with open(path.join(path.dirname(__file__), file)) as f:
+        return ManifestTemplate(yaml.safe_load(f))
+
+
+def render_template(file, placeholders):
+    """
+    Renders a manifest from a cached template
+    @param file: [String] path to the configuration file
+    @param placeholders: [Dict] configuration placeholders and values
+    @return: [Dict] json representation of the manifest
+    """
+    return load_template(file).render(placeholders)
@@ -1,10 +1,19 @@
+import json
 import yaml
 from os import path
 
+from kubernetes.client.exceptions import ApiException
+
+HTTP_STATUS_GONE = 410
+# Default max items fetched per list call when paginating
+DEFAULT_PAGE_SIZE = 500
+PARTIAL_METADATA_LIST_ACCEPT = "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json"
+
 
 def replace_yaml_placeholders(file, placeholders):
     """
     Iterates over a configuration files and replaces the placeholders
+    NOTE: Reads and parses the file on every call, prefer caml.kube.templates.render_template
     @param file: [String] path to the configuration file
     @param placeholders: [Dict] configuration placeholders and values
     @return: [Dict] json representation of the correct configuration
@@ -15,3 +24,89 @@ def replace_yaml_placeholders(file, placeholders):
             file_content = file_content.replace(f"{{{key}}}", placeholders[key])
 
     return yaml.safe_load(file_content)
+
+
+def _get_field(obj, key, attribute=None):
+    """
+    Reads a field from either a raw dict or a kubernetes model
+    """
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, attribute or key)
+
+
+def iter_list_items(list_func, page_size=DEFAULT_PAGE_SIZE, **kwargs):
+    """
+    Pages through a kubernetes list call with the limit/continue tokens and yields the items one at a time
+    If the continue token expired, the listing goes on from the inconsistent continue token returned by the server,
+    or restarts and skips the items that were already yielded (lists are ordered by namespace and then name).
+    @param list_func: The kubernetes list function (for example list_namespaced_deployment)
+    @param page_size: [Integer] Max items per API call
+    @param kwargs: Arguments passed to every list call
+    @return: Generator of the items (raw dicts for custom objects, models otherwise)
+    """
+    continue_token = None
+    last_key = None
+    skip_until = None
+
+    while True:
+        try:
+            response = list_func(limit=page_size, _continue=continue_token, **kwargs)
+        except ApiException as e:
+            if e.status != HTTP_STATUS_GONE or continue_token is None:
+                raise e
+            continue_token = _get_inconsistent_continue(e)
+            if continue_token is None:
+                skip_until = last_key
+            continue
+
+        for item in _get_field(response, "items"):
+            metadata = _get_field(item, "metadata")
+            # A cluster wide list spans namespaces, a name alone is not ordered across them
+            key = (_get_field(metadata, "namespace") or "", _get_field(metadata, "name"))
+            if skip_until is not None and key <= skip_until:
+                continue
+            last_key = key
+            yield item
+
+        continue_token = _get_field(_get_field(response, "metadata"), "continue", "_continue")
+        if not continue_token:
+            return
+
+
+def _get_inconsistent_continue(error):
+    try:
+        return json.loads(error.body)["metadata"].get("continue")
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
+def list_partial_metadata(api_client, path, **query):
+    """
+    Lists only the metadata of a resource (PartialObjectMetadataList), the specs are never sent by the API server
+    @param api_client: [kubernetes.client.ApiClient] The api client to send the request with
+    @param path: [String] The resource list path (for example /apis/<group>/<version>/namespaces/<ns>/<plural>)
+    @param query: Query parameters in their API form (for example labelSelector)
+    @return: [Dict] The raw list response
+    """
+    response = api_client.call_api(
+        path, "GET",
+        query_params=[(key, value) for key, value in query.items() if value is not None],
+        header_params={"Accept": PARTIAL_METADATA_LIST_ACCEPT},
+        auth_settings=["BearerToken"],
+        _return_http_data_only=True,
+        _preload_content=False
+    )
+    return read_raw_json(response)
+
+
+def read_raw_json(response):
+    """
+    Decodes a response that was requested with _preload_content=False, skipping the openapi model layer
+    @param response: [urllib3.HTTPResponse] The raw response
+    @return: [Dict] The decoded json
+    """
+    try:
+        return json.loads(response.data)
+    finally:
+        response.release_conn()
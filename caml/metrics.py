@@ -0,0 +1,37 @@
+"""
+Prometheus metrics of the SDK's background components (warm pools, idle culler, gateway).
+prometheus_client is a server side dependency, without it the metrics are no-ops and the SDK works as usual.
+"""
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    Counter = Gauge = Histogram = None
+
+
+class _NoopMetric:
+    """
+    Stands in for a metric (and for its labeled children) when prometheus_client is not installed
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, amount):
+        pass
+
+
+if Counter is None:
+    Counter = Gauge = Histogram = _NoopMetric
@@ -1,2 +1,4 @@
-from .project import Project
+from .async_project import AsyncProject
+from .async_projects_client import AsyncProjectsClient
+from .project import Project, ProjectRecord
 from .projects_client import ProjectsClient
@@ -0,0 +1,149 @@
+import time
+
+from kubernetes_asyncio import client
+from kubernetes_asyncio.client.exceptions import ApiException
+
+from caml.errors import CamlNotFoundError
+from caml.kube.consts import CAML_COMPUTE_NAMESPACE, CAML_EXTENSION_GROUP
+from caml.kube.informer import CONSISTENCY
+from caml.modules.projects.project import validate_idle_timeout
+from caml.modules.workspaces import ROUTING_MODE, AsyncWorkspacesClient
+
+
+class AsyncProject:
+    """
+    The asyncio counterpart of Project.
+    Reads go through the shared non-blocking api client, the snapshot semantics are identical to Project.
+    """
+
+    def __init__(self, api_client, name=None, data=None, informer=None, ttl=None, namespace=CAML_COMPUTE_NAMESPACE,
+                 events=None, routing=ROUTING_MODE.LOAD_BALANCER):
+        """
+        @param api_client: [kubernetes_asyncio.client.ApiClient] The shared api client
+        @param name: [String] The project name (optional if data is given)
+        @param data: [Dict] The project custom resource, as returned by the API server
+        @param informer: [KubeInformer] When set and synced, reads are served from the informer cache
+        @param ttl: [Float] Seconds before the snapshot is considered stale (None to never expire)
+        @param namespace: [String] The project's namespace (taken from data if given)
+        @param events: [AsyncWorkspaceEventHub] Shared hub the workspaces client waits on (optional)
+        @param routing: [ROUTING_MODE] How the project's workspaces are reached
+        """
+        if data:
+            name = data["metadata"]["name"]
+            namespace = data["metadata"]["namespace"]
+
+        self.resource_args = {
+            "name": name,
+            "group": CAML_EXTENSION_GROUP,
+            "plural": "projects",
+            "version": "v1",
+            "namespace": namespace
+        }
+
+        self.informer = informer
+        self.ttl = ttl
+        self.events = events
+        self.routing = routing
+
+        self._data = None
+        self._fetched_at = None
+        if data:
+            self._set_data(data)
+
+        self.api_client = api_client
+        self.project_client = client.CustomObjectsApi(api_client)
+        self._workspaces = None
+
+    @property
+    def name(self):
+        return self.resource_args["name"]
+
+    @property
+    def namespace(self):
+        return self.resource_args["namespace"]
+
+    @property
+    def workspaces(self):
+        """
+        The project's workspaces client, created on first access
+        """
+        if self._workspaces is None:
+            self._workspaces = AsyncWorkspacesClient(self.api_client, project=self.name, namespace=self.namespace,
+                                                     events=self.events, routing=self.routing)
+        return self._workspaces
+
+    async def get_spec(self):
+        return (await self._get_data())["spec"]
+
+    async def get_metadata(self):
+        return (await self._get_data())["metadata"]
+
+    async def get_idle_timeout(self):
+        return (await self.get_spec()).get("idle_timeout")
+
+    async def set_idle_timeout(self, seconds):
+        """
+        The asyncio counterpart of Project.set_idle_timeout
+        @param seconds: [Integer] Seconds without activity before a workspace is culled (0 never culls, None for the
+                        culler's default)
+        @return: None
+        """
+        body = {"spec": {"idle_timeout": validate_idle_timeout(seconds)}}
+        try:
+            data = await self.project_client.patch_namespaced_custom_object(**self.resource_args, body=body)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Project not found")
+            raise e
+        self._set_data(data)
+
+    async def refresh(self, consistency=None):
+        """
+        Re-reads the project snapshot
+        @param consistency: [CONSISTENCY] Pass LIVE to bypass the informer cache
+        @return: None
+        """
+        self._set_data(await self._get_object_data(consistency))
+
+    async def to_json(self):
+        return await self.get_spec()
+
+    async def delete(self):
+        """
+        Deletes the current project
+        @return: None
+        """
+        try:
+            await self.project_client.delete_namespaced_custom_object(**self.resource_args)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Project not found")
+            raise e
+
+    async def _get_data(self):
+        if self._is_stale():
+            await self.refresh()
+        return self._data
+
+    def _set_data(self, data):
+        self._data = data
+        self._fetched_at = time.monotonic()
+
+    def _is_stale(self):
+        if self._data is None:
+            return True
+        return self.ttl is not None and time.monotonic() - self._fetched_at > self.ttl
+
+    async def _get_object_data(self, consistency=None):
+        if consistency != CONSISTENCY.LIVE and self.informer and self.informer.is_synced:
+            data = self.informer.get(self.name)
+            if data is None:
+                raise CamlNotFoundError("Project not found")
+            return data
+
+        try:
+            return await self.project_client.get_namespaced_custom_object(**self.resource_args)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Project not found")
+            raise e
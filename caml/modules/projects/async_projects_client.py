@@ -0,0 +1,205 @@
+from kubernetes_asyncio import client
+from kubernetes_asyncio.client.exceptions import ApiException
+
+from caml.errors import CamlConflictError, CamlNotFoundError
+from caml.kube.consts import CAML_EXTENSION_GROUP, CAML_SHARD_LABEL
+from caml.kube.informer import CONSISTENCY
+from caml.kube.query import QUERY_PLAN, ListPage, ListQuery, native_sorts
+from caml.kube.sharding import ShardingPolicy
+from caml.modules.projects.async_project import AsyncProject
+from caml.modules.projects.project import validate_idle_timeout
+from caml.modules.projects.projects_client import SELECTABLE_FIELDS
+from caml.modules.workspaces import ROUTING_MODE
+
+
+class AsyncProjectsClient:
+    """
+    The asyncio counterpart of ProjectsClient, safe to await from an event loop.
+    """
+
+    def __init__(self, api_client, informer=None, consistency=CONSISTENCY.CACHED, ttl=None, sharding=None,
+                 events=None, routing=ROUTING_MODE.LOAD_BALANCER):
+        """
+        @param api_client: [kubernetes_asyncio.client.ApiClient] The shared api client
+        @param informer: [KubeInformer] Optional cache used for CACHED reads once it is synced
+        @param consistency: [CONSISTENCY] The default read consistency for list and get
+        @param ttl: [Float] Seconds before a returned project snapshot is re-read (None to never expire)
+        @param sharding: [ShardingPolicy] The namespace placement of the projects (defaults to the compute namespace)
+        @param events: [AsyncWorkspaceEventHub] Shared by the workspaces clients to wait for workspaces
+        @param routing: [ROUTING_MODE] How the workspaces of the projects are reached
+        """
+        self.sharding = sharding or ShardingPolicy()
+        self.resource_args = {
+            "group": CAML_EXTENSION_GROUP,
+            "plural": "projects",
+            "version": "v1"
+        }
+        self.api_client = api_client
+        self.informer = informer
+        self.consistency = consistency
+        self.ttl = ttl
+        self.events = events
+        self.routing = routing
+
+        self.project_client = client.CustomObjectsApi(api_client)
+        self.core_api = client.CoreV1Api(api_client)
+
+    async def create(self, name, idle_timeout=None):
+        """
+        @param name: [String] The project name
+        @param idle_timeout: [Integer] Seconds without activity before the project's workspaces are culled
+                             (None for the culler's default, 0 never culls)
+        @raise CamlConflictError: if the project already exists
+        @return: AsyncProject
+        """
+        namespace = self.sharding.namespace_for(name)
+        body = {
+            "apiVersion": f"{CAML_EXTENSION_GROUP}/v1",
+            "kind": "Project",
+            "metadata": {"name": name, "labels": {CAML_SHARD_LABEL: namespace}},
+            "spec": {
+                "name": name,
+                "namespace": namespace
+            }
+        }
+        if validate_idle_timeout(idle_timeout) is not None:
+            body["spec"]["idle_timeout"] = idle_timeout
+        try:
+            await self._ensure_namespace(namespace)
+            response = await self.project_client.create_namespaced_custom_object(**self.resource_args,
+                                                                                 namespace=namespace, body=body)
+            return AsyncProject(self.api_client, data=response, ttl=self.ttl, events=self.events,
+                                routing=self.routing)
+        except ApiException as e:
+            if e.status == 409:
+                raise CamlConflictError("Project already exists")
+            raise e
+
+    async def list(self, consistency=None):
+        """
+        Lists the projects
+        @param consistency: [CONSISTENCY] Override the client's default read consistency
+        @return: [List] AsyncProject objects
+        """
+        if self._use_cache(consistency):
+            informer = self.informer
+            items = informer.list()
+        else:
+            informer = None
+            items = (await self._list())["items"]
+
+        return [AsyncProject(self.api_client, data=item, informer=informer, ttl=self.ttl, events=self.events,
+                             routing=self.routing)
+                for item in items]
+
+    async def query(self, limit=None, cursor=None, sort=None, filters=(), consistency=None):
+        """
+        Returns a single filtered and sorted page of projects, see ProjectsClient.query
+        @param limit: [Integer] Max projects per page (None for all of them)
+        @param cursor: [String] The next_cursor of the previous page
+        @param sort: [SORT] name or created, "-" prefixed for descending (None for the API server's order)
+        @param filters: [List] Label and field requirements, for example ["team=ml", "spec.namespace=caml-compute"]
+        @param consistency: [CONSISTENCY] Override the client's default read consistency
+        @raise CamlArgumentsError: on invalid arguments or an expired cursor
+        @return: ListPage of AsyncProject objects
+        """
+        query = ListQuery(limit=limit, cursor=cursor, sort=sort, filters=filters)
+        plan = query.plan(lambda: self._use_cache(consistency), SELECTABLE_FIELDS,
+                          native_sorts(self.sharding.is_sharded))
+
+        if plan == QUERY_PLAN.PUSH_DOWN:
+            try:
+                items, next_cursor = query.server_page(await self._list(**query.list_args))
+                projects = [AsyncProject(self.api_client, data=item, ttl=self.ttl, events=self.events,
+                                         routing=self.routing)
+                            for item in items]
+                return ListPage(projects, next_cursor)
+            except ApiException as e:
+                if not query.can_fall_back(e.status):
+                    raise e
+
+        informer = version = None
+        if plan == QUERY_PLAN.CACHE:
+            informer = self.informer
+            items, next_cursor, version = query.cached_page(informer)
+        else:
+            items, next_cursor = query.live_page((await self._list())["items"])
+
+        projects = [AsyncProject(self.api_client, data=item, informer=informer, ttl=self.ttl, events=self.events,
+                                 routing=self.routing)
+                    for item in items]
+        return ListPage(projects, next_cursor, version)
+
+    def collection_version(self, consistency=None):
+        """
+        Returns the version of the cached project collection, it changes whenever a project is added, changed or
+        deleted. Only available for CACHED reads once the cache is synced.
+        @param consistency: [CONSISTENCY] Override the client's default read consistency
+        @return: [String] The version, None if reads are not served from the cache
+        """
+        if not self._use_cache(consistency):
+            return None
+        return self.informer.content_version
+
+    async def get(self, name, consistency=None):
+        """
+        Returns a project by name
+        @param name: [String] The project name
+        @param consistency: [CONSISTENCY] Override the client's default read consistency
+        @return: AsyncProject object
+        """
+        if not self._use_cache(consistency):
+            # The snapshot is loaded on first access
+            return AsyncProject(self.api_client, name=name, ttl=self.ttl, namespace=self.sharding.namespace_for(name),
+                                events=self.events, routing=self.routing)
+
+        data = self.informer.get(name)
+        if data is None:
+            raise CamlNotFoundError("Project not found")
+        return AsyncProject(self.api_client, data=data, informer=self.informer, ttl=self.ttl, events=self.events,
+                            routing=self.routing)
+
+    async def delete(self, name):
+        try:
+            await self.project_client.delete_namespaced_custom_object(**self.resource_args, name=name,
+                                                                      namespace=self.sharding.namespace_for(name))
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Project not found")
+            raise e
+
+    async def _list(self, **kwargs):
+        # Sharded projects are spread over many namespaces, a single cluster wide list replaces the per shard lists
+        if self.sharding.is_sharded:
+            return await self.project_client.list_cluster_custom_object(**self.resource_args, **kwargs)
+        return await self.project_client.list_namespaced_custom_object(**self.resource_args,
+                                                                       namespace=self.sharding.namespace, **kwargs)
+
+    async def _ensure_namespace(self, namespace):
+        """
+        Creates a shard namespace on first use
+        @param namespace: [String] The namespace name
+        @return: None
+        """
+        if self.sharding.is_ensured(namespace):
+            return
+
+        try:
+            await self.core_api.create_namespace(body=self.sharding.namespace_body(namespace))
+        except ApiException as e:
+            if e.status != 409:
+                raise e
+        self.sharding.mark_namespace(namespace)
+
+    def _use_cache(self, consistency):
+        """
+        Checks if a read should be served from the informer cache.
+        Unlike the sync client this never waits for the initial list, an unsynced cache falls back to a live read.
+        @param consistency: [CONSISTENCY] The requested consistency (None for the client's default)
+        @return: [Boolean]
+        """
+        if self.informer is None or (consistency or self.consistency) != CONSISTENCY.CACHED:
+            return False
+
+        self.informer.start()
+        return self.informer.is_synced
@@ -1,40 +1,194 @@
-from kubernetes import client
+import time
+
 from kubernetes.client.exceptions import ApiException
 
-from caml.errors import CamlNotFoundError
+from caml.errors import CamlArgumentsError, CamlNotFoundError
+from caml.kube.api import get_default_api
 from caml.kube.consts import CAML_COMPUTE_NAMESPACE, CAML_EXTENSION_GROUP
-from caml.modules.workspaces import WorkspacesClient
+from caml.kube.informer import CONSISTENCY
+from caml.modules.workspaces import ROUTING_MODE, WorkspacesClient
+
+
+def validate_idle_timeout(seconds):
+    """
+    @param seconds: [Integer] A project idle timeout
+    @raise CamlArgumentsError: if it is not a non negative integer
+    @return: [Integer] The idle timeout
+    """
+    if seconds is not None and (not isinstance(seconds, int) or isinstance(seconds, bool) or seconds < 0):
+        raise CamlArgumentsError("The idle timeout must be a non negative number of seconds")
+    return seconds
+
+
+class ProjectRecord:
+    """
+    A compact, read only view of a project (metadata only)
+    """
+
+    __slots__ = ("name", "labels", "resource_version", "created_at")
+
+    def __init__(self, name, labels, resource_version, created_at):
+        self.name = name
+        self.labels = labels
+        self.resource_version = resource_version
+        self.created_at = created_at
+
+    @classmethod
+    def from_raw(cls, item):
+        """
+        @param item: [Dict] A raw (partial) object metadata json
+        @return: ProjectRecord
+        """
+        metadata = item["metadata"]
+        return cls(
+            name=metadata["name"],
+            labels=metadata.get("labels") or {},
+            resource_version=metadata.get("resourceVersion"),
+            created_at=metadata.get("creationTimestamp")
+        )
+
+    def __repr__(self):
+        return f"ProjectRecord({self.name})"
 
 
 class Project:
-    # TODO: decide on dynamic attributes and lazy loading
-    attributes = {
-        "name": str,
-    }
+    """
+    A snapshot of a project custom resource.
+    The snapshot is loaded lazily on first access and only re-read on refresh() or once the ttl has passed.
+    """
+
+    def __init__(self, name=None, data=None, informer=None, ttl=None, api=None, namespace=CAML_COMPUTE_NAMESPACE,
+                 routing=ROUTING_MODE.LOAD_BALANCER):
+        """
+        @param name: [String] The project name (optional if data is given)
+        @param data: [Dict] The project custom resource, as returned by the API server
+        @param informer: [KubeInformer] When set, reads are served from the informer cache
+        @param ttl: [Float] Seconds before the snapshot is considered stale (None to never expire)
+        @param api: [KubeApi] The shared kubernetes api (defaults to the process wide one)
+        @param namespace: [String] The project's namespace (taken from data if given)
+        @param routing: [ROUTING_MODE] How the project's workspaces are reached
+        """
+        if data:
+            name = data["metadata"]["name"]
+            namespace = data["metadata"]["namespace"]
 
-    def __init__(self, name=None, attributes=None):
         self.resource_args = {
             "name": name,
             "group": CAML_EXTENSION_GROUP,
             "plural": "projects",
             "version": "v1",
-            "namespace": CAML_COMPUTE_NAMESPACE
+            "namespace": namespace
         }
 
-        self.project_client = client.CustomObjectsApi()
-        self._init_clients()
+        self.informer = informer
+        self.ttl = ttl
+        self.routing = routing
+
+        self._data = None
+        self._fetched_at = None
+        if data:
+            self._set_data(data)
+
+        self.api = api or get_default_api()
+        self._workspaces = None
+
+    @property
+    def name(self):
+        return self.resource_args["name"]
+
+    @property
+    def namespace(self):
+        """
+        The namespace of the project resource and of the project's workspaces
+        """
+        return self.resource_args["namespace"]
+
+    @property
+    def project_client(self):
+        return self.api.custom_objects
+
+    @property
+    def workspaces(self):
+        """
+        The project's workspaces client, created on first access
+        """
+        if self._workspaces is None:
+            self._workspaces = WorkspacesClient(project=self.name, api=self.api, namespace=self.namespace,
+                                                routing=self.routing)
+        return self._workspaces
+
+    @property
+    def spec(self):
+        return self._get_data()["spec"]
+
+    @property
+    def metadata(self):
+        return self._get_data()["metadata"]
+
+    @property
+    def resource_version(self):
+        return self.metadata["resourceVersion"]
+
+    @property
+    def idle_timeout(self):
+        """
+        Seconds without activity before the project's workspaces are culled (None for the culler's default)
+        """
+        return self.spec.get("idle_timeout")
+
+    def set_idle_timeout(self, seconds):
+        """
+        @param seconds: [Integer] Seconds without activity before a workspace is culled (0 never culls, None for the
+                        culler's default)
+        @return: None
+        """
+        body = {"spec": {"idle_timeout": validate_idle_timeout(seconds)}}
+        try:
+            data = self.project_client.patch_namespaced_custom_object(**self.resource_args, body=body)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Project not found")
+            raise e
+        self._set_data(data)
+
+    def refresh(self, consistency=None):
+        """
+        Re-reads the project snapshot
+        @param consistency: [CONSISTENCY] Pass LIVE to bypass the informer cache
+        @return: None
+        """
+        self._set_data(self._get_object_data(consistency))
+
+    def _get_data(self):
+        if self._is_stale():
+            self.refresh()
+        return self._data
+
+    def _set_data(self, data):
+        self._data = data
+        self._fetched_at = time.monotonic()
+
+    def _is_stale(self):
+        if self._data is None:
+            return True
+        return self.ttl is not None and time.monotonic() - self._fetched_at > self.ttl
+
+    def _get_object_data(self, consistency=None):
+        if consistency != CONSISTENCY.LIVE and self.informer and self.informer.is_synced:
+            data = self.informer.get(self.name)
+            if data is None:
+                raise CamlNotFoundError("Project not found")
+            return data
 
-    def _get_object_data(self):
         try:
             return self.project_client.get_namespaced_custom_object(**self.resource_args)
         except ApiException as e:
             if e.status == 404:
                 raise CamlNotFoundError("Project not found")
+            raise e
 
     def to_json(self):
-        # TODO: optimize to use attributes
-        data = self._get_object_data()
-        return data["spec"]
+        return self.spec
 
     def save(self):
         pass
@@ -49,11 +203,3 @@ class Project:
         except ApiException as e:
             if e.status == 404:
                 raise CamlNotFoundError("Project not found")
-
-    def _init_clients(self):
-        """
-        Sets up the clients that are exposed to the user.
-        @return: None
-        """
-
-        self.workspaces = WorkspacesClient()
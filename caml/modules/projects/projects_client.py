@@ -1,52 +1,212 @@
-from kubernetes import client
 from kubernetes.client.exceptions import ApiException
 
 from caml.errors import CamlConflictError, CamlNotFoundError
-from caml.kube.consts import CAML_COMPUTE_NAMESPACE, CAML_EXTENSION_GROUP
-from caml.modules.projects.project import Project
+from caml.kube.api import get_default_api
+from caml.kube.consts import CAML_EXTENSION_GROUP, CAML_SHARD_LABEL
+from caml.kube.informer import CONSISTENCY, KubeInformer
+from caml.kube.query import NATIVE_SELECTABLE_FIELDS, QUERY_PLAN, ListPage, ListQuery, native_sorts
+from caml.kube.sharding import ShardingPolicy
+from caml.kube.utils import DEFAULT_PAGE_SIZE, iter_list_items, list_partial_metadata
+from caml.modules.projects.project import Project, ProjectRecord, validate_idle_timeout
+from caml.modules.workspaces import ROUTING_MODE
+
+# Max seconds a cached read waits for the initial list before falling back to a live read
+# (a failed initial list falls back right away)
+INFORMER_SYNC_TIMEOUT = 10
+# The selectableFields of the projects CRD (kube/schemas/project.yml)
+SELECTABLE_FIELDS = NATIVE_SELECTABLE_FIELDS + ("spec.name", "spec.namespace")
 
 
 class ProjectsClient:
-    def __init__(self):
+    def __init__(self, consistency=CONSISTENCY.CACHED, ttl=None, api=None, sharding=None,
+                 routing=ROUTING_MODE.LOAD_BALANCER):
+        """
+        @param consistency: [CONSISTENCY] The default read consistency for list and get
+        @param ttl: [Float] Seconds before a returned project snapshot is re-read (None to never expire)
+        @param api: [KubeApi] The shared kubernetes api (defaults to the process wide one)
+        @param sharding: [ShardingPolicy] The namespace placement of the projects (defaults to the compute namespace)
+        @param routing: [ROUTING_MODE] How the workspaces of the projects are reached
+        """
+        self.sharding = sharding or ShardingPolicy()
         self.resource_args = {
             "group": CAML_EXTENSION_GROUP,
             "plural": "projects",
-            "version": "v1",
-            "namespace": CAML_COMPUTE_NAMESPACE
+            "version": "v1"
         }
+        self.consistency = consistency
+        self.ttl = ttl
+        self.routing = routing
+
+        self.api = api or get_default_api()
+        self.project_client = self.api.custom_objects
+        self.informer = KubeInformer(self._list_func, **self._list_args)
 
-        self.project_client = client.CustomObjectsApi()
+    @property
+    def _list_func(self):
+        # Sharded projects are spread over many namespaces, a single cluster wide list replaces the per shard lists
+        if self.sharding.is_sharded:
+            return self.project_client.list_cluster_custom_object
+        return self.project_client.list_namespaced_custom_object
 
-    def create(self, name):
+    @property
+    def _list_args(self):
+        if self.sharding.is_sharded:
+            return self.resource_args
+        return {**self.resource_args, "namespace": self.sharding.namespace}
+
+    def create(self, name, idle_timeout=None):
+        """
+        @param name: [String] The project name
+        @param idle_timeout: [Integer] Seconds without activity before the project's workspaces are culled
+                             (None for the culler's default, 0 never culls)
+        @raise CamlConflictError: if the project already exists
+        @return: Project
+        """
+        namespace = self.sharding.namespace_for(name)
         body = {
             "apiVersion": f"{CAML_EXTENSION_GROUP}/v1",
             "kind": "Project",
-            "metadata": {"name": name},
+            "metadata": {"name": name, "labels": {CAML_SHARD_LABEL: namespace}},
             "spec": {
-                "name": name
+                "name": name,
+                "namespace": namespace
             }
         }
+        if validate_idle_timeout(idle_timeout) is not None:
+            body["spec"]["idle_timeout"] = idle_timeout
         try:
-            response = self.project_client.create_namespaced_custom_object(**self.resource_args, body=body)
-            return response.items()
+            self.sharding.ensure_namespace(self.api.core, namespace)
+            response = self.project_client.create_namespaced_custom_object(**self.resource_args, namespace=namespace,
+                                                                           body=body)
+            return Project(data=response, ttl=self.ttl, api=self.api, routing=self.routing)
         except ApiException as e:
             if e.status == 409:
                 raise CamlConflictError("Project already exists")
+            raise e
+
+    def list(self, consistency=None):
+        """
+        Lists the projects
+        @param consistency: [CONSISTENCY] Override the client's default read consistency
+        @return: [List] Project objects
+        """
+        if self._use_cache(consistency):
+            informer = self.informer
+            items = informer.list()
+        else:
+            informer = None
+            items = self._list_func(**self._list_args)["items"]
 
-    def list(self):
-        response = self.project_client.list_namespaced_custom_object(**self.resource_args)
+        # The list items are complete resources, so the snapshots need no extra round trip
         projects = []
-        for item in response["items"]:
-            project = Project(name=item["metadata"]["name"], attributes=item["spec"])
+        for item in items:
+            project = Project(data=item, informer=informer, ttl=self.ttl, api=self.api, routing=self.routing)
             projects.append(project)
         return projects
 
-    def get(self, name):
-        return Project(name)
+    def query(self, limit=None, cursor=None, sort=None, filters=(), consistency=None):
+        """
+        Returns a single filtered and sorted page of projects.
+        A warm informer cache serves the page from a sorted index. Otherwise the query is pushed down to the API
+        server (label and field selectors, limit and continue) whenever it can answer it, or the page is cut from a
+        one-off sort of a live list.
+        @param limit: [Integer] Max projects per page (None for all of them)
+        @param cursor: [String] The next_cursor of the previous page
+        @param sort: [SORT] name or created, "-" prefixed for descending (None for the API server's order)
+        @param filters: [List] Label and field requirements, for example ["team=ml", "spec.namespace=caml-compute"]
+        @param consistency: [CONSISTENCY] Override the client's default read consistency
+        @raise CamlArgumentsError: on invalid arguments or an expired cursor
+        @return: ListPage of Project objects
+        """
+        query = ListQuery(limit=limit, cursor=cursor, sort=sort, filters=filters)
+        plan = query.plan(lambda: self._use_cache(consistency), SELECTABLE_FIELDS,
+                          native_sorts(self.sharding.is_sharded))
+
+        if plan == QUERY_PLAN.PUSH_DOWN:
+            try:
+                items, next_cursor = query.server_page(self._list_func(**self._list_args, **query.list_args))
+                projects = [Project(data=item, ttl=self.ttl, api=self.api, routing=self.routing) for item in items]
+                return ListPage(projects, next_cursor)
+            except ApiException as e:
+                if not query.can_fall_back(e.status):
+                    raise e
+
+        informer = version = None
+        if plan == QUERY_PLAN.CACHE:
+            informer = self.informer
+            items, next_cursor, version = query.cached_page(informer)
+        else:
+            items, next_cursor = query.live_page(self._list_func(**self._list_args)["items"])
+
+        projects = [Project(data=item, informer=informer, ttl=self.ttl, api=self.api, routing=self.routing)
+                    for item in items]
+        return ListPage(projects, next_cursor, version)
+
+    def list_records(self, label_selector=None):
+        """
+        Lists the projects' metadata only, the API server does not send the specs
+        This is always a live read.
+        @param label_selector: [String] Optional kubernetes label selector
+        @return: [List] ProjectRecord objects
+        """
+        if self.sharding.is_sharded:
+            path = "/apis/{group}/{version}/{plural}".format(**self.resource_args)
+        else:
+            path = "/apis/{group}/{version}/namespaces/{namespace}/{plural}".format(**self._list_args)
+        response = list_partial_metadata(self.project_client.api_client, path, labelSelector=label_selector)
+        return [ProjectRecord.from_raw(item) for item in response["items"]]
+
+    def iter(self, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Iterates over the projects page by page, only one page is held in memory at a time
+        This is always a live read.
+        @param page_size: [Integer] Max projects fetched per API call
+        @return: Generator of Project objects
+        """
+        items = iter_list_items(self._list_func, page_size, **self._list_args)
+        for item in items:
+            yield Project(data=item, ttl=self.ttl, api=self.api, routing=self.routing)
+
+    def get(self, name, consistency=None):
+        """
+        Returns a project by name
+        @param name: [String] The project name
+        @param consistency: [CONSISTENCY] Override the client's default read consistency
+        @return: Project object
+        """
+        if not self._use_cache(consistency):
+            # The snapshot is loaded on first access
+            return Project(name, ttl=self.ttl, api=self.api, routing=self.routing,
+                           namespace=self.sharding.namespace_for(name))
+
+        data = self.informer.get(name)
+        if data is None:
+            raise CamlNotFoundError("Project not found")
+        return Project(data=data, informer=self.informer, ttl=self.ttl, api=self.api, routing=self.routing)
 
     def delete(self, name):
         try:
-            self.project_client.delete_namespaced_custom_object(**self.resource_args, name=name)
+            self.project_client.delete_namespaced_custom_object(**self.resource_args, name=name,
+                                                                namespace=self.sharding.namespace_for(name))
         except ApiException as e:
             if e.status == 404:
                 raise CamlNotFoundError("Project not found")
+
+    def close(self):
+        """
+        Stops the informer, later cached reads start it again
+        @return: None
+        """
+        self.informer.stop()
+
+    def _use_cache(self, consistency):
+        """
+        Checks if a read should be served from the informer cache, starting the informer on first use
+        @param consistency: [CONSISTENCY] The requested consistency (None for the client's default)
+        @return: [Boolean]
+        """
+        if (consistency or self.consistency) != CONSISTENCY.CACHED:
+            return False
+
+        self.informer.start()
+        return self.informer.wait_for_sync(INFORMER_SYNC_TIMEOUT)
@@ -1,2 +1,10 @@
-from .workspace import Workspace
-from .workspaces_client import WORKSPACES, WorkspacesClient
+from .async_workspace import AsyncWorkspace
+from .async_workspaces_client import AsyncWorkspacesClient
+from .culler import ActivityProbe, AnnotationActivityProbe, CullReport, IdleCuller, JupyterActivityProbe
+from .event_hub import AsyncWorkspaceEventHub, SubscriptionEvicted, WorkspaceSubscription
+from .gateway import WorkspaceGateway, run_gateway
+from .image_cache import ImageCache, NodeImageStatus, get_image_cache
+from .lifecycle import WORKSPACE_PHASE, WorkspaceEvent
+from .warm_pool import WarmPool, WarmPools, get_warm_pools
+from .workspace import ROUTING_MODE, Workspace, WorkspaceRecord
+from .workspaces_client import WORKSPACES, BulkResult, WorkspacesClient
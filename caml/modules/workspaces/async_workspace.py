@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import time
+
+from kubernetes_asyncio import client
+from kubernetes_asyncio.client.exceptions import ApiException
+
+from caml.errors import CamlNotFoundError
+from caml.kube.consts import CAML_COMPUTE_NAMESPACE, CAML_PROVISIONING_ANNOTATION, CAML_WORKSPACE_LABEL
+from caml.kube.sharding import ShardingPolicy
+from caml.modules.workspaces.event_hub import AsyncWorkspaceEventHub, SubscriptionEvicted
+from caml.modules.workspaces.lifecycle import (DEFAULT_READY_TIMEOUT, TIMEOUT_REASON, WORKSPACE_PHASE,
+                                               ProvisioningTimeline, WorkspaceReadiness, deployment_failure,
+                                               is_settled, resume_patch)
+from caml.modules.workspaces.workspace import get_resource_name
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWorkspace:
+    """
+    The asyncio counterpart of Workspace, every call goes through the shared non-blocking api client.
+    """
+
+    def __init__(self, api_client, project, name, attributes=None, resource_name=None,
+                 namespace=CAML_COMPUTE_NAMESPACE, events=None):
+        """
+        @param api_client: [kubernetes_asyncio.client.ApiClient] The shared api client
+        @param project: [String] The project name
+        @param name: [String] The workspace name
+        @param attributes: [Dict] The deployment spec (when the workspace was listed)
+        @param resource_name: [String] The name of the workspace's kubernetes resources (derived from the names)
+        @param namespace: [String] The workspace's namespace
+        @param events: [AsyncWorkspaceEventHub] A shared hub to wait on (a single workspace watch is used without it)
+        """
+        if attributes:
+            self.attributes = {**attributes}
+
+        self.name = name
+        self.project = project
+        self.resource_name = resource_name or get_resource_name(project, name)
+        self.namespace = namespace
+        self.events = events
+
+        self.api_client = api_client
+        self.core_api = client.CoreV1Api(api_client)
+        self.apps_api = client.AppsV1Api(api_client)
+
+    async def delete(self):
+        """
+        Deletes the workspace, the service is deleted even if the deployment delete failed
+        @raise CamlNotFoundError: if neither the deployment nor the service exist
+        @return: None
+        """
+        results = await asyncio.gather(
+            self.apps_api.delete_namespaced_deployment(name=self.resource_name, namespace=self.namespace),
+            self.core_api.delete_namespaced_service(name=self.resource_name, namespace=self.namespace),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+
+        failures = [e for e in errors if not isinstance(e, ApiException) or e.status != 404]
+        if failures:
+            raise failures[0]
+        # A partially created workspace has only one of them
+        if len(errors) == 2:
+            raise CamlNotFoundError("Workspace not found")
+
+    async def resume(self):
+        """
+        The asyncio counterpart of Workspace.resume
+        @raise CamlNotFoundError: if the workspace does not exist
+        @return: [Boolean] False if the workspace was not culled
+        """
+        body = resume_patch(await self._read_deployment())
+        if body is None:
+            return False
+
+        try:
+            await self.apps_api.patch_namespaced_deployment(name=self.resource_name, namespace=self.namespace,
+                                                            body=body)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Workspace not found")
+            raise e
+        return True
+
+    async def wait_until_ready(self, timeout=DEFAULT_READY_TIMEOUT):
+        """
+        The asyncio counterpart of Workspace.wait_until_ready, driven by the workspace events
+        @param timeout: [Float] Max seconds to wait
+        @raise CamlNotFoundError: if the workspace does not exist
+        @return: WorkspaceReadiness (truthy when ready), holds the reason when the workspace is not ready
+        """
+        started = time.monotonic()
+        deployment = await self._read_deployment()
+
+        failure = deployment_failure(deployment)
+        if failure:
+            return WorkspaceReadiness(WORKSPACE_PHASE.FAILED, *failure, elapsed=time.monotonic() - started)
+
+        events = self.events or AsyncWorkspaceEventHub(
+            self.api_client,
+            sharding=ShardingPolicy(namespace=self.namespace),
+            label_selector=f"{CAML_WORKSPACE_LABEL}={self.resource_name}"
+        )
+        try:
+            event = await asyncio.wait_for(self._wait_for_settled(events), timeout)
+        except asyncio.TimeoutError:
+            event = events.get(self.project, self.name)
+        finally:
+            if events is not self.events:
+                await events.close()
+        elapsed = time.monotonic() - started
+
+        if event is None:
+            # No pod at all, the deployment may have failed to create it since the first read
+            failure = deployment_failure(await self._read_deployment())
+            if failure:
+                return WorkspaceReadiness(WORKSPACE_PHASE.FAILED, *failure, elapsed=elapsed)
+            return WorkspaceReadiness(WORKSPACE_PHASE.PENDING, TIMEOUT_REASON,
+                                      "Waiting for the workspace pod to be created", elapsed=elapsed)
+
+        if event.phase != WORKSPACE_PHASE.READY:
+            if is_settled(event.phase, event.reason):
+                return WorkspaceReadiness(event.phase, event.reason, event.message, elapsed=elapsed)
+            message = f"The workspace is {event.phase}" + (f" ({event.reason})" if event.reason else "")
+            return WorkspaceReadiness(event.phase, TIMEOUT_REASON, message, elapsed=elapsed)
+
+        timeline = await self._get_timeline(deployment, event.pod)
+        await self._record_provisioning(timeline)
+        return WorkspaceReadiness(event.phase, elapsed=elapsed, timeline=timeline)
+
+    async def _wait_for_settled(self, events):
+        while True:
+            subscription = events.subscribe(project=self.project, name=self.name)
+            try:
+                async for event in subscription:
+                    if is_settled(event.phase, event.reason):
+                        return event
+            except SubscriptionEvicted:
+                # Only a single workspace is followed, resubscribing starts again from its current phase
+                continue
+            finally:
+                subscription.close()
+
+    async def _read_deployment(self):
+        try:
+            deployment = await self.apps_api.read_namespaced_deployment(name=self.resource_name,
+                                                                        namespace=self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Workspace not found")
+            raise e
+        return self.api_client.sanitize_for_serialization(deployment)
+
+    async def _get_timeline(self, deployment, pod_name):
+        pod, pod_events = await asyncio.gather(
+            self.core_api.read_namespaced_pod(name=pod_name, namespace=self.namespace),
+            self.core_api.list_namespaced_event(
+                namespace=self.namespace,
+                field_selector=f"involvedObject.kind=Pod,involvedObject.name={pod_name}"
+            ),
+        )
+        return ProvisioningTimeline.from_raw(
+            deployment,
+            self.api_client.sanitize_for_serialization(pod),
+            self.api_client.sanitize_for_serialization(pod_events)["items"]
+        )
+
+    async def _record_provisioning(self, timeline):
+        # Best effort, the breakdown is informational and must not fail a ready workspace
+        body = {"metadata": {"annotations": {CAML_PROVISIONING_ANNOTATION: json.dumps(timeline.durations)}}}
+        try:
+            await self.apps_api.patch_namespaced_deployment(name=self.resource_name, namespace=self.namespace,
+                                                            body=body)
+        except ApiException as e:
+            logger.warning(f"failed to record the provisioning of {self.resource_name}: {e}")
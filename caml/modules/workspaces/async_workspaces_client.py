@@ -0,0 +1,123 @@
+import asyncio
+import logging
+
+from kubernetes_asyncio import client
+from kubernetes_asyncio.client.exceptions import ApiException
+
+from caml.errors import CamlConflictError
+from caml.kube.consts import CAML_COMPUTE_NAMESPACE
+from caml.modules.workspaces.async_workspace import AsyncWorkspace
+from caml.modules.workspaces.lifecycle import DEFAULT_READY_TIMEOUT
+from caml.modules.workspaces.workspace import ROUTING_MODE, get_resource_name
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWorkspacesClient:
+    """
+    The asyncio counterpart of WorkspacesClient.
+    """
+
+    def __init__(self, api_client, project="test", namespace=CAML_COMPUTE_NAMESPACE, events=None,
+                 routing=ROUTING_MODE.LOAD_BALANCER):
+        """
+        @param api_client: [kubernetes_asyncio.client.ApiClient] The shared api client
+        @param project: [String] The project name
+        @param namespace: [String] The namespace of the project's workspaces
+        @param events: [AsyncWorkspaceEventHub] A shared hub to wait on (a single workspace watch is used without it)
+        @param routing: [ROUTING_MODE] How the created workspaces are reached
+        """
+        self.project = project
+        self.namespace = namespace
+        self.events = events
+        self.routing = routing
+        self.api_client = api_client
+        self.core_api = client.CoreV1Api(api_client)
+        self.apps_api = client.AppsV1Api(api_client)
+
+    async def create(self, ws_class, name):
+        """
+        Creates a workspace, a workspace that failed half way is deleted again
+        NOTE: unlike WorkspacesClient.create the image is not digest pinned and warm pools are not used, both read
+        the cluster through the blocking client.
+        @param ws_class: The workspace class (for example WORKSPACES.JUPYTER_NOTEBOOK)
+        @param name: [String] The workspace name
+        @raise CamlConflictError: if the workspace already exists
+        @return: AsyncWorkspace
+        """
+        workspace = ws_class(project=self.project, name=name, routing=self.routing)
+
+        # The deployment and the service don't depend on each other, create them concurrently
+        creates = (
+            (self.apps_api.create_namespaced_deployment, workspace.deployment,
+             self.apps_api.delete_namespaced_deployment),
+            (self.core_api.create_namespaced_service, workspace.service, self.core_api.delete_namespaced_service),
+        )
+        results = await asyncio.gather(*[self._create(create, body) for create, body, _ in creates],
+                                       return_exceptions=True)
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            # The created half is deleted again, so a retry does not conflict with it
+            for (_, _, delete), result in zip(creates, results):
+                if not isinstance(result, Exception):
+                    await self._rollback(delete, workspace.resource_name)
+            raise errors[0]
+
+        return self._workspace(name)
+
+    async def list(self):
+        label_selector = f"project={self.project}"
+        response = await self.apps_api.list_namespaced_deployment(
+            namespace=self.namespace,
+            label_selector=label_selector
+        )
+
+        prefix = get_resource_name(self.project, "")
+        workspaces = []
+        for item in response.items:
+            resource_name = item.metadata.name
+            name = resource_name[len(prefix):] if resource_name.startswith(prefix) else resource_name
+            workspace = AsyncWorkspace(self.api_client, project=self.project, name=name,
+                                       attributes=item.spec.to_dict(), resource_name=resource_name,
+                                       namespace=self.namespace, events=self.events)
+            workspaces.append(workspace)
+        return workspaces
+
+    async def resume(self, name):
+        """
+        The asyncio counterpart of Workspace.resume
+        @param name: [String] The workspace name
+        @raise CamlNotFoundError: if the workspace does not exist
+        @return: [Boolean] False if the workspace was not culled
+        """
+        return await self._workspace(name).resume()
+
+    async def wait_until_ready(self, name, timeout=DEFAULT_READY_TIMEOUT):
+        """
+        The asyncio counterpart of Workspace.wait_until_ready, driven by the workspace events
+        @param name: [String] The workspace name
+        @param timeout: [Float] Max seconds to wait
+        @raise CamlNotFoundError: if the workspace does not exist
+        @return: WorkspaceReadiness (truthy when ready), holds the reason when the workspace is not ready
+        """
+        return await self._workspace(name).wait_until_ready(timeout=timeout)
+
+    def _workspace(self, name):
+        return AsyncWorkspace(self.api_client, project=self.project, name=name, namespace=self.namespace,
+                              events=self.events)
+
+    async def _rollback(self, delete_func, resource_name):
+        # Best effort, the create error is the one that is reported
+        try:
+            await delete_func(name=resource_name, namespace=self.namespace)
+        except ApiException as e:
+            logger.warning(f"failed to roll back the partially created workspace {resource_name}: {e}")
+
+    async def _create(self, create_func, body):
+        try:
+            await create_func(namespace=self.namespace, body=body)
+        except ApiException as e:
+            if e.status == 409:
+                raise CamlConflictError("Workspace already exists")
+            raise e
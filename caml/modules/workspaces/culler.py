@@ -0,0 +1,338 @@
+import logging
+import threading
+import time
+
+import requests
+from kubernetes.client.exceptions import ApiException
+from kubernetes.utils import parse_quantity
+
+from caml.kube.api import get_default_api
+from caml.kube.consts import (CAML_ACTIVITY_ANNOTATION, CAML_BASE_URL_ANNOTATION, CAML_EXTENSION_GROUP,
+                              CAML_REPLICAS_ANNOTATION, CAML_RESUMED_ANNOTATION, CAML_WORKSPACE_LABEL)
+from caml.kube.sharding import ShardingPolicy
+from caml.kube.utils import read_raw_json
+from caml.metrics import Counter, Gauge
+from caml.modules.workspaces.jupyter_notebook import JUPYTER_TOKEN_ENV
+from caml.modules.workspaces.lifecycle import cull_patch, is_culled, parse_time, pod_requests
+
+logger = logging.getLogger(__name__)
+
+# Seconds without activity before a workspace is scaled to zero, unless its project sets idle_timeout
+DEFAULT_IDLE_TIMEOUT = 2 * 60 * 60
+# Seconds between two passes of the culler
+DEFAULT_CULL_INTERVAL = 5 * 60
+# The workspace deployments (every workspace template sets these labels)
+WORKSPACE_SELECTOR = "component=workspace,project"
+
+WORKSPACES_CULLED = Counter(
+    "caml_workspaces_culled_total",
+    "Idle workspaces that were scaled to zero"
+)
+CULLED_WORKSPACES = Gauge(
+    "caml_culled_workspaces",
+    "Workspaces that are currently scaled to zero by the idle culler"
+)
+RECLAIMED_CAPACITY = Gauge(
+    "caml_reclaimed_capacity",
+    "Resource requests released by the culled workspaces (cpu in cores, memory in bytes)",
+    ["resource"]
+)
+
+
+class ActivityProbe:
+    """
+    Reports when a workspace was last used, subclass it to plug in another activity source
+    """
+
+    def last_activity(self, deployment):
+        """
+        @param deployment: [Dict] The raw workspace deployment json
+        @return: [Float] Epoch seconds of the last activity, None if the probe knows nothing about the workspace
+        @raise Exception: if the probe failed, the workspace is not culled on this pass
+        """
+        raise NotImplementedError
+
+
+class AnnotationActivityProbe(ActivityProbe):
+    """
+    Reads the activity that was reported from outside of the workspace (for example by the gateway)
+    """
+
+    def last_activity(self, deployment):
+        value = (deployment["metadata"].get("annotations") or {}).get(CAML_ACTIVITY_ANNOTATION)
+        return float(value) if value else None
+
+
+class JupyterActivityProbe(ActivityProbe):
+    """
+    Asks the Jupyter server of the workspace for its last HTTP and kernel activity.
+    A kernel that is busy counts as active now, a long computation produces no other activity.
+    A server that rejects the token or cannot be reached reports nothing, the other probes decide for it.
+    NOTE: calls the workspace's service by its cluster DNS name, so it only works from inside the cluster.
+    """
+
+    def __init__(self, token=None, api=None, port=80, timeout=5):
+        """
+        @param token: [String] The Jupyter token of every workspace (None reads each workspace's own token from
+                      its pod)
+        @param api: [KubeApi] The shared kubernetes api (defaults to the process wide one)
+        @param port: [Integer] The port of the workspace's service
+        @param timeout: [Float] Seconds before a request is abandoned
+        """
+        self.token = token
+        self.api = api or get_default_api()
+        self.port = port
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def last_activity(self, deployment):
+        metadata = deployment["metadata"]
+        # Workspaces behind the gateway are served under their own path
+        path = (metadata.get("annotations") or {}).get(CAML_BASE_URL_ANNOTATION, "/")
+        base_url = f"http://{metadata['name']}.{metadata['namespace']}.svc:{self.port}{path}"
+
+        token = self.token or self._pod_token(deployment)
+        headers = {"Authorization": f"token {token}"} if token else {}
+        try:
+            kernels = self._get(f"{base_url}api/kernels", headers)
+            if any(kernel.get("execution_state") == "busy" for kernel in kernels):
+                return time.time()
+
+            status = self._get(f"{base_url}api/status", headers)
+        except requests.ConnectionError as e:
+            logger.debug(f"jupyter server of {metadata['name']} is unreachable: {e}")
+            return None
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code in (401, 403):
+                logger.debug(f"jupyter server of {metadata['name']} rejected the activity probe: {e}")
+                return None
+            raise e
+        return parse_time(status.get("last_activity"))
+
+    def _pod_token(self, deployment):
+        """
+        A warm pod adopted by the workspace keeps the token it was started with, so it is read from the pod rather
+        than from the deployment's template
+        @param deployment: [Dict] The raw workspace deployment json
+        @return: [String] The token of the workspace's running pod, None if it has none
+        """
+        metadata = deployment["metadata"]
+        response = self.api.core.list_namespaced_pod(namespace=metadata["namespace"],
+                                                     label_selector=f"{CAML_WORKSPACE_LABEL}={metadata['name']}",
+                                                     _preload_content=False)
+        for pod in read_raw_json(response)["items"]:
+            if pod["metadata"].get("deletionTimestamp"):
+                continue
+            for container in pod["spec"]["containers"]:
+                for env in container.get("env") or []:
+                    if env["name"] == JUPYTER_TOKEN_ENV and env.get("value"):
+                        return env["value"]
+        return None
+
+    def _get(self, url, headers):
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+class CullReport:
+    """
+    The outcome of a single pass of the culler
+    """
+
+    def __init__(self):
+        # (namespace, workspace resource name) of the workspaces that were scaled to zero on this pass
+        self.culled = []
+        self.cpu = parse_quantity(0)
+        self.memory = parse_quantity(0)
+
+    def add(self, deployment, replicas=None):
+        """
+        @param deployment: [Dict] The raw deployment json of a culled workspace
+        @param replicas: [Integer] The replicas it had before it was culled (defaults to its current replicas)
+        @return: None
+        """
+        cpu, memory = pod_requests(deployment)
+        replicas = deployment["spec"].get("replicas", 1) if replicas is None else replicas
+        self.culled.append((deployment["metadata"]["namespace"], deployment["metadata"]["name"]))
+        self.cpu += cpu * replicas
+        self.memory += memory * replicas
+
+    def to_dict(self):
+        return {"culled": [name for _, name in self.culled], "cpu": float(self.cpu), "memory": int(self.memory)}
+
+    def __repr__(self):
+        return f"CullReport({len(self.culled)} culled, cpu={float(self.cpu)}, memory={int(self.memory)})"
+
+
+class IdleCuller:
+    """
+    Scales idle workspaces to zero replicas. The service, the labels and the deployment itself are kept,
+    so Workspace.resume() (or the first request through the gateway) brings the workspace back.
+    A workspace is only culled when one of the probes reported its activity, a workspace no probe knows about is
+    left running. The idle time is counted from the latest of the activity, the creation and the last resume.
+    """
+
+    def __init__(self, api=None, sharding=None, probes=None, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 interval=DEFAULT_CULL_INTERVAL, dry_run=False):
+        """
+        @param api: [KubeApi] The shared kubernetes api (defaults to the process wide one)
+        @param sharding: [ShardingPolicy] The namespace placement of the projects (defaults to the compute namespace)
+        @param probes: [List] ActivityProbe objects (defaults to the activity reported by the gateway and the
+                       kernel and HTTP activity of the workspaces' Jupyter servers)
+        @param idle_timeout: [Float] Default seconds without activity, overridden by a project's spec.idle_timeout
+        @param interval: [Float] Seconds between two passes of the background thread
+        @param dry_run: [Boolean] Only report the idle workspaces
+        """
+        self.api = api or get_default_api()
+        self.sharding = sharding or ShardingPolicy()
+        self.probes = probes if probes is not None else [AnnotationActivityProbe(), JupyterActivityProbe(api=self.api)]
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+        self.dry_run = dry_run
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts culling in a background thread (no-op if it is already running)
+        @return: None
+        """
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="caml-idle-culler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run_once(self):
+        """
+        Culls the workspaces that are idle right now
+        @return: CullReport
+        """
+        now = time.time()
+        idle_timeouts = self._project_idle_timeouts()
+        report = CullReport()
+
+        deployments = self._list_workspaces()
+        for deployment in deployments:
+            if deployment["spec"].get("replicas", 1) == 0:
+                continue
+
+            project = deployment["metadata"]["labels"]["project"]
+            idle_timeout = idle_timeouts.get(project, self.idle_timeout)
+            if not idle_timeout:
+                continue
+
+            last_activity = self._last_activity(deployment)
+            if last_activity is None or now - last_activity < idle_timeout:
+                continue
+
+            if self.dry_run or self._cull(deployment):
+                report.add(deployment)
+
+        if not self.dry_run:
+            self._update_metrics(deployments, report)
+        return report
+
+    def reclaimed_capacity(self):
+        """
+        @return: [Dict] The number of culled workspaces and the cpu (cores) and memory (bytes) their requests released
+        """
+        report = self._reclaimed(self._list_workspaces())
+        return {"workspaces": len(report.culled), "cpu": float(report.cpu), "memory": int(report.memory)}
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                report = self.run_once()
+                if report.culled:
+                    logger.info(f"culled idle workspaces: {report}")
+            except Exception as e:
+                logger.warning(f"idle culler pass failed: {e}")
+            self._stopped.wait(self.interval)
+
+    def _last_activity(self, deployment):
+        """
+        @return: [Float] Epoch seconds of the latest known activity, None if no probe reported any
+        """
+        reported = []
+        for probe in self.probes:
+            try:
+                reported.append(probe.last_activity(deployment))
+            except Exception as e:
+                logger.debug(f"activity probe {type(probe).__name__} failed for {deployment['metadata']['name']}: {e}")
+                # Unknown is not idle
+                return None
+
+        reported = [value for value in reported if value is not None]
+        if not reported:
+            return None
+
+        metadata = deployment["metadata"]
+        started = [parse_time(metadata.get("creationTimestamp")),
+                   parse_time((metadata.get("annotations") or {}).get(CAML_RESUMED_ANNOTATION))]
+        return max(reported + [value for value in started if value is not None])
+
+    def _cull(self, deployment):
+        """
+        @return: [Boolean] False if the deployment changed since it was listed (it is left for the next pass)
+        """
+        metadata = deployment["metadata"]
+        try:
+            self.api.apps.patch_namespaced_deployment(name=metadata["name"], namespace=metadata["namespace"],
+                                                      body=cull_patch(deployment))
+        except ApiException as e:
+            if e.status in (404, 409):
+                return False
+            raise e
+
+        WORKSPACES_CULLED.inc()
+        return True
+
+    def _update_metrics(self, deployments, report):
+        # The deployments were listed before this pass culled the ones in the report
+        reclaimed = self._reclaimed(deployments)
+        CULLED_WORKSPACES.set(len(reclaimed.culled) + len(report.culled))
+        RECLAIMED_CAPACITY.labels("cpu").set(float(reclaimed.cpu + report.cpu))
+        RECLAIMED_CAPACITY.labels("memory").set(float(reclaimed.memory + report.memory))
+
+    @staticmethod
+    def _reclaimed(deployments):
+        """
+        @return: CullReport of the deployments that are culled
+        """
+        report = CullReport()
+        for deployment in deployments:
+            if is_culled(deployment):
+                report.add(deployment, replicas=int(deployment["metadata"]["annotations"][CAML_REPLICAS_ANNOTATION]))
+        return report
+
+    def _list_workspaces(self):
+        if self.sharding.is_sharded:
+            response = self.api.apps.list_deployment_for_all_namespaces(label_selector=WORKSPACE_SELECTOR,
+                                                                        _preload_content=False)
+        else:
+            response = self.api.apps.list_namespaced_deployment(namespace=self.sharding.namespace,
+                                                                label_selector=WORKSPACE_SELECTOR,
+                                                                _preload_content=False)
+        return read_raw_json(response)["items"]
+
+    def _project_idle_timeouts(self):
+        """
+        @return: [Dict] project name -> spec.idle_timeout, for the projects that set one
+        """
+        resource_args = {"group": CAML_EXTENSION_GROUP, "version": "v1", "plural": "projects"}
+        if self.sharding.is_sharded:
+            response = self.api.custom_objects.list_cluster_custom_object(**resource_args)
+        else:
+            response = self.api.custom_objects.list_namespaced_custom_object(**resource_args,
+                                                                             namespace=self.sharding.namespace)
+        return {item["metadata"]["name"]: item["spec"]["idle_timeout"] for item in response["items"]
+                if (item.get("spec") or {}).get("idle_timeout") is not None}
@@ -0,0 +1,344 @@
+import asyncio
+import json
+import logging
+
+from kubernetes_asyncio import client
+
+from caml.errors import CamlError
+from caml.kube.consts import CAML_WORKSPACE_LABEL
+from caml.kube.sharding import ShardingPolicy
+from caml.kube.utils import HTTP_STATUS_GONE
+from caml.modules.workspaces.lifecycle import WORKSPACE_PHASE, WorkspaceEvent, pod_event
+
+logger = logging.getLogger(__name__)
+
+# Max events buffered for a single subscriber before it is considered too slow and evicted
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 256
+# Bytes read from the watch response at a time
+WATCH_CHUNK_SIZE = 64 * 1024
+
+
+class SubscriptionEvicted(CamlError):
+    """
+    Raised to a subscriber that did not keep up with the events and was dropped
+    """
+
+    def __init__(self):
+        super().__init__("The subscriber fell behind the workspace events and was evicted")
+
+
+class WorkspaceSubscription:
+    """
+    A subscriber's view of the workspace events, iterate over it (async for) or call get().
+    The subscription starts with the current phase of every matching workspace.
+    """
+
+    _END = object()
+
+    def __init__(self, hub, project=None, name=None, queue_size=DEFAULT_SUBSCRIBER_QUEUE_SIZE):
+        """
+        @param hub: [AsyncWorkspaceEventHub] The hub that publishes the events
+        @param project: [String] Only receive the events of this project (None for every project)
+        @param name: [String] Only receive the events of this workspace (requires a project)
+        @param queue_size: [Integer] Max events buffered before the subscriber is evicted
+        """
+        self.project = project
+        self.name = name
+        self.evicted = False
+        self.closed = False
+        self._hub = hub
+        self._queue = asyncio.Queue(maxsize=queue_size)
+
+    def matches(self, event):
+        """
+        @param event: [WorkspaceEvent] The published event
+        @return: [Boolean] True if the event passes the subscription's filters
+        """
+        if self.project is not None and event.project != self.project:
+            return False
+        return self.name is None or event.name == self.name
+
+    async def get(self):
+        """
+        Waits for the next event
+        @return: [WorkspaceEvent] The event, None once the subscription is closed
+        @raise SubscriptionEvicted: if the subscriber fell behind and was dropped
+        """
+        if self.closed and self._queue.empty():
+            return self._end()
+
+        event = await self._queue.get()
+        if event is self._END:
+            return self._end()
+        return event
+
+    def close(self):
+        """
+        Unsubscribes, a pending get() returns None
+        @return: None
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._hub._unsubscribe(self)
+        self._put_end()
+
+    def _publish(self, event):
+        """
+        Never blocks the hub: a subscriber with a full queue is evicted instead of slowing everyone down
+        @return: [Boolean] False if the subscriber was evicted
+        """
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.evicted = True
+            self.close()
+            return False
+
+    def _put_end(self):
+        # Buffered events are dropped, the end marker must always fit
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(self._END)
+
+    def _end(self):
+        if self.evicted:
+            raise SubscriptionEvicted()
+        return None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class AsyncWorkspaceEventHub:
+    """
+    Streams the lifecycle events of the workspaces to any number of subscribers.
+    A single pod watch (started with the first subscriber) feeds every subscriber of the process,
+    so the load on the API server does not grow with the number of subscribers.
+    """
+
+    def __init__(self, api_client, sharding=None, queue_size=DEFAULT_SUBSCRIBER_QUEUE_SIZE, watch_timeout=300,
+                 retry_interval=5, label_selector=CAML_WORKSPACE_LABEL):
+        """
+        @param api_client: [kubernetes_asyncio.client.ApiClient] The shared api client
+        @param sharding: [ShardingPolicy] The namespace placement of the projects (defaults to the compute namespace)
+        @param queue_size: [Integer] Max events buffered for a subscriber before it is evicted
+        @param watch_timeout: [Integer] Seconds before the server closes a single watch request
+        @param retry_interval: [Integer] Seconds to wait before reconnecting after an unexpected error
+        @param label_selector: [String] The watched pods (every workspace pod by default)
+        """
+        self.core_api = client.CoreV1Api(api_client)
+        self.sharding = sharding or ShardingPolicy()
+        self.queue_size = queue_size
+        self.watch_timeout = watch_timeout
+        self.retry_interval = retry_interval
+        self.label_selector = label_selector
+        self.evictions = 0
+
+        # (namespace, workspace resource name) -> {pod name: (creation timestamp, WorkspaceEvent)}
+        self._pods = {}
+        # (namespace, workspace resource name) -> the last published WorkspaceEvent
+        self._states = {}
+        self._subscribers = set()
+        self._resource_version = None
+        self._synced = asyncio.Event()
+        self._task = None
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    @property
+    def is_synced(self):
+        return self._synced.is_set()
+
+    def subscribe(self, project=None, name=None):
+        """
+        Starts receiving the workspace events, close the subscription when done with it
+        @param project: [String] Only receive the events of this project (None for every project)
+        @param name: [String] Only receive the events of this workspace (requires a project)
+        @return: [WorkspaceSubscription]
+        """
+        snapshot = [event for event in self._states.values()
+                    if (project is None or event.project == project) and (name is None or event.name == name)]
+        # Room for the snapshot on top of the regular buffer
+        subscription = WorkspaceSubscription(self, project, name, queue_size=self.queue_size + len(snapshot))
+        for event in snapshot:
+            subscription._publish(event)
+
+        self._subscribers.add(subscription)
+        self._ensure_watch()
+        return subscription
+
+    def get(self, project, name):
+        """
+        @param project: [String] The project name
+        @param name: [String] The workspace name
+        @return: [WorkspaceEvent] The last known state of the workspace, None if it is unknown
+        """
+        for event in self._states.values():
+            if event.project == project and event.name == name:
+                return event
+        return None
+
+    async def wait_for_sync(self, timeout=None):
+        """
+        Waits until the initial pod list was loaded
+        @param timeout: [Float] Max seconds to wait
+        @return: [Boolean] True if the hub is synced
+        """
+        self._ensure_watch()
+        try:
+            await asyncio.wait_for(self._synced.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self):
+        """
+        Stops the watch and ends every subscription
+        @return: None
+        """
+        for subscription in list(self._subscribers):
+            subscription.close()
+
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._synced.clear()
+
+    def _unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def _ensure_watch(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                if self._resource_version is None:
+                    await self._relist()
+                await self._follow()
+            except asyncio.CancelledError:
+                raise
+            except client.ApiException as e:
+                if e.status == HTTP_STATUS_GONE:
+                    logger.info("workspace events watch expired, relisting")
+                    self._resource_version = None
+                    continue
+                logger.warning(f"workspace events watch failed: {e}")
+                await asyncio.sleep(self.retry_interval)
+            except Exception as e:
+                logger.warning(f"workspace events watch failed: {e}")
+                await asyncio.sleep(self.retry_interval)
+
+    def _list(self, **kwargs):
+        kwargs.update(label_selector=self.label_selector, _preload_content=False)
+        if self.sharding.is_sharded:
+            return self.core_api.list_pod_for_all_namespaces(**kwargs)
+        return self.core_api.list_namespaced_pod(namespace=self.sharding.namespace, **kwargs)
+
+    async def _relist(self):
+        # Raw json, the pod models are never built
+        response = await self._list()
+        async with response:
+            if response.status != 200:
+                raise client.ApiException(status=response.status, reason=await response.text())
+            pod_list = json.loads(await response.read())
+
+        previous = self._pods
+        self._pods = {}
+        for pod in pod_list["items"]:
+            self._set_pod(pod)
+
+        for key in set(previous) | set(self._pods):
+            self._publish_state(key)
+        self._resource_version = pod_list["metadata"]["resourceVersion"]
+        self._synced.set()
+
+    async def _follow(self):
+        response = await self._list(
+            watch=True,
+            resource_version=self._resource_version,
+            timeout_seconds=self.watch_timeout,
+            allow_watch_bookmarks=True,
+            # The client side timeout must outlive the watch, the server ends it first
+            _request_timeout=self.watch_timeout + 30,
+        )
+        async with response:
+            if response.status != 200:
+                raise client.ApiException(status=response.status, reason=await response.text())
+
+            buffer = b""
+            async for chunk in response.content.iter_chunked(WATCH_CHUNK_SIZE):
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        self._handle(json.loads(line))
+
+    def _handle(self, event):
+        obj = event["object"]
+        if event["type"] == "ERROR":
+            raise client.ApiException(status=obj.get("code"), reason=obj.get("message"))
+
+        self._resource_version = obj["metadata"]["resourceVersion"]
+        if event["type"] == "BOOKMARK":
+            return
+
+        key = self._set_pod(obj, deleted=event["type"] == "DELETED")
+        if key is not None:
+            self._publish_state(key)
+
+    def _set_pod(self, pod, deleted=False):
+        """
+        @return: The workspace key of the pod, None if the pod does not belong to a workspace
+        """
+        event = pod_event(pod)
+        if event is None:
+            return None
+
+        pods = self._pods.setdefault(event.key, {})
+        if deleted:
+            pods.pop(event.pod, None)
+            if not pods:
+                del self._pods[event.key]
+        else:
+            pods[event.pod] = (pod["metadata"].get("creationTimestamp") or "", event)
+        return event.key
+
+    def _publish_state(self, key):
+        pods = self._pods.get(key)
+        previous = self._states.get(key)
+        if pods:
+            # During a rollout the newest pod is the one that decides the workspace's phase
+            _, event = max(pods.values(), key=lambda pod: (pod[0], pod[1].pod))
+        elif previous is not None:
+            event = WorkspaceEvent(previous.namespace, previous.project, previous.resource_name,
+                                   WORKSPACE_PHASE.STOPPED)
+        else:
+            return
+
+        if previous is not None and (previous.phase, previous.reason) == (event.phase, event.reason):
+            return
+        if event.phase == WORKSPACE_PHASE.STOPPED:
+            self._states.pop(key, None)
+        else:
+            self._states[key] = event
+
+        for subscription in list(self._subscribers):
+            if subscription.matches(event) and not subscription._publish(event):
+                self.evictions += 1
+                logger.info(f"evicted a slow workspace events subscriber ({subscription.project})")
@@ -0,0 +1,359 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+from aiohttp import web
+from kubernetes_asyncio import client
+from kubernetes_asyncio.client.exceptions import ApiException
+from yarl import URL
+
+from caml.errors import CamlNotFoundError
+from caml.kube.consts import CAML_ACTIVITY_ANNOTATION
+from caml.kube.sharding import ShardingPolicy
+from caml.metrics import Counter, Gauge
+from caml.modules.workspaces.async_workspaces_client import AsyncWorkspacesClient
+from caml.modules.workspaces.event_hub import AsyncWorkspaceEventHub
+from caml.modules.workspaces.lifecycle import WORKSPACE_PHASE
+from caml.modules.workspaces.workspace import ROUTING_MODE, get_base_url, get_resource_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GATEWAY_PORT = 8080
+# Max connections kept open to the workspaces, and to a single workspace
+DEFAULT_UPSTREAM_POOL_SIZE = 1000
+DEFAULT_UPSTREAM_POOL_SIZE_PER_HOST = 100
+# Seconds an idle upstream connection is kept alive for the next request
+UPSTREAM_KEEPALIVE_TIMEOUT = 60
+UPSTREAM_CONNECT_TIMEOUT = 10
+# Right after a workspace became ready its service may not route to the pod yet, connecting is retried
+UPSTREAM_CONNECT_RETRIES = 3
+UPSTREAM_RETRY_INTERVAL = 0.5
+# Max seconds a request waits for a culled (or starting) workspace to become ready
+DEFAULT_RESUME_TIMEOUT = 120
+# Seconds between two reports of a workspace's activity (read by the idle culler)
+DEFAULT_ACTIVITY_INTERVAL = 60
+# The port of the workspace services
+WORKSPACE_SERVICE_PORT = 80
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Connection level headers, they describe a single hop and are never forwarded
+HOP_BY_HOP_HEADERS = frozenset(("connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+                                "trailer", "trailers", "transfer-encoding", "upgrade"))
+# Negotiated separately on each side of a proxied WebSocket
+WEBSOCKET_HEADERS = frozenset(("sec-websocket-key", "sec-websocket-version", "sec-websocket-extensions",
+                               "sec-websocket-accept", "sec-websocket-protocol"))
+
+GATEWAY_REQUESTS = Counter(
+    "caml_gateway_requests_total",
+    "Requests routed to the workspaces by the gateway, by transport and result",
+    ["transport", "result"]
+)
+GATEWAY_WEBSOCKETS = Gauge(
+    "caml_gateway_websockets",
+    "WebSocket connections currently proxied by the gateway"
+)
+GATEWAY_RESUMES = Counter(
+    "caml_gateway_resumes_total",
+    "Culled workspaces that were resumed by a request through the gateway"
+)
+
+
+class WorkspaceGateway:
+    """
+    A single entrypoint to every workspace, routes /{project}/{workspace}/... to the workspace's ClusterIP service.
+    HTTP and WebSocket (Jupyter kernel) traffic is proxied over a pooled, keep-alive upstream session.
+    A request to a culled workspace resumes it and waits until it is ready, every request and WebSocket message
+    counts as the workspace's activity (reported on its deployment, for the idle culler).
+    NOTE: the workspaces must be created with ROUTING_MODE.GATEWAY, so they are served under their gateway path.
+    """
+
+    def __init__(self, api_client, sharding=None, events=None, resume_timeout=DEFAULT_RESUME_TIMEOUT,
+                 activity_interval=DEFAULT_ACTIVITY_INTERVAL, pool_size=DEFAULT_UPSTREAM_POOL_SIZE,
+                 pool_size_per_host=DEFAULT_UPSTREAM_POOL_SIZE_PER_HOST):
+        """
+        @param api_client: [kubernetes_asyncio.client.ApiClient] The shared api client
+        @param sharding: [ShardingPolicy] The namespace placement of the projects (defaults to the compute namespace)
+        @param events: [AsyncWorkspaceEventHub] The shared workspace events (the gateway watches on its own without)
+        @param resume_timeout: [Float] Max seconds a request waits for a workspace to become ready
+        @param activity_interval: [Float] Seconds between two activity reports of a workspace
+        @param pool_size: [Integer] Max connections to the workspaces
+        @param pool_size_per_host: [Integer] Max connections to a single workspace
+        """
+        self.api_client = api_client
+        self.sharding = sharding or ShardingPolicy()
+        self.events = events or AsyncWorkspaceEventHub(api_client, sharding=self.sharding)
+        self.resume_timeout = resume_timeout
+        self.activity_interval = activity_interval
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.apps_api = client.AppsV1Api(api_client)
+
+        self._owns_events = events is None
+        self._session = None
+        # (project, workspace) -> the running resume of the workspace, shared by the requests that wait for it
+        self._starting = {}
+        # (project, workspace) -> epoch seconds of the last request, and of the last report
+        self._activity = {}
+        self._reported = {}
+        self._reporter = None
+
+    def app(self):
+        """
+        @return: [aiohttp.web.Application] The gateway application, starts and closes the gateway with it
+        """
+        app = web.Application()
+        app.router.add_route("*", "/{project}/{workspace}{path:.*}", self.handle)
+
+        async def on_startup(_):
+            await self.start()
+
+        async def on_cleanup(_):
+            await self.close()
+
+        app.on_startup.append(on_startup)
+        app.on_cleanup.append(on_cleanup)
+        return app
+
+    async def start(self):
+        """
+        Opens the upstream connection pool and starts reporting the activity
+        @return: None
+        """
+        connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size_per_host,
+                                         keepalive_timeout=UPSTREAM_KEEPALIVE_TIMEOUT)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            # The requests of many users share the session, cookies are only ever passed through
+            cookie_jar=aiohttp.DummyCookieJar(),
+            # Bodies are passed through as they are, compressed or not
+            auto_decompress=False,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=UPSTREAM_CONNECT_TIMEOUT),
+        )
+        self._reporter = asyncio.get_running_loop().create_task(self._report_activity())
+        # The first requests are routed by the phase of the workspaces, load it ahead of them
+        await self.events.wait_for_sync(timeout=UPSTREAM_CONNECT_TIMEOUT)
+
+    async def close(self):
+        """
+        Reports the pending activity and closes the upstream connections
+        @return: None
+        """
+        if self._reporter:
+            self._reporter.cancel()
+            try:
+                await self._reporter
+            except asyncio.CancelledError:
+                pass
+            self._reporter = None
+            await self._flush_activity()
+
+        if self._session:
+            await self._session.close()
+            self._session = None
+        if self._owns_events:
+            await self.events.close()
+
+    async def handle(self, request):
+        """
+        Routes a single request (HTTP or WebSocket upgrade) to its workspace
+        @param request: [aiohttp.web.Request] The request
+        @return: [aiohttp.web.StreamResponse]
+        """
+        project, name = request.match_info["project"], request.match_info["workspace"]
+        # The workspace is served under its base url, relative links resolve against the trailing slash
+        if not request.match_info["path"]:
+            raise web.HTTPPermanentRedirect(URL(get_base_url(project, name)).with_query(request.query))
+
+        is_websocket = request.headers.get("Upgrade", "").lower() == "websocket"
+        transport = "websocket" if is_websocket else "http"
+        try:
+            readiness = await self._ensure_ready(project, name)
+        except CamlNotFoundError:
+            GATEWAY_REQUESTS.labels(transport, "not_found").inc()
+            return web.json_response({"error": "Workspace not found"}, status=404)
+
+        if readiness is not None and not readiness:
+            GATEWAY_REQUESTS.labels(transport, "unavailable").inc()
+            return web.json_response(
+                {"error": "The workspace is not ready", "phase": readiness.phase, "reason": readiness.reason,
+                 "message": readiness.message},
+                status=503,
+                headers={"Retry-After": "5"}
+            )
+
+        self._touch(project, name)
+        upstream = self._upstream_url(project, name, request)
+        try:
+            if is_websocket:
+                response = await self._proxy_websocket(request, upstream, project, name)
+            else:
+                response = await self._proxy_http(request, upstream)
+        except (aiohttp.ClientConnectorError, aiohttp.WSServerHandshakeError) as e:
+            # Only raised before the response was started, a failure while streaming drops the client connection
+            logger.warning(f"gateway upstream {upstream.host} failed: {e}")
+            GATEWAY_REQUESTS.labels(transport, "upstream_error").inc()
+            return web.json_response({"error": "The workspace is unreachable"}, status=502)
+
+        GATEWAY_REQUESTS.labels(transport, "ok").inc()
+        return response
+
+    async def _ensure_ready(self, project, name):
+        """
+        Resumes the workspace if it was culled, and waits for a workspace that is not ready
+        @return: [WorkspaceReadiness] None if the workspace was ready right away
+        """
+        event = self.events.get(project, name)
+        if event is not None and event.phase == WORKSPACE_PHASE.READY:
+            return None
+
+        # A burst of requests to a cold workspace resumes it once
+        key = (project, name)
+        task = self._starting.get(key)
+        if task is None:
+            task = self._starting[key] = asyncio.ensure_future(self._resume(project, name))
+            task.add_done_callback(lambda _: self._starting.pop(key, None))
+        # A request that gives up must not cancel the resume the other requests wait for
+        return await asyncio.shield(task)
+
+    async def _resume(self, project, name):
+        workspaces = AsyncWorkspacesClient(self.api_client, project=project,
+                                           namespace=self.sharding.namespace_for(project), events=self.events,
+                                           routing=ROUTING_MODE.GATEWAY)
+        if await workspaces.resume(name):
+            GATEWAY_RESUMES.inc()
+            logger.info(f"resuming culled workspace {project}/{name}")
+        return await workspaces.wait_until_ready(name, timeout=self.resume_timeout)
+
+    def _upstream_url(self, project, name, request):
+        host = f"{get_resource_name(project, name)}.{self.sharding.namespace_for(project)}.svc"
+        # The path is kept as is, the workspace serves it under its base url
+        return URL(f"http://{host}:{WORKSPACE_SERVICE_PORT}{request.raw_path}", encoded=True)
+
+    @staticmethod
+    def _upstream_headers(request, excluded=HOP_BY_HOP_HEADERS):
+        headers = {key: value for key, value in request.headers.items() if key.lower() not in excluded}
+        # The workspace checks the origin of its WebSockets against the host the browser used
+        headers["X-Forwarded-Host"] = request.host
+        headers["X-Forwarded-Proto"] = request.scheme
+        forwarded_for = request.headers.get("X-Forwarded-For")
+        if request.remote:
+            forwarded_for = f"{forwarded_for}, {request.remote}" if forwarded_for else request.remote
+        if forwarded_for:
+            headers["X-Forwarded-For"] = forwarded_for
+        return headers
+
+    async def _open_upstream(self, open_func):
+        for attempt in range(UPSTREAM_CONNECT_RETRIES):
+            try:
+                return await open_func()
+            except aiohttp.ClientConnectorError:
+                if attempt == UPSTREAM_CONNECT_RETRIES - 1:
+                    raise
+                await asyncio.sleep(UPSTREAM_RETRY_INTERVAL * (attempt + 1))
+
+    async def _proxy_http(self, request, upstream):
+        # The body is streamed, it is only read once the upstream connection is open
+        body = request.content.iter_chunked(STREAM_CHUNK_SIZE) if request.body_exists else None
+        upstream_response = await self._open_upstream(lambda: self._session.request(
+            request.method, upstream, headers=self._upstream_headers(request), data=body, allow_redirects=False
+        ))
+
+        async with upstream_response:
+            response = web.StreamResponse(status=upstream_response.status, reason=upstream_response.reason)
+            for key, value in upstream_response.headers.items():
+                if key.lower() not in HOP_BY_HOP_HEADERS:
+                    response.headers.add(key, value)
+
+            await response.prepare(request)
+            async for chunk in upstream_response.content.iter_any():
+                await response.write(chunk)
+            await response.write_eof()
+        return response
+
+    async def _proxy_websocket(self, request, upstream, project, name):
+        protocols = [protocol.strip() for protocol in request.headers.get("Sec-WebSocket-Protocol", "").split(",")
+                     if protocol.strip()]
+        # Connected first, so a workspace that refuses the socket is reported before the client is upgraded
+        upstream_socket = await self._open_upstream(lambda: self._session.ws_connect(
+            upstream, headers=self._upstream_headers(request, HOP_BY_HOP_HEADERS | WEBSOCKET_HEADERS),
+            protocols=protocols, max_msg_size=0
+        ))
+
+        async with upstream_socket:
+            socket = web.WebSocketResponse(protocols=[upstream_socket.protocol] if upstream_socket.protocol else (),
+                                           max_msg_size=0)
+            await socket.prepare(request)
+
+            GATEWAY_WEBSOCKETS.inc()
+            pumps = [asyncio.ensure_future(self._pump(socket, upstream_socket, project, name)),
+                     asyncio.ensure_future(self._pump(upstream_socket, socket, project, name))]
+            try:
+                # Either side closing ends the proxied socket
+                _, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+                for pump in pending:
+                    pump.cancel()
+            finally:
+                GATEWAY_WEBSOCKETS.dec()
+                for pump in pumps:
+                    pump.cancel()
+                await socket.close()
+        return socket
+
+    async def _pump(self, source, target, project, name):
+        async for message in source:
+            # Kernel traffic is the activity of a running computation, with no HTTP requests at all
+            self._touch(project, name)
+            if message.type == aiohttp.WSMsgType.TEXT:
+                await target.send_str(message.data)
+            elif message.type == aiohttp.WSMsgType.BINARY:
+                await target.send_bytes(message.data)
+            elif message.type == aiohttp.WSMsgType.ERROR:
+                break
+        await target.close(code=source.close_code or aiohttp.WSCloseCode.OK)
+
+    def _touch(self, project, name):
+        self._activity[(project, name)] = time.time()
+
+    async def _report_activity(self):
+        while True:
+            await asyncio.sleep(self.activity_interval)
+            try:
+                await self._flush_activity()
+            except Exception as e:
+                logger.warning(f"gateway activity report failed: {e}")
+
+    async def _flush_activity(self):
+        """
+        Reports the activity of the workspaces that were used since their last report
+        @return: None
+        """
+        pending = [(key, at) for key, at in self._activity.items() if at > self._reported.get(key, 0)]
+        for (project, name), at in pending:
+            body = {"metadata": {"annotations": {CAML_ACTIVITY_ANNOTATION: str(int(at))}}}
+            try:
+                await self.apps_api.patch_namespaced_deployment(name=get_resource_name(project, name),
+                                                                namespace=self.sharding.namespace_for(project),
+                                                                body=body)
+            except ApiException as e:
+                if e.status != 404:
+                    logger.warning(f"failed to report the activity of {project}/{name}: {e}")
+                # A deleted workspace is not reported again
+                self._activity.pop((project, name), None)
+                self._reported.pop((project, name), None)
+                continue
+            self._reported[(project, name)] = at
+
+
+async def run_gateway(gateway, host="0.0.0.0", port=DEFAULT_GATEWAY_PORT):
+    """
+    Serves the gateway from a running event loop (for example next to the CAML server)
+    @param gateway: [WorkspaceGateway] The gateway
+    @param host: [String] The interface to listen on
+    @param port: [Integer] The port to listen on
+    @return: [aiohttp.web.AppRunner] Call cleanup() on it to stop serving and close the gateway
+    """
+    runner = web.AppRunner(gateway.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
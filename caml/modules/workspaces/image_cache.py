@@ -0,0 +1,270 @@
+import logging
+import re
+import threading
+import time
+
+from kubernetes.client.exceptions import ApiException
+
+from caml.kube.api import get_default_api
+from caml.kube.consts import CAML_INFRA_NAMESPACE, CAML_PREPULLER_NAME
+from caml.kube.templates import render_template
+from caml.kube.utils import read_raw_json
+
+logger = logging.getLogger(__name__)
+
+# Seconds a read of the nodes' images is reused before the nodes are listed again
+DEFAULT_IMAGE_CACHE_TTL = 60
+PAUSE_IMAGE = "registry.k8s.io/pause:3.9"
+
+DEFAULT_REGISTRY = "docker.io"
+PULL_POLICY_ALWAYS = "Always"
+PULL_POLICY_IF_NOT_PRESENT = "IfNotPresent"
+
+_DIGEST_SEPARATOR = "@sha256:"
+# Taints a DaemonSet pod tolerates on its own, the other NoSchedule and NoExecute taints keep the pre-puller off a node
+_DAEMON_SET_TOLERATED_TAINTS = ("node.kubernetes.io/",)
+_CONTAINER_NAME = re.compile(r"[^a-z0-9-]+")
+
+# KubeApi -> ImageCache, a process holds a handful of apis at most
+_default_caches = {}
+_default_caches_lock = threading.Lock()
+
+
+def normalize_image(image):
+    """
+    Expands an image reference the way the container runtime reports it (for example
+    jupyter/datascience-notebook -> docker.io/jupyter/datascience-notebook:latest)
+    @param image: [String] The image reference
+    @return: [String] The fully qualified reference
+    """
+    if _DIGEST_SEPARATOR in image:
+        repository, digest = image.split("@", 1)
+        return f"{_normalize_repository(repository)}@{digest}"
+
+    repository, tag = image, "latest"
+    # A colon after the last slash separates the tag, one before it belongs to a registry port
+    if ":" in image.rsplit("/", 1)[-1]:
+        repository, tag = image.rsplit(":", 1)
+    return f"{_normalize_repository(repository)}:{tag}"
+
+
+def _normalize_repository(repository):
+    parts = repository.split("/")
+    if len(parts) == 1 or not ("." in parts[0] or ":" in parts[0] or parts[0] == "localhost"):
+        if len(parts) == 1:
+            parts = ["library", *parts]
+        parts = [DEFAULT_REGISTRY, *parts]
+    return "/".join(parts)
+
+
+class NodeImageStatus:
+    """
+    The workspace images held by a single node
+    """
+
+    __slots__ = ("node", "images", "schedulable")
+
+    def __init__(self, node, images, schedulable=True):
+        """
+        @param node: [String] The node name
+        @param images: [Dict] image -> the digest held by the node (None if the image is not on the node)
+        @param schedulable: [Boolean] False for cordoned nodes and for nodes whose taints keep the pre-puller off
+        """
+        self.node = node
+        self.images = images
+        self.schedulable = schedulable
+
+    @property
+    def cached(self):
+        """
+        @return: [Boolean] True if every image is on the node
+        """
+        return all(self.images.values())
+
+    def to_dict(self):
+        return {"node": self.node, "schedulable": self.schedulable, "images": self.images}
+
+    def __repr__(self):
+        return f"NodeImageStatus({self.node}, cached={self.cached})"
+
+
+class ImageCache:
+    """
+    Reads which workspace images the compute nodes hold, from the image lists the nodes report in their status.
+    An image that every schedulable node holds at the same digest is started pinned to the digest with IfNotPresent,
+    so a workspace start neither re-checks the registry nor pulls.
+    NOTE: the kubelet reports at most 50 images per node (the largest first), large workspace images are listed first.
+    """
+
+    def __init__(self, api=None, node_selector=None, ttl=DEFAULT_IMAGE_CACHE_TTL):
+        """
+        @param api: [KubeApi] The shared kubernetes api (defaults to the process wide one)
+        @param node_selector: [Dict] Labels of the compute nodes (None for every node)
+        @param ttl: [Float] Seconds a read of the nodes is reused
+        """
+        self.api = api or get_default_api()
+        self.node_selector = node_selector
+        self.ttl = ttl
+
+        self._nodes = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def status(self, images):
+        """
+        @param images: [List] The image references
+        @return: [List] NodeImageStatus per compute node
+        """
+        references = {image: normalize_image(image) for image in images}
+        statuses = []
+        for node in self._get_nodes():
+            held = _held_digests(node)
+            statuses.append(NodeImageStatus(
+                node=node["metadata"]["name"],
+                images={image: held.get(reference) for image, reference in references.items()},
+                schedulable=_is_schedulable(node)
+            ))
+        return statuses
+
+    def resolve(self, image):
+        """
+        Picks the image reference and pull policy a workspace is started with
+        @param image: [String] The workspace image
+        @return: ([String] image reference, [String] pull policy), the original reference with Always if the image
+                 is not cached on every schedulable node at a single digest
+        """
+        if _DIGEST_SEPARATOR in image:
+            return image, PULL_POLICY_IF_NOT_PRESENT
+
+        try:
+            statuses = [status for status in self.status([image]) if status.schedulable]
+        except ApiException as e:
+            logger.warning(f"cannot read the node images, pulling {image} without pinning: {e}")
+            return image, PULL_POLICY_ALWAYS
+
+        digests = {status.images[image] for status in statuses}
+        if len(digests) != 1 or None in digests:
+            return image, PULL_POLICY_ALWAYS
+
+        repository = normalize_image(image).rsplit(":", 1)[0]
+        return f"{repository}@{digests.pop()}", PULL_POLICY_IF_NOT_PRESENT
+
+    def invalidate(self):
+        """
+        Drops the cached read of the nodes
+        @return: None
+        """
+        with self._lock:
+            self._nodes = None
+
+    def _get_nodes(self):
+        with self._lock:
+            if self._nodes is not None and time.monotonic() - self._fetched_at < self.ttl:
+                return self._nodes
+
+        label_selector = ",".join(f"{key}={value}" for key, value in (self.node_selector or {}).items()) or None
+        response = self.api.core.list_node(label_selector=label_selector, _preload_content=False)
+        nodes = read_raw_json(response)["items"]
+        with self._lock:
+            self._nodes = nodes
+            self._fetched_at = time.monotonic()
+        return nodes
+
+
+def _is_schedulable(node):
+    """
+    @param node: [Dict] A raw node json
+    @return: [Boolean] False if the node is cordoned, or tainted so the pre-puller never pulls the images to it
+    """
+    spec = node.get("spec") or {}
+    if spec.get("unschedulable", False):
+        return False
+    return not any(taint.get("effect") in ("NoSchedule", "NoExecute")
+                   and not taint.get("key", "").startswith(_DAEMON_SET_TOLERATED_TAINTS)
+                   for taint in spec.get("taints") or [])
+
+
+def _held_digests(node):
+    """
+    @param node: [Dict] A raw node json
+    @return: [Dict] Normalized tag reference -> the digest the node holds for it
+    """
+    held = {}
+    for image in (node.get("status") or {}).get("images") or []:
+        names = image.get("names") or []
+        # An image pushed to several repositories has a digest reference per repository
+        digests = dict(normalize_image(name).split("@", 1) for name in names if _DIGEST_SEPARATOR in name)
+        for name in names:
+            if _DIGEST_SEPARATOR in name:
+                continue
+            reference = normalize_image(name)
+            digest = digests.get(reference.rsplit(":", 1)[0])
+            if digest is not None:
+                held[reference] = digest
+    return held
+
+
+def get_image_cache(api=None, node_selector=None):
+    """
+    Returns the image cache of a kubernetes api, shared by every workspaces client that uses the api
+    @param api: [KubeApi] The kubernetes api (defaults to the process wide one)
+    @param node_selector: [Dict] Labels of the compute nodes, the node selector of the pre-puller DaemonSet
+                          (None keeps the selector of the existing cache)
+    @return: ImageCache
+    """
+    api = api or get_default_api()
+    with _default_caches_lock:
+        cache = _default_caches.get(api)
+        if cache is None:
+            cache = _default_caches[api] = ImageCache(api=api, node_selector=node_selector)
+        elif node_selector is not None and node_selector != cache.node_selector:
+            cache.node_selector = node_selector
+            cache.invalidate()
+        return cache
+
+
+def render_prepuller(images, namespace=CAML_INFRA_NAMESPACE, node_selector=None):
+    """
+    Renders the DaemonSet that keeps the images pulled on every compute node
+    @param images: [List] The image references
+    @param namespace: [String] The namespace of the DaemonSet
+    @param node_selector: [Dict] Labels of the compute nodes (None for every node)
+    @return: [Dict] The DaemonSet manifest
+    """
+    init_containers = []
+    for image in sorted(set(images)):
+        init_containers.append({
+            "name": f"pull-{_CONTAINER_NAME.sub('-', image.lower()).strip('-')}"[:63].rstrip("-"),
+            "image": image,
+            # Re-checked on every rollout of the DaemonSet, so a moved tag is picked up
+            "imagePullPolicy": PULL_POLICY_ALWAYS,
+            # Only pulling matters, the container exits right away (the image must have a shell)
+            "command": ["sh", "-c", "true"],
+            "resources": {"requests": {"cpu": "1m", "memory": "8Mi"}},
+        })
+
+    return render_template("schemas/image-prepuller.yml", {
+        "PREPULLER_NAME": CAML_PREPULLER_NAME,
+        "NAMESPACE_NAME": namespace,
+        "NODE_SELECTOR": node_selector or {},
+        "INIT_CONTAINERS": init_containers,
+        "PAUSE_IMAGE": PAUSE_IMAGE,
+    })
+
+
+def apply_prepuller(api, images, namespace=CAML_INFRA_NAMESPACE, node_selector=None):
+    """
+    Creates the pre-puller DaemonSet, or updates its images if it exists
+    @param api: [KubeApi] The kubernetes api
+    @param images: [List] The image references
+    @param namespace: [String] The namespace of the DaemonSet
+    @param node_selector: [Dict] Labels of the compute nodes (None for every node)
+    @return: None
+    """
+    body = render_prepuller(images, namespace, node_selector)
+    try:
+        api.apps.create_namespaced_daemon_set(namespace=namespace, body=body)
+    except ApiException as e:
+        if e.status != 409:
+            raise e
+        api.apps.replace_namespaced_daemon_set(name=CAML_PREPULLER_NAME, namespace=namespace, body=body)
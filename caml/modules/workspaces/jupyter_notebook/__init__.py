@@ -1 +1 @@
-from .jupyter_notebook import JupyterNotebook
\ No newline at end of file
+from .jupyter_notebook import JUPYTER_TOKEN_ENV, JupyterNotebook
@@ -1,14 +1,33 @@
+import hashlib
 import os
 import pathlib
+import secrets
 
-from caml.kube.utils import replace_yaml_placeholders
+from caml.kube.consts import CAML_BASE_URL_ANNOTATION
+from caml.kube.templates import render_template
+from caml.modules.workspaces.workspace import ROUTING_MODE, get_base_url, get_resource_name
+
+# The server reads its token from this variable, the idle culler reads it back from the pod to probe the server
+JUPYTER_TOKEN_ENV = "JUPYTER_TOKEN"
 
 
 class JupyterNotebook:
-    def __init__(self, project, name, cpu=2, cpu_limit=2, memory=2, memory_limit=2):
+    # Kept pulled on the compute nodes by the image pre-puller
+    IMAGE = "jupyter/datascience-notebook"
+
+    def __init__(self, project, name, cpu=2, cpu_limit=2, memory=2, memory_limit=2, image=None,
+                 image_pull_policy="Always", routing=ROUTING_MODE.LOAD_BALANCER, token=None):
         self.name = name
         self.project = project
-        self.resource_name = f"workspace-{self.project}-{self.name}"
+        self.resource_name = get_resource_name(self.project, self.name)
+
+        # Behind the gateway the server must know its path prefix, it builds absolute links and redirects from it
+        self.routing = routing
+        self.base_url = get_base_url(project, name) if routing == ROUTING_MODE.GATEWAY else "/"
+
+        # A digest pinned image that is cached on the nodes is started with IfNotPresent (see ImageCache.resolve)
+        self.image = image or self.IMAGE
+        self.image_pull_policy = image_pull_policy
 
         self.cpu = cpu
         self.cpu_limit = cpu_limit
@@ -16,36 +35,62 @@ class JupyterNotebook:
         self.memory = memory
         self.memory_limit = memory_limit
 
+        # A known token instead of the one the server would generate and only print to its log
+        self.token = token or secrets.token_hex(24)
+
         self._create_deployment()
         self._create_service()
 
+    @property
+    def profile(self):
+        """
+        Workspaces with the same profile run identical pods, so any idle pod of the profile's warm pool can serve them
+        @return: [String] The image and resources of the workspace (a valid label value), None behind the gateway
+                 (the pods are started with the workspace's own base url, so they are never interchangeable)
+        """
+        if self.routing == ROUTING_MODE.GATEWAY:
+            return None
+        # A label value is at most 63 characters, a digest pinned reference alone is longer
+        image = hashlib.sha1(f"{self.image}|{self.image_pull_policy}".encode()).hexdigest()[:10]
+        return f"jupyter-notebook-c{self.cpu}-{self.cpu_limit}-m{self.memory}-{self.memory_limit}-{image}"
+
     def _create_deployment(self):
+        env = [{"name": JUPYTER_TOKEN_ENV, "value": self.token}]
+        if self.routing == ROUTING_MODE.GATEWAY:
+            # Passed on to the server by the image's start script
+            env.append({"name": "NOTEBOOK_ARGS", "value": f"--ServerApp.base_url={self.base_url}"})
+
         placeholders = {
             "APP_LABEL": "jupyter-notebook",
             "PROJECT_LABEL": self.project,
             "COMPONENT_LABEL": "workspace",
             "DEPLOYMENT_NAME": self.resource_name,
-            "DEPLOYMENT_IMAGE": "jupyter/datascience-notebook",
+            "DEPLOYMENT_IMAGE": self.image,
+            "IMAGE_PULL_POLICY": self.image_pull_policy,
+            "BASE_URL": self.base_url,
+            "ENV": env,
 
-            "WRAPPER_PORT": "8888",
+            "WRAPPER_PORT": 8888,
 
-            "DEPLOYMENT_CPU_LIMIT": f"{self.cpu_limit}",
-            "DEPLOYMENT_CPU_REQUEST": f"{self.cpu}",
+            "DEPLOYMENT_CPU_LIMIT": self.cpu_limit,
+            "DEPLOYMENT_CPU_REQUEST": self.cpu,
             "DEPLOYMENT_MEMORY_LIMIT": f"{self.memory_limit}G",
             "DEPLOYMENT_MEMORY_REQUEST": f"{self.memory}G",
         }
 
         schema_path = os.path.join(pathlib.Path(__file__).parent, "schemas/deployment.yaml")
-        self.deployment = replace_yaml_placeholders(schema_path, placeholders)
+        self.deployment = render_template(schema_path, placeholders)
+        if self.routing == ROUTING_MODE.GATEWAY:
+            self.deployment["metadata"]["annotations"] = {CAML_BASE_URL_ANNOTATION: self.base_url}
 
     def _create_service(self):
         placeholders = {
             "DEPLOYMENT_NAME": self.resource_name,
-            "SERVICE_TYPE": "LoadBalancer",
+            "SERVICE_TYPE": "ClusterIP" if self.routing == ROUTING_MODE.GATEWAY else "LoadBalancer",
 
-            "WRAPPER_PORT": "8888",
-            "EXTERNAL_PORT": "80",
+            "WRAPPER_PORT": 8888,
+            "EXTERNAL_PORT": 80,
         }
 
         schema_path = os.path.join(pathlib.Path(__file__).parent, "schemas/service.yaml")
-        self.service = replace_yaml_placeholders(schema_path, placeholders)
+        self.service = render_template(schema_path, placeholders)
@@ -0,0 +1,378 @@
+import time
+from datetime import datetime, timezone
+
+from kubernetes.utils import parse_quantity
+
+from caml.kube.consts import (CAML_CULLED_ANNOTATION, CAML_REPLICAS_ANNOTATION, CAML_RESUMED_ANNOTATION,
+                              CAML_WORKSPACE_LABEL)
+
+# Default max seconds to wait for a workspace to become ready
+DEFAULT_READY_TIMEOUT = 600
+
+
+class WORKSPACE_PHASE:
+    """
+    The lifecycle phases of a workspace, derived from the status of its pod
+    """
+
+    # The pod exists but was not placed on a node yet
+    PENDING = "pending"
+    # The pod was placed on a node
+    SCHEDULED = "scheduled"
+    # The node is pulling the image and creating the containers
+    PULLING = "pulling"
+    # The containers are running but the readiness probe did not pass yet
+    STARTING = "starting"
+    READY = "ready"
+    # The workspace cannot start on its own (image pull errors, crash loops, exited containers)
+    FAILED = "failed"
+    # The workspace has no pods (deleted or scaled to zero)
+    STOPPED = "stopped"
+
+
+# Container waiting reasons that will not resolve without a change to the workspace
+FAILED_WAITING_REASONS = ("ErrImagePull", "ImagePullBackOff", "InvalidImageName", "ErrImageNeverPull",
+                          "CrashLoopBackOff", "CreateContainerConfigError", "CreateContainerError", "RunContainerError")
+# Container waiting reasons of a container that is still being created
+PULLING_WAITING_REASONS = ("ContainerCreating", "PodInitializing")
+# The PodScheduled reason of a pod that does not fit on any node
+UNSCHEDULABLE_REASON = "Unschedulable"
+# The reason reported when waiting for a workspace timed out
+TIMEOUT_REASON = "Timeout"
+
+
+class WorkspaceEvent:
+    """
+    A change in the lifecycle phase of a workspace
+    """
+
+    __slots__ = ("namespace", "project", "resource_name", "phase", "reason", "message", "pod", "timestamp")
+
+    def __init__(self, namespace, project, resource_name, phase, reason=None, message=None, pod=None,
+                 timestamp=None):
+        self.namespace = namespace
+        self.project = project
+        self.resource_name = resource_name
+        self.phase = phase
+        self.reason = reason
+        self.message = message
+        self.pod = pod
+        self.timestamp = timestamp or time.time()
+
+    @property
+    def name(self):
+        """
+        The workspace name (the resource name without the workspace-<project>- prefix)
+        """
+        prefix = f"workspace-{self.project}-"
+        return self.resource_name[len(prefix):] if self.resource_name.startswith(prefix) else self.resource_name
+
+    @property
+    def key(self):
+        return self.namespace, self.resource_name
+
+    def to_dict(self):
+        return {
+            "project": self.project,
+            "workspace": self.name,
+            "namespace": self.namespace,
+            "phase": self.phase,
+            "reason": self.reason,
+            "message": self.message,
+            "pod": self.pod,
+            "timestamp": self.timestamp,
+        }
+
+    def __repr__(self):
+        return f"WorkspaceEvent({self.project}/{self.name}, {self.phase}, {self.reason})"
+
+
+def get_pod_phase(pod):
+    """
+    Maps the status of a workspace pod to its lifecycle phase
+    @param pod: [Dict] A raw pod json
+    @return: ([WORKSPACE_PHASE] phase, [String] reason, [String] message)
+    """
+    status = pod.get("status") or {}
+    phase = status.get("phase")
+    conditions = {condition["type"]: condition for condition in status.get("conditions") or []}
+
+    if phase == "Failed":
+        return WORKSPACE_PHASE.FAILED, status.get("reason") or "PodFailed", status.get("message")
+    if phase == "Succeeded":
+        return WORKSPACE_PHASE.FAILED, "Completed", "The workspace container exited"
+
+    for container in status.get("initContainerStatuses", []) + status.get("containerStatuses", []):
+        waiting = (container.get("state") or {}).get("waiting")
+        if waiting and waiting.get("reason") in FAILED_WAITING_REASONS:
+            return WORKSPACE_PHASE.FAILED, waiting["reason"], waiting.get("message")
+
+    if conditions.get("Ready", {}).get("status") == "True":
+        return WORKSPACE_PHASE.READY, None, None
+
+    scheduled = conditions.get("PodScheduled", {})
+    if scheduled.get("status") != "True":
+        return WORKSPACE_PHASE.PENDING, scheduled.get("reason"), scheduled.get("message")
+
+    container_statuses = status.get("containerStatuses") or []
+    if any("running" in (container.get("state") or {}) for container in container_statuses):
+        return WORKSPACE_PHASE.STARTING, None, None
+
+    waiting_reasons = [((container.get("state") or {}).get("waiting") or {}).get("reason")
+                       for container in container_statuses]
+    if any(reason in PULLING_WAITING_REASONS for reason in waiting_reasons):
+        return WORKSPACE_PHASE.PULLING, None, None
+    return WORKSPACE_PHASE.SCHEDULED, None, None
+
+
+def pod_event(pod):
+    """
+    @param pod: [Dict] A raw workspace pod json
+    @return: WorkspaceEvent of the pod's current phase, None if the pod does not belong to a workspace
+    """
+    metadata = pod["metadata"]
+    labels = metadata.get("labels") or {}
+    resource_name = labels.get(CAML_WORKSPACE_LABEL)
+    if resource_name is None:
+        return None
+
+    phase, reason, message = get_pod_phase(pod)
+    return WorkspaceEvent(metadata.get("namespace"), labels.get("project"), resource_name, phase, reason, message,
+                          pod=metadata["name"])
+
+
+def is_settled(phase, reason):
+    """
+    @param phase: [WORKSPACE_PHASE] The workspace phase
+    @param reason: [String] The phase reason
+    @return: [Boolean] True if waiting for the workspace to become ready is over (ready, or failed for good)
+    """
+    return phase in (WORKSPACE_PHASE.READY, WORKSPACE_PHASE.FAILED) or reason == UNSCHEDULABLE_REASON
+
+
+def newest_pod(pods):
+    """
+    Picks the pod that decides the workspace's phase, during a rollout that is the newest pod that is not terminating
+    @param pods: [List] Raw pod jsons of a single workspace
+    @return: [Dict] The pod, None if there are no pods
+    """
+    live = [pod for pod in pods if not pod["metadata"].get("deletionTimestamp")] or pods
+    if not live:
+        return None
+    return max(live, key=lambda pod: (pod["metadata"].get("creationTimestamp") or "", pod["metadata"]["name"]))
+
+
+def deployment_failure(deployment):
+    """
+    @param deployment: [Dict] A raw workspace deployment json
+    @return: ([String] reason, [String] message) if the deployment cannot create its pod (e.g. a quota), else None
+    """
+    for condition in (deployment.get("status") or {}).get("conditions") or []:
+        if condition["type"] == "ReplicaFailure" and condition["status"] == "True":
+            return condition.get("reason"), condition.get("message")
+    return None
+
+
+def parse_time(value):
+    """
+    @param value: [String] A kubernetes RFC 3339 timestamp
+    @return: [Float] The epoch seconds, None if the value is missing
+    """
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class ProvisioningTimeline:
+    """
+    Where the provisioning time of a workspace went, built from the API server's own timestamps.
+    Every duration is None when its phase was not observed.
+    """
+
+    __slots__ = ("created", "scheduled", "pulling", "pulled", "started", "ready")
+
+    def __init__(self, created=None, scheduled=None, pulling=None, pulled=None, started=None, ready=None):
+        """
+        All of the arguments are epoch seconds
+        @param created: The deployment's creation
+        @param scheduled: The pod was bound to a node
+        @param pulling: The node started pulling the image
+        @param pulled: The image was available on the node
+        @param started: The container started running
+        @param ready: The readiness probe passed
+        """
+        self.created = created
+        self.scheduled = scheduled
+        self.pulling = pulling
+        self.pulled = pulled
+        self.started = started
+        self.ready = ready
+
+    @classmethod
+    def from_raw(cls, deployment, pod, events=()):
+        """
+        @param deployment: [Dict] The raw deployment json
+        @param pod: [Dict] The raw json of the ready pod
+        @param events: [List] The raw events of the pod (the image pull is only known from its events)
+        @return: ProvisioningTimeline
+        """
+        status = pod.get("status") or {}
+        conditions = {condition["type"]: condition for condition in status.get("conditions") or []}
+        started = [parse_time(((container.get("state") or {}).get("running") or {}).get("startedAt"))
+                   for container in status.get("containerStatuses") or []]
+
+        pulling = pulled = None
+        for event in events:
+            timestamp = parse_time(event.get("eventTime") or event.get("firstTimestamp"))
+            if event.get("reason") == "Pulling":
+                pulling = min(filter(None, (pulling, timestamp)), default=None)
+            elif event.get("reason") == "Pulled":
+                # Also set when the image was already present on the node
+                pulled = max(filter(None, (pulled, parse_time(event.get("lastTimestamp")) or timestamp)),
+                             default=None)
+
+        return cls(
+            created=parse_time(deployment["metadata"].get("creationTimestamp")),
+            scheduled=parse_time(conditions.get("PodScheduled", {}).get("lastTransitionTime")),
+            pulling=pulling,
+            pulled=pulled,
+            started=max(filter(None, started), default=None),
+            ready=parse_time(conditions.get("Ready", {}).get("lastTransitionTime")),
+        )
+
+    @property
+    def durations(self):
+        """
+        @return: [Dict] Seconds spent in scheduling, image_pull, container_start, readiness_probe and in total
+        """
+        image_ready = self.pulled or self.scheduled
+        return {
+            "scheduling": _elapsed(self.created, self.scheduled),
+            "image_pull": _elapsed(self.scheduled, self.pulled),
+            "container_start": _elapsed(image_ready, self.started),
+            "readiness_probe": _elapsed(self.started, self.ready),
+            "total": _elapsed(self.created, self.ready),
+        }
+
+    def to_dict(self):
+        return self.durations
+
+    def __repr__(self):
+        durations = ", ".join(f"{phase}={value}" for phase, value in self.durations.items() if value is not None)
+        return f"ProvisioningTimeline({durations})"
+
+
+def _elapsed(start, end):
+    if start is None or end is None:
+        return None
+    # The API server's timestamps have a second resolution
+    return max(round(end - start, 3), 0)
+
+
+class WorkspaceReadiness:
+    """
+    The outcome of waiting for a workspace to become ready
+    """
+
+    __slots__ = ("phase", "reason", "message", "elapsed", "timeline")
+
+    def __init__(self, phase, reason=None, message=None, elapsed=None, timeline=None):
+        """
+        @param phase: [WORKSPACE_PHASE] The last observed phase
+        @param reason: [String] Why the workspace is not ready (TIMEOUT_REASON if the wait timed out)
+        @param message: [String] The details of the reason
+        @param elapsed: [Float] Seconds spent waiting
+        @param timeline: [ProvisioningTimeline] The phase breakdown (only set once ready)
+        """
+        self.phase = phase
+        self.reason = reason
+        self.message = message
+        self.elapsed = elapsed
+        self.timeline = timeline
+
+    @property
+    def ready(self):
+        return self.phase == WORKSPACE_PHASE.READY
+
+    @property
+    def timed_out(self):
+        return self.reason == TIMEOUT_REASON
+
+    def __bool__(self):
+        return self.ready
+
+    def __repr__(self):
+        if self.ready:
+            return f"WorkspaceReadiness(ready, {self.timeline})"
+        return f"WorkspaceReadiness({self.phase}, {self.reason}: {self.message})"
+
+
+def format_time(timestamp=None):
+    """
+    @param timestamp: [Float] Epoch seconds (defaults to now)
+    @return: [String] The RFC 3339 timestamp
+    """
+    moment = datetime.fromtimestamp(timestamp if timestamp is not None else time.time(), timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def is_culled(deployment):
+    """
+    @param deployment: [Dict] A raw workspace deployment json
+    @return: [Boolean] True if the idle culler scaled the workspace to zero
+    """
+    return bool((deployment["metadata"].get("annotations") or {}).get(CAML_CULLED_ANNOTATION))
+
+
+def pod_requests(deployment):
+    """
+    @param deployment: [Dict] A raw workspace deployment json
+    @return: ([Decimal] cpu cores, [Decimal] memory bytes) requested by a single pod of the deployment
+    """
+    cpu = memory = parse_quantity(0)
+    for container in deployment["spec"]["template"]["spec"].get("containers") or []:
+        requests = (container.get("resources") or {}).get("requests") or {}
+        cpu += parse_quantity(requests.get("cpu", 0))
+        memory += parse_quantity(requests.get("memory", 0))
+    return cpu, memory
+
+
+def cull_patch(deployment, timestamp=None):
+    """
+    Scales a workspace to zero, keeping everything else (the service, the labels, the template) as is
+    @param deployment: [Dict] A raw workspace deployment json
+    @param timestamp: [Float] Epoch seconds of the cull (defaults to now)
+    @return: [Dict] The deployment patch
+    """
+    return {
+        "metadata": {
+            # Conditional, a concurrent resume (or any other change) makes the cull fail instead of undoing it
+            "resourceVersion": deployment["metadata"]["resourceVersion"],
+            "annotations": {
+                CAML_CULLED_ANNOTATION: format_time(timestamp),
+                CAML_REPLICAS_ANNOTATION: str(deployment["spec"].get("replicas", 1)),
+            },
+        },
+        "spec": {"replicas": 0},
+    }
+
+
+def resume_patch(deployment):
+    """
+    @param deployment: [Dict] A raw workspace deployment json
+    @return: [Dict] The deployment patch that scales a culled workspace back up, None if it is not culled
+    """
+    annotations = deployment["metadata"].get("annotations") or {}
+    if not is_culled(deployment) and deployment["spec"].get("replicas", 1) > 0:
+        return None
+
+    return {
+        "metadata": {
+            "annotations": {
+                CAML_CULLED_ANNOTATION: None,
+                CAML_REPLICAS_ANNOTATION: None,
+                CAML_RESUMED_ANNOTATION: format_time(),
+            },
+        },
+        "spec": {"replicas": max(int(annotations.get(CAML_REPLICAS_ANNOTATION) or 1), 1)},
+    }
@@ -0,0 +1,360 @@
+import copy
+import logging
+import threading
+import time
+from collections import deque
+
+from kubernetes.client.exceptions import ApiException
+
+from caml.errors import CamlArgumentsError, CamlConflictError
+from caml.kube.api import get_default_api
+from caml.kube.consts import CAML_COMPUTE_NAMESPACE, CAML_POOL_LABEL
+from caml.kube.utils import read_raw_json
+from caml.metrics import Counter, Gauge, Histogram
+from caml.modules.workspaces.lifecycle import WORKSPACE_PHASE, get_pod_phase
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two checks of the pool size (a claim triggers a check right away)
+DEFAULT_REFILL_INTERVAL = 10
+# Number of recent claim latencies kept for the pool statistics
+CLAIM_LATENCY_SAMPLES = 1000
+
+# The placeholder names a pool renders its workspace template with
+POOL_PROJECT = "pool"
+POOL_WORKSPACE = "warm"
+
+WARM_POOL_CLAIMS = Counter(
+    "caml_warm_pool_claims_total",
+    "Workspace creations that asked a warm pool for a pod, by result (hit: a warm pod was claimed, miss: cold start)",
+    ["profile", "result"]
+)
+WARM_POOL_CLAIM_SECONDS = Histogram(
+    "caml_warm_pool_claim_seconds",
+    "Time to claim a warm pod for a workspace",
+    ["profile"]
+)
+WARM_POOL_IDLE_PODS = Gauge(
+    "caml_warm_pool_idle_pods",
+    "Idle pods of a warm pool, by readiness",
+    ["profile", "ready"]
+)
+
+
+class WarmPool:
+    """
+    Keeps a number of idle, ready workspace pods of a single profile (workspace type and resources).
+    A new workspace of the profile claims one of them instead of waiting for a pod to be scheduled, pulled and probed:
+    the claimed pod is relabeled as the workspace's pod and adopted by the workspace's deployment.
+    A background thread creates new idle pods as the pool is drained.
+    """
+
+    def __init__(self, ws_class, size, namespace=CAML_COMPUTE_NAMESPACE, api=None,
+                 refill_interval=DEFAULT_REFILL_INTERVAL, **resources):
+        """
+        @param ws_class: The workspace class (for example WORKSPACES.JUPYTER_NOTEBOOK)
+        @param size: [Integer] Number of idle pods to keep
+        @param namespace: [String] The namespace of the workspaces the pool serves
+        @param api: [KubeApi] The shared kubernetes api (defaults to the process wide one)
+        @param refill_interval: [Float] Seconds between two checks of the pool size
+        @param resources: The workspace arguments of the profile (for example cpu=4, memory=8)
+        """
+        if size < 0:
+            raise CamlArgumentsError("The warm pool size must not be negative")
+
+        template = ws_class(project=POOL_PROJECT, name=POOL_WORKSPACE, **resources)
+        if getattr(template, "profile", None) is None:
+            raise CamlArgumentsError(f"{ws_class.__name__} does not support warm pools with these arguments")
+
+        self.ws_class = ws_class
+        self.resources = resources
+        self.size = size
+        self.namespace = namespace
+        self.profile = template.profile
+        self.refill_interval = refill_interval
+        self.api = api or get_default_api()
+
+        self.hits = 0
+        self.misses = 0
+        self._latencies = deque(maxlen=CLAIM_LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def selector(self):
+        return f"{CAML_POOL_LABEL}={self.profile}"
+
+    def start(self):
+        """
+        Starts the refill background thread (no-op if it is already running)
+        @return: None
+        """
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name=f"caml-warm-pool-{self.profile}", daemon=True)
+            self._thread.start()
+
+    def stop(self, drain=False):
+        """
+        Stops refilling the pool
+        @param drain: [Boolean] Also delete the idle pods
+        @return: None
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if drain:
+            self.api.core.delete_collection_namespaced_pod(namespace=self.namespace, label_selector=self.selector)
+
+    def claim(self, workspace):
+        """
+        Hands an idle pod over to a new workspace.
+        The pod is relabeled with the workspace's labels (leaving the pool) and a replica set that adopts it is
+        created ahead of the workspace's deployment, which in turn adopts the replica set since their templates match.
+        @param workspace: The workspace object (an instance of the pool's workspace class and profile)
+        @raise CamlConflictError: if the workspace already exists
+        @return: [String] The claimed pod name, None if no idle pod was ready (the workspace starts cold)
+        """
+        started = time.monotonic()
+        pod_name = None
+        for pod in self._ready_pods():
+            if self._relabel(pod, workspace):
+                pod_name = pod["metadata"]["name"]
+                break
+
+        if pod_name is None:
+            self.misses += 1
+            WARM_POOL_CLAIMS.labels(self.profile, "miss").inc()
+            self._wakeup.set()
+            return None
+
+        try:
+            self.api.apps.create_namespaced_replica_set(namespace=self.namespace, body=self._replica_set(workspace))
+        except ApiException as e:
+            # The pod carries the workspace's labels by now, it must not be left behind unowned
+            self.api.core.delete_namespaced_pod(name=pod_name, namespace=self.namespace)
+            if e.status == 409:
+                raise CamlConflictError("Workspace already exists")
+            raise e
+        finally:
+            self._wakeup.set()
+
+        latency = time.monotonic() - started
+        self.hits += 1
+        self._latencies.append(latency)
+        WARM_POOL_CLAIMS.labels(self.profile, "hit").inc()
+        WARM_POOL_CLAIM_SECONDS.labels(self.profile).observe(latency)
+        return pod_name
+
+    def release(self, workspace, pod_name):
+        """
+        Undoes a claim whose workspace could not be created.
+        The replica set and the pod carry the workspace's labels, left behind they would be adopted by a deployment
+        of the same name (for example the existing workspace of a conflicting create).
+        @param workspace: The workspace object the pod was claimed for
+        @param pod_name: [String] The claimed pod name
+        @return: None
+        """
+        deletes = (
+            (self.api.apps.delete_namespaced_replica_set, self._replica_set(workspace)["metadata"]["name"]),
+            (self.api.core.delete_namespaced_pod, pod_name),
+        )
+        for delete, name in deletes:
+            try:
+                delete(name=name, namespace=self.namespace)
+            except ApiException as e:
+                if e.status != 404:
+                    logger.warning(f"warm pool {self.profile} failed to release {name}: {e}")
+
+    def refill(self):
+        """
+        Creates idle pods up to the pool size and removes the ones that failed
+        @return: [Integer] The number of created pods
+        """
+        pods = read_raw_json(self.api.core.list_namespaced_pod(namespace=self.namespace, label_selector=self.selector,
+                                                               _preload_content=False))["items"]
+        live = []
+        ready = 0
+        for pod in pods:
+            if pod["metadata"].get("deletionTimestamp"):
+                continue
+            phase, reason, _ = get_pod_phase(pod)
+            if phase == WORKSPACE_PHASE.FAILED:
+                logger.warning(f"removing failed warm pod {pod['metadata']['name']}: {reason}")
+                self.api.core.delete_namespaced_pod(name=pod["metadata"]["name"], namespace=self.namespace)
+                continue
+            live.append(pod)
+            ready += phase == WORKSPACE_PHASE.READY
+
+        WARM_POOL_IDLE_PODS.labels(self.profile, "true").set(ready)
+        WARM_POOL_IDLE_PODS.labels(self.profile, "false").set(len(live) - ready)
+
+        missing = max(self.size - len(live), 0)
+        for _ in range(missing):
+            # Every pod is rendered from a new template, so the pods never share its secrets (the Jupyter token)
+            template = self.ws_class(project=POOL_PROJECT, name=POOL_WORKSPACE, **self.resources)
+            self.api.core.create_namespaced_pod(namespace=self.namespace, body=self._render_pod(template))
+        return missing
+
+    def stats(self):
+        """
+        @return: [Dict] The claim hits and misses, the hit rate and the claim latency (seconds) of recent claims
+        """
+        claims = self.hits + self.misses
+        latencies = sorted(self._latencies)
+        return {
+            "profile": self.profile,
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / claims if claims else None,
+            "claim_latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "claim_latency_p99": latencies[int(len(latencies) * 0.99)] if latencies else None,
+        }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refill()
+            except Exception as e:
+                logger.warning(f"warm pool {self.profile} refill failed: {e}")
+            self._wakeup.wait(self.refill_interval)
+            self._wakeup.clear()
+
+    def _ready_pods(self):
+        """
+        @return: [List] The ready idle pods, oldest first
+        """
+        response = self.api.core.list_namespaced_pod(namespace=self.namespace, label_selector=self.selector,
+                                                     _preload_content=False)
+        pods = [pod for pod in read_raw_json(response)["items"]
+                if not pod["metadata"].get("deletionTimestamp") and get_pod_phase(pod)[0] == WORKSPACE_PHASE.READY]
+        return sorted(pods, key=lambda pod: pod["metadata"].get("creationTimestamp") or "")
+
+    def _relabel(self, pod, workspace):
+        """
+        @return: [Boolean] False if another workspace claimed the pod first
+        """
+        labels = {CAML_POOL_LABEL: None, **workspace.deployment["spec"]["template"]["metadata"]["labels"]}
+        # The resourceVersion makes the patch conditional, only a single claim of the pod can succeed
+        body = {"metadata": {"resourceVersion": pod["metadata"]["resourceVersion"], "labels": labels}}
+        try:
+            self.api.core.patch_namespaced_pod(name=pod["metadata"]["name"], namespace=self.namespace, body=body)
+            return True
+        except ApiException as e:
+            if e.status in (404, 409):
+                return False
+            raise e
+
+    def _render_pod(self, template):
+        pod_template = copy.deepcopy(template.deployment["spec"]["template"])
+        labels = {key: value for key, value in pod_template["metadata"]["labels"].items()
+                  if key in ("app", "component")}
+        labels[CAML_POOL_LABEL] = self.profile
+        return {
+            "apiVersion": "v1",
+            "kind": "Pod",
+            "metadata": {"generateName": f"warm-{labels.get('app', 'workspace')}-", "labels": labels},
+            "spec": pod_template["spec"],
+        }
+
+    @staticmethod
+    def _replica_set(workspace):
+        deployment = workspace.deployment
+        return {
+            "apiVersion": "apps/v1",
+            "kind": "ReplicaSet",
+            "metadata": {
+                "name": f"{deployment['metadata']['name']}-warm",
+                # Matched against the deployment's selector when the deployment adopts the replica set
+                "labels": deployment["metadata"]["labels"],
+            },
+            "spec": {
+                "replicas": 1,
+                "selector": deployment["spec"]["selector"],
+                "template": deployment["spec"]["template"],
+            },
+        }
+
+    def __repr__(self):
+        return f"WarmPool({self.profile}, size={self.size}, namespace={self.namespace})"
+
+
+class WarmPools:
+    """
+    The warm pools of a process, by namespace and profile
+    """
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def add(self, pool, start=True):
+        """
+        Registers a pool, replacing the pool of the same namespace and profile
+        @param pool: [WarmPool] The pool
+        @param start: [Boolean] Start refilling the pool right away
+        @return: [WarmPool] The pool
+        """
+        with self._lock:
+            previous = self._pools.get((pool.namespace, pool.profile))
+            self._pools[(pool.namespace, pool.profile)] = pool
+        if previous is not None and previous is not pool:
+            previous.stop()
+        if start:
+            pool.start()
+        return pool
+
+    def remove(self, namespace, profile, drain=False):
+        """
+        Stops and unregisters a pool
+        @param namespace: [String] The pool's namespace
+        @param profile: [String] The pool's profile
+        @param drain: [Boolean] Also delete the idle pods
+        @return: None
+        """
+        with self._lock:
+            pool = self._pools.pop((namespace, profile), None)
+        if pool is not None:
+            pool.stop(drain=drain)
+
+    def get(self, namespace, profile):
+        """
+        @return: [WarmPool] The pool of the namespace and profile, None if there is none
+        """
+        if profile is None:
+            return None
+        return self._pools.get((namespace, profile))
+
+    def list(self):
+        with self._lock:
+            return list(self._pools.values())
+
+    def stop(self):
+        """
+        Stops refilling every pool (the idle pods are kept)
+        @return: None
+        """
+        for pool in self.list():
+            pool.stop()
+
+
+_default_pools = None
+_default_pools_lock = threading.Lock()
+
+
+def get_warm_pools():
+    """
+    Returns the process wide warm pools, used by the workspaces clients that were created without their own
+    @return: WarmPools
+    """
+    global _default_pools
+    if _default_pools is None:
+        with _default_pools_lock:
+            if _default_pools is None:
+                _default_pools = WarmPools()
+    return _default_pools
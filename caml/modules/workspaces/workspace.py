@@ -1,6 +1,102 @@
-from kubernetes import client
+import json
+import logging
+import math
+import time
+
+from kubernetes import watch
 from kubernetes.client.exceptions import ApiException
 
+from caml.errors import CamlNotFoundError
+from caml.kube.api import get_default_api
+from caml.kube.consts import (CAML_COMPUTE_NAMESPACE, CAML_CULLED_ANNOTATION, CAML_PROVISIONING_ANNOTATION,
+                              CAML_WORKSPACE_LABEL)
+from caml.kube.utils import HTTP_STATUS_GONE, read_raw_json
+from caml.modules.workspaces.lifecycle import (DEFAULT_READY_TIMEOUT, TIMEOUT_REASON, WORKSPACE_PHASE,
+                                               ProvisioningTimeline, WorkspaceReadiness, deployment_failure,
+                                               get_pod_phase, is_settled, newest_pod, resume_patch)
+
+logger = logging.getLogger(__name__)
+
+
+class ROUTING_MODE:
+    """
+    How the workspaces are reached from outside of the cluster
+    """
+
+    # Every workspace gets its own LoadBalancer service (and external load balancer)
+    LOAD_BALANCER = "load_balancer"
+    # The workspaces get ClusterIP services, reached through the shared CAML gateway at /{project}/{workspace}/
+    GATEWAY = "gateway"
+
+
+def get_base_url(project, name):
+    """
+    @param project: [String] The project name
+    @param name: [String] The workspace name
+    @return: [String] The path the gateway serves the workspace under
+    """
+    return f"/{project}/{name}/"
+
+
+def get_resource_name(project, name):
+    """
+    @param project: [String] The project name
+    @param name: [String] The workspace name
+    @return: [String] The name of the workspace's kubernetes resources
+    """
+    return f"workspace-{project}-{name}"
+
+
+class WorkspaceRecord:
+    """
+    A compact, read only view of a workspace (names, labels and status only)
+    """
+
+    __slots__ = ("name", "project", "labels", "replicas", "ready_replicas", "created_at", "provisioning",
+                 "culled_at")
+
+    def __init__(self, name, project, labels, replicas, ready_replicas, created_at, provisioning=None,
+                 culled_at=None):
+        self.name = name
+        self.project = project
+        self.labels = labels
+        self.replicas = replicas
+        self.ready_replicas = ready_replicas
+        self.created_at = created_at
+        # The phase breakdown recorded by wait_until_ready (seconds per phase)
+        self.provisioning = provisioning
+        # When the idle culler scaled the workspace to zero (None if it is not culled)
+        self.culled_at = culled_at
+
+    @classmethod
+    def from_raw(cls, item):
+        """
+        @param item: [Dict] A raw deployment json
+        @return: WorkspaceRecord
+        """
+        metadata = item["metadata"]
+        labels = metadata.get("labels") or {}
+        status = item.get("status") or {}
+        annotations = metadata.get("annotations") or {}
+        provisioning = annotations.get(CAML_PROVISIONING_ANNOTATION)
+        return cls(
+            name=metadata["name"],
+            project=labels.get("project"),
+            labels=labels,
+            replicas=item.get("spec", {}).get("replicas", 0),
+            ready_replicas=status.get("readyReplicas", 0),
+            created_at=metadata.get("creationTimestamp"),
+            provisioning=json.loads(provisioning) if provisioning else None,
+            culled_at=annotations.get(CAML_CULLED_ANNOTATION)
+        )
+
+    @property
+    def ready(self):
+        return self.replicas > 0 and self.ready_replicas >= self.replicas
+
+    def __repr__(self):
+        return f"WorkspaceRecord({self.name}, ready={self.ready})"
+
 
 class Workspace:
     # TODO: decide on dynamic attributes and lazy loading
@@ -8,23 +104,178 @@ class Workspace:
         "name": str,
     }
 
-    def __init__(self, project, name, attributes=None):
+    def __init__(self, project, name, attributes=None, resource_name=None, api=None,
+                 namespace=CAML_COMPUTE_NAMESPACE):
         if attributes:
             self.attributes = {**attributes}
 
         self.name = name
         self.project = project
+        self.resource_name = resource_name or get_resource_name(project, name)
+        self.namespace = namespace
+
+        self.api = api or get_default_api()
 
-        self.core_api = client.CoreV1Api()
-        self.apps_api = client.AppsV1Api()
+    @property
+    def core_api(self):
+        return self.api.core
+
+    @property
+    def apps_api(self):
+        return self.api.apps
 
     def delete(self):
         """
-        Deletes the current project
+        Deletes the current workspace, the service is deleted even if the deployment delete failed
+        @raise CamlNotFoundError: if neither the deployment nor the service exist
         @return: None
         """
+        errors = []
+        for delete in (self.apps_api.delete_namespaced_deployment, self.core_api.delete_namespaced_service):
+            try:
+                delete(name=self.resource_name, namespace=self.namespace)
+            except ApiException as e:
+                errors.append(e)
+
+        failures = [e for e in errors if e.status != 404]
+        if failures:
+            raise failures[0]
+        # A partially created workspace has only one of them
+        if len(errors) == 2:
+            raise CamlNotFoundError("Workspace not found")
+
+    def resume(self):
+        """
+        Scales a culled workspace back to its replicas, follow with wait_until_ready() to wait for it
+        @raise CamlNotFoundError: if the workspace does not exist
+        @return: [Boolean] False if the workspace was not culled
+        """
+        body = resume_patch(self._read_deployment())
+        if body is None:
+            return False
+
         try:
-            self.project_client.create_namespaced_deployment(**self.resource_args)
+            self.apps_api.patch_namespaced_deployment(name=self.resource_name, namespace=self.namespace, body=body)
         except ApiException as e:
             if e.status == 404:
-                print("not found!")
+                raise CamlNotFoundError("Workspace not found")
+            raise e
+        return True
+
+    def wait_until_ready(self, timeout=DEFAULT_READY_TIMEOUT):
+        """
+        Follows the workspace's pods until it is ready, fails fast when it cannot become ready on its own
+        (image pull errors, crash loops, unschedulable pods or a deployment that cannot create its pod).
+        Once ready, the provisioning phase breakdown is recorded on the deployment.
+        @param timeout: [Float] Max seconds to wait
+        @raise CamlNotFoundError: if the workspace does not exist
+        @return: WorkspaceReadiness (truthy when ready), holds the reason when the workspace is not ready
+        """
+        started = time.monotonic()
+        deadline = started + timeout
+        deployment = self._read_deployment()
+
+        failure = deployment_failure(deployment)
+        if failure:
+            return WorkspaceReadiness(WORKSPACE_PHASE.FAILED, *failure, elapsed=time.monotonic() - started)
+
+        phase, reason, message, pod = WORKSPACE_PHASE.PENDING, None, None, None
+        pods = {}
+        resource_version = None
+        while time.monotonic() < deadline:
+            try:
+                if resource_version is None:
+                    pod_list = read_raw_json(self._list_pods(_preload_content=False))
+                    pods = {item["metadata"]["name"]: item for item in pod_list["items"]}
+                    resource_version = pod_list["metadata"]["resourceVersion"]
+                    phase, reason, message, pod = self._current_phase(pods)
+                    if is_settled(phase, reason):
+                        break
+
+                remaining = deadline - time.monotonic()
+                stream = watch.Watch().stream(
+                    self._list_pods,
+                    resource_version=resource_version,
+                    timeout_seconds=max(math.ceil(remaining), 1),
+                    allow_watch_bookmarks=True,
+                    _request_timeout=remaining + 5
+                )
+                for event in stream:
+                    obj = event["raw_object"]
+                    resource_version = obj["metadata"]["resourceVersion"]
+                    if event["type"] == "BOOKMARK":
+                        continue
+                    if event["type"] == "DELETED":
+                        pods.pop(obj["metadata"]["name"], None)
+                    else:
+                        pods[obj["metadata"]["name"]] = obj
+
+                    phase, reason, message, pod = self._current_phase(pods)
+                    if is_settled(phase, reason) or time.monotonic() >= deadline:
+                        stream.close()
+                        break
+                if is_settled(phase, reason):
+                    break
+            except ApiException as e:
+                if e.status != HTTP_STATUS_GONE:
+                    raise e
+                resource_version = None
+        elapsed = time.monotonic() - started
+
+        if pod is None:
+            # No pod at all, the deployment may have failed to create it since the first read
+            failure = deployment_failure(self._read_deployment())
+            if failure:
+                return WorkspaceReadiness(WORKSPACE_PHASE.FAILED, *failure, elapsed=elapsed)
+
+        if phase != WORKSPACE_PHASE.READY:
+            if not is_settled(phase, reason):
+                message = f"The workspace is {phase}" + (f" ({reason})" if reason else "")
+                reason = TIMEOUT_REASON
+            return WorkspaceReadiness(phase, reason, message, elapsed=elapsed)
+
+        timeline = ProvisioningTimeline.from_raw(deployment, pod, self._list_pod_events(pod["metadata"]["name"]))
+        self._record_provisioning(timeline)
+        return WorkspaceReadiness(phase, elapsed=elapsed, timeline=timeline)
+
+    def _read_deployment(self):
+        try:
+            response = self.apps_api.read_namespaced_deployment(name=self.resource_name, namespace=self.namespace,
+                                                                _preload_content=False)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Workspace not found")
+            raise e
+        return read_raw_json(response)
+
+    def _list_pods(self, **kwargs):
+        return self.core_api.list_namespaced_pod(namespace=self.namespace,
+                                                 label_selector=f"{CAML_WORKSPACE_LABEL}={self.resource_name}",
+                                                 **kwargs)
+
+    def _list_pod_events(self, pod_name):
+        response = self.core_api.list_namespaced_event(
+            namespace=self.namespace,
+            field_selector=f"involvedObject.kind=Pod,involvedObject.name={pod_name}",
+            _preload_content=False
+        )
+        return read_raw_json(response)["items"]
+
+    @staticmethod
+    def _current_phase(pods):
+        """
+        @param pods: [Dict] pod name -> raw pod json
+        @return: (phase, reason, message, the pod that decides the phase)
+        """
+        pod = newest_pod(list(pods.values()))
+        if pod is None:
+            return WORKSPACE_PHASE.PENDING, None, "Waiting for the workspace pod to be created", None
+        return (*get_pod_phase(pod), pod)
+
+    def _record_provisioning(self, timeline):
+        # Best effort, the breakdown is informational and must not fail a ready workspace
+        body = {"metadata": {"annotations": {CAML_PROVISIONING_ANNOTATION: json.dumps(timeline.durations)}}}
+        try:
+            self.apps_api.patch_namespaced_deployment(name=self.resource_name, namespace=self.namespace, body=body)
+        except ApiException as e:
+            logger.warning(f"failed to record the provisioning of {self.resource_name}: {e}")
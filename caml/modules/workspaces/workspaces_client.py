@@ -1,56 +1,270 @@
-from kubernetes import client
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from kubernetes.client.exceptions import ApiException
 
+from caml.errors import CamlConflictError, CamlNotFoundError
+from caml.kube.api import get_default_api
 from caml.kube.consts import CAML_COMPUTE_NAMESPACE
+from caml.kube.utils import DEFAULT_PAGE_SIZE, iter_list_items, read_raw_json
+from caml.modules.workspaces.image_cache import get_image_cache
 from caml.modules.workspaces.jupyter_notebook import JupyterNotebook
-from caml.modules.workspaces.workspace import Workspace
+from caml.modules.workspaces.warm_pool import get_warm_pools
+from caml.modules.workspaces.workspace import ROUTING_MODE, Workspace, WorkspaceRecord, get_resource_name
+
+logger = logging.getLogger(__name__)
+
+# Default max API calls in flight for the bulk operations
+DEFAULT_BULK_CONCURRENCY = 20
 
 
 class WORKSPACES:
     JUPYTER_NOTEBOOK = JupyterNotebook
 
+    @classmethod
+    def images(cls):
+        """
+        @return: [List] The images of the registered workspace types
+        """
+        return sorted({ws_class.IMAGE for name, ws_class in vars(cls).items() if name.isupper()})
+
+
+class BulkResult:
+    """
+    The outcome of a single item of a bulk operation
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.workspace = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error: {self.error}"
+        return f"BulkResult({self.name}, {status})"
+
 
 class WorkspacesClient:
-    def __init__(self, project="test"):
+    def __init__(self, project="test", api=None, namespace=CAML_COMPUTE_NAMESPACE, warm_pools=None, image_cache=None,
+                 routing=ROUTING_MODE.LOAD_BALANCER):
         # TODO: change project to required
         self.project = project
-        self.core_api = client.CoreV1Api()
-        self.apps_api = client.AppsV1Api()
+        self.namespace = namespace
+        self.routing = routing
+        self.api = api or get_default_api()
+        self.warm_pools = warm_pools or get_warm_pools()
+        self.image_cache = image_cache or get_image_cache(self.api)
+        self.core_api = self.api.core
+        self.apps_api = self.api.apps
 
     def create(self, ws_class, name):
         # TODO: validate workspace
 
-        workspace = ws_class(project=self.project, name=name)
+        workspace = ws_class(project=self.project, name=name, routing=self.routing, **self._image_args(ws_class))
+
+        # A warm pod of the workspace's profile is adopted by the deployment instead of starting a new pod
+        pool = self.warm_pools.get(self.namespace, getattr(workspace, "profile", None))
+        pod_name = pool.claim(workspace) if pool is not None else None
 
         try:
-            self.apps_api.create_namespaced_deployment(namespace=CAML_COMPUTE_NAMESPACE, body=workspace.deployment)
-        except ApiException as e:
-            if e.status == 409:
-                raise Exception("duplicato")
-            if e.status == 422:
-                print("invalid!")
-                raise e
+            self._create_deployment(workspace)
+        except Exception:
+            # An unowned claimed pod would be adopted by the deployment of the same name (on a conflict that is the
+            # existing workspace)
+            if pod_name is not None:
+                pool.release(workspace, pod_name)
+            raise
 
         try:
-            hue = self.core_api.create_namespaced_service(namespace=CAML_COMPUTE_NAMESPACE, body=workspace.service)
-        except ApiException as e:
-            if e.status == 409:
-                raise Exception("duplicato")
-            if e.status == 422:
-                print("invalid!")
-                raise e
+            self._create_service(workspace)
+        except Exception:
+            # A workspace without its service is unreachable, and a retry of the create would conflict with it
+            self._rollback(self._delete_deployment, workspace.resource_name)
+            raise
+
+        return Workspace(project=self.project, name=name, api=self.api, namespace=self.namespace)
+
+    def create_many(self, specs, concurrency=DEFAULT_BULK_CONCURRENCY):
+        """
+        Creates many workspaces, the deployment and service calls of all of the workspaces are pipelined
+        @param specs: [List] Dicts of {"ws_class": ..., "name": ..., **additional workspace arguments}
+        @param concurrency: [Integer] Max API calls in flight
+        @return: [List] BulkResult per spec (in the same order), failed items hold the error
+        """
+        results = [BulkResult(spec["name"]) for spec in specs]
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {}
+            rollbacks = {}
+            for result, spec in zip(results, specs):
+                kwargs = {key: value for key, value in spec.items() if key not in ("ws_class", "name")}
+                kwargs.setdefault("routing", self.routing)
+                try:
+                    workspace = spec["ws_class"](project=self.project, name=spec["name"], **kwargs)
+                except Exception as e:
+                    result.error = e
+                    continue
+
+                # The deployment and the service don't depend on each other, so both calls are in flight together
+                deployment = executor.submit(self._create_deployment, workspace)
+                service = executor.submit(self._create_service, workspace)
+                futures[deployment] = futures[service] = result
+                rollbacks[deployment] = (self._delete_deployment, workspace.resource_name)
+                rollbacks[service] = (self._delete_service, workspace.resource_name)
+
+            self._collect_errors(futures)
+
+            # The half that was created of a failed workspace is deleted again, so a retry does not conflict with it
+            undo = [executor.submit(self._rollback, *rollbacks[future]) for future, result in futures.items()
+                    if not result.ok and future.exception() is None]
+            for future in undo:
+                future.result()
+
+        for result in results:
+            if result.ok:
+                result.workspace = Workspace(project=self.project, name=result.name, api=self.api,
+                                             namespace=self.namespace)
+        return results
+
+    def delete(self, name):
+        """
+        Deletes a workspace by name
+        @param name: [String] The workspace name
+        @raise CamlNotFoundError: if the workspace does not exist
+        @return: None
+        """
+        Workspace(project=self.project, name=name, api=self.api, namespace=self.namespace).delete()
+
+    def delete_many(self, names, concurrency=DEFAULT_BULK_CONCURRENCY):
+        """
+        Deletes many workspaces, the deployment and service calls of all of the workspaces are pipelined
+        @param names: [List] The workspace names
+        @param concurrency: [Integer] Max API calls in flight
+        @return: [List] BulkResult per name (in the same order), failed items hold the error
+        """
+        results = [BulkResult(name) for name in names]
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {}
+            for result in results:
+                resource_name = get_resource_name(self.project, result.name)
+                futures[executor.submit(self._delete_deployment, resource_name)] = result
+                futures[executor.submit(self._delete_service, resource_name)] = result
 
-        return Workspace(project=self.project, name=name)
+            self._collect_errors(futures)
+
+        return results
 
     def list(self):
         label_selector = f"project={self.project}"
         response = self.apps_api.list_namespaced_deployment(
-            namespace=CAML_COMPUTE_NAMESPACE,
+            namespace=self.namespace,
             label_selector=label_selector
         )
 
         workspaces = []
         for item in response.items:
-            workspace = Workspace(project=self.project, name=item.metadata.name, attributes=item.spec)
+            workspace = Workspace(project=self.project, name=item.metadata.name, attributes=item.spec.to_dict(),
+                                  resource_name=item.metadata.name, api=self.api, namespace=self.namespace)
             workspaces.append(workspace)
         return workspaces
+
+    def list_records(self):
+        """
+        Lists the project's workspaces as compact records (names, labels and status)
+        The raw json is decoded directly, skipping the kubernetes model deserialization.
+        @return: [List] WorkspaceRecord objects
+        """
+        response = self.apps_api.list_namespaced_deployment(
+            namespace=self.namespace,
+            label_selector=f"project={self.project}",
+            _preload_content=False
+        )
+        return [WorkspaceRecord.from_raw(item) for item in read_raw_json(response)["items"]]
+
+    def iter(self, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Iterates over the project's workspaces page by page, only one page is held in memory at a time
+        @param page_size: [Integer] Max workspaces fetched per API call
+        @return: Generator of Workspace objects
+        """
+        items = iter_list_items(
+            self.apps_api.list_namespaced_deployment,
+            page_size,
+            namespace=self.namespace,
+            label_selector=f"project={self.project}"
+        )
+        for item in items:
+            yield Workspace(project=self.project, name=item.metadata.name, attributes=item.spec.to_dict(),
+                            resource_name=item.metadata.name, api=self.api, namespace=self.namespace)
+
+    def _image_args(self, ws_class):
+        """
+        @return: [Dict] The digest pinned image and its pull policy, when the image is cached on the compute nodes
+        """
+        if not hasattr(ws_class, "IMAGE"):
+            return {}
+        image, image_pull_policy = self.image_cache.resolve(ws_class.IMAGE)
+        return {"image": image, "image_pull_policy": image_pull_policy}
+
+    def _create_deployment(self, workspace):
+        try:
+            self.apps_api.create_namespaced_deployment(namespace=self.namespace, body=workspace.deployment)
+        except ApiException as e:
+            if e.status == 409:
+                raise CamlConflictError("Workspace already exists")
+            raise e
+
+    def _create_service(self, workspace):
+        try:
+            self.core_api.create_namespaced_service(namespace=self.namespace, body=workspace.service)
+        except ApiException as e:
+            if e.status == 409:
+                raise CamlConflictError("Workspace already exists")
+            raise e
+
+    def _delete_deployment(self, resource_name):
+        try:
+            self.apps_api.delete_namespaced_deployment(name=resource_name, namespace=self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Workspace not found")
+            raise e
+
+    def _delete_service(self, resource_name):
+        try:
+            self.core_api.delete_namespaced_service(name=resource_name, namespace=self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                raise CamlNotFoundError("Workspace not found")
+            raise e
+
+    @staticmethod
+    def _rollback(delete_func, resource_name):
+        """
+        Deletes a resource of a workspace that failed to be created, a failure is only logged (the create error is
+        the one that is reported)
+        @param delete_func: [Function] _delete_deployment or _delete_service
+        @param resource_name: [String] The workspace's resource name
+        @return: None
+        """
+        try:
+            delete_func(resource_name)
+        except Exception as e:
+            logger.warning(f"failed to roll back the partially created workspace {resource_name}: {e}")
+
+    @staticmethod
+    def _collect_errors(futures):
+        """
+        Waits for the bulk calls and keeps the first error of every item
+        @param futures: [Dict] future -> BulkResult
+        @return: None
+        """
+        for future in as_completed(futures):
+            result = futures[future]
+            if future.exception() and result.error is None:
+                result.error = future.exception()
@@ -0,0 +1,229 @@
+import codecs
+import json
+from collections.abc import Mapping, Sequence
+
+from caml.errors import CamlError
+
+# Bytes read from the network at a time when streaming
+DEFAULT_STREAM_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+# Marks a LazyJSON that was not decoded yet (None is a valid decoded body)
+_UNSET = object()
+
+
+class RESPONSE_MODE:
+    # Decode the full body into ordered dicts (the default)
+    EAGER = "eager"
+    # Keep the raw body and decode on first access, nested values are wrapped only when they are accessed
+    LAZY = "lazy"
+    # Iterate over the items of a (possibly huge) json array without holding the full body
+    STREAM = "stream"
+
+
+def _wrap(value):
+    if isinstance(value, dict):
+        return LazyObject(value)
+    if isinstance(value, list):
+        return LazyArray(value)
+    return value
+
+
+class LazyObject(Mapping):
+    """
+    A read only view over a decoded json object, nested objects are wrapped on access
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, key):
+        return _wrap(self._data[key])
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def to_dict(self):
+        return self._data
+
+
+class LazyArray(Sequence):
+    """
+    A read only view over a decoded json array, nested objects are wrapped on access
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyArray(self._data[index])
+        return _wrap(self._data[index])
+
+    def __len__(self):
+        return len(self._data)
+
+    def to_list(self):
+        return self._data
+
+
+class LazyJSON:
+    """
+    Holds the raw response body and decodes it only when it is first accessed
+    """
+
+    __slots__ = ("_raw", "_value")
+
+    def __init__(self, raw):
+        """
+        @param raw: [Bytes] The raw json body (not copied)
+        """
+        self._raw = raw
+        self._value = _UNSET
+
+    @property
+    def value(self):
+        if self._value is _UNSET:
+            # Plain dicts are decoded in C, the views are only created for the parts that are accessed
+            self._value = _wrap(json.loads(self._raw))
+            self._raw = None
+        return self._value
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __getattr__(self, key):
+        return getattr(self.value, key)
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+
+class _Buffer:
+    """
+    Incrementally decoded text buffer over an iterator of byte chunks
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.position = 0
+        self.exhausted = False
+
+    def read_more(self):
+        """
+        @return: [Boolean] False if the stream has ended
+        """
+        if self.exhausted:
+            return False
+
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            self.text = self.text[self.position:] + self._decoder.decode(b"", final=True)
+        else:
+            # Drop the consumed prefix so the buffer only holds the current item
+            self.text = self.text[self.position:] + self._decoder.decode(chunk)
+        self.position = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character (None at the end of the stream)
+        """
+        while True:
+            while self.position < len(self.text) and self.text[self.position] in _WHITESPACE:
+                self.position += 1
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self.read_more():
+                return None
+
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            raise CamlError(f"Invalid json stream, expected one of {characters!r} got {character!r}")
+        self.position += 1
+        return character
+
+    def decode_value(self):
+        """
+        Decodes the next complete json value, reading more chunks until it is complete
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.position)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.text) or self.exhausted or isinstance(value, (dict, list, str)):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            self.read_more()
+
+
+def iter_json_array(chunks, key=None):
+    """
+    Yields the items of a json array one at a time without decoding (or holding) the full document
+    @param chunks: [Iterable] The body as byte chunks (for example response.iter_content())
+    @param key: [String] The top level key of the array, None if the document is the array itself
+    @raise CamlError: if the document does not have the expected structure
+    @return: Generator of the decoded items
+    """
+    buffer = _Buffer(chunks)
+
+    if key is not None:
+        buffer.expect("{")
+        separator = "," if buffer.peek() != "}" else buffer.expect("}")
+        while separator == ",":
+            current_key = buffer.decode_value()
+            buffer.expect(":")
+            if current_key == key:
+                break
+            buffer.decode_value()
+            separator = buffer.expect(",}")
+        else:
+            raise CamlError(f"Key {key} was not found in the json stream")
+
+    buffer.expect("[")
+    if buffer.peek() == "]":
+        return
+
+    while True:
+        yield buffer.decode_value()
+        if buffer.expect(",]") == "]":
+            return
+
+
+def iter_response_array(response, key=None, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    """
+    Streams the items of a json array response, the response is closed once the iteration ends
+    @param response: [requests.Response] A response requested with stream=True
+    @param key: [String] The top level key of the array, None if the body is the array itself
+    @param chunk_size: [Integer] Bytes read from the network at a time
+    @return: Generator of the decoded items
+    """
+    try:
+        yield from iter_json_array(response.iter_content(chunk_size=chunk_size), key=key)
+    finally:
+        response.close()
@@ -1,5 +1,24 @@
 import json
 import requests
+from requests.adapters import HTTPAdapter
+
+from caml.proxy.decoders import RESPONSE_MODE, LazyJSON, iter_response_array
+from caml.proxy.uploads import (DEFAULT_CHUNK_SIZE, DEFAULT_PART_RETRIES, DEFAULT_PART_SIZE, DEFAULT_PART_WORKERS,
+                                ChunkedUpload, MultipartStream)
+
+# Number of per host connection pools kept by the session
+DEFAULT_POOL_CONNECTIONS = 10
+# Max connections kept alive per host
+DEFAULT_POOL_MAXSIZE = 20
+
+
+def urljoin(*parts):
+    """
+    Joins url parts with single slashes (urllib's urljoin resolves relative references instead)
+    @param parts: The url parts, for example (domain, "api", route)
+    @return: [String] The joined url
+    """
+    return "/".join(str(part).strip("/") for part in parts)
 
 
 class HTTP:
@@ -11,12 +30,52 @@ class HTTP:
 
 
 class Proxy:
-    def __init__(self, context=None):
+    def __init__(self, context=None, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 check_certificate=True):
+        """
+        @param context: The context holding the domain and credentials
+        @param pool_connections: [Integer] Number of hosts to keep connection pools for
+        @param pool_maxsize: [Integer] Max keep-alive connections per host
+        @param check_certificate: [Boolean] Verify the server's TLS certificate (or a path to a CA bundle)
+        """
         self._domain = context.domain
         self._token = context.token
         self._is_capi = context.is_capi
 
-    def call_api(self, route, http_method, payload=None, files_list=None, headers=None):
+        self._check_certificate = check_certificate
+        self._session = self._create_session(pool_connections, pool_maxsize, check_certificate)
+
+    def close(self):
+        """
+        Closes the pooled connections
+        @return: None
+        """
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _create_session(pool_connections, pool_maxsize, check_certificate):
+        """
+        Creates a long lived session, connections are kept alive and reused across calls and threads
+        @param pool_connections: [Integer] Number of hosts to keep connection pools for
+        @param pool_maxsize: [Integer] Max keep-alive connections per host
+        @param check_certificate: [Boolean] The default certificate verification of the session's requests
+        @return: requests.Session
+        """
+        session = requests.Session()
+        session.verify = check_certificate
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def call_api(self, route, http_method, payload=None, files_list=None, headers=None,
+                 response_mode=RESPONSE_MODE.EAGER, stream_key=None):
         """
         The main function controlling access to the Cnvrg API
         @param route: the partial url of the api resource to access
@@ -24,6 +83,8 @@ class Proxy:
         @param payload: params to send along with the api request
         @param headers: headers to add to the http request. (application/json cont-type is sent by default)
         @param files_list: list of tuples in the following form: (file_name, file_path)
+        @param response_mode: [RESPONSE_MODE] How the response body is decoded
+        @param stream_key: [String] In STREAM mode, the top level key of the streamed array (None for a root array)
         @raise ValueError: if http_method is not legal
         @return: Response object
         """
@@ -33,7 +94,8 @@ class Proxy:
             full_url = urljoin(self._domain, "api", route)
 
             cookies = {}
-            response = self._http_method_switch(http_method, full_url, payload, full_headers, cookies, files_list)
+            response = self._http_method_switch(http_method, full_url, payload, full_headers, cookies, files_list,
+                                                response_mode, stream_key)
             return response
 
         except Exception as e:
@@ -43,7 +105,40 @@ class Proxy:
             else:
                 raise e
 
-    def _http_method_switch(self, http_method, url, payload, headers, cookies, files_list=None):
+    def upload_file(self, route, file_path, headers=None, part_size=DEFAULT_PART_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+                    workers=DEFAULT_PART_WORKERS, retries=DEFAULT_PART_RETRIES, progress_callback=None,
+                    completed_parts=None):
+        """
+        Uploads a large file as parallel resumable parts, memory usage is bounded by chunk_size * workers
+        @param route: the partial url of the api resource to upload to
+        @param file_path: [String] The file to upload
+        @param headers: headers to add to every part request
+        @param part_size: [Integer] Bytes per part
+        @param chunk_size: [Integer] Bytes read from disk at a time
+        @param workers: [Integer] Parts uploaded in parallel
+        @param retries: [Integer] Attempts per part
+        @param progress_callback: [Function] (bytes_uploaded, total_bytes) called as data is sent
+        @param completed_parts: [Iterable] Part numbers uploaded by a previous attempt, these are skipped
+        @raise HTTPError: if a part failed on all of its attempts
+        @return: [Set] The uploaded part numbers
+        """
+        upload = ChunkedUpload(
+            self._session,
+            urljoin(self._domain, "api", route),
+            file_path,
+            headers=self._build_headers(headers, is_file=True),
+            verify=self._check_certificate,
+            part_size=part_size,
+            chunk_size=chunk_size,
+            workers=workers,
+            retries=retries,
+            progress_callback=progress_callback,
+            completed_parts=completed_parts
+        )
+        return upload.run()
+
+    def _http_method_switch(self, http_method, url, payload, headers, cookies, files_list=None,
+                            response_mode=RESPONSE_MODE.EAGER, stream_key=None):
         """
         Executes the correct HTTP request based on the input parameters
         @param http_method: The https method to use
@@ -52,26 +147,32 @@ class Proxy:
         @param headers: Headers to attach to the request
         @param cookies: Cookies to attach to the request
         @param files_list: list of tuples in the following form: (file_name, file_path)
+        @param response_mode: [RESPONSE_MODE] How the response body is decoded
+        @param stream_key: [String] In STREAM mode, the top level key of the streamed array
         @return: The response as a JAF object
         """
-        check_certificate = Config().check_certificate or False
+        check_certificate = self._check_certificate
         response = None
 
         if http_method == HTTP.GET:
-            response = requests.get(url, params=payload, headers=headers, cookies=cookies, verify=check_certificate)
+            response = self._session.get(url, params=payload, headers=headers, cookies=cookies,
+                                         verify=check_certificate, stream=response_mode == RESPONSE_MODE.STREAM)
         elif http_method == HTTP.POST and files_list is not None:
-            files = []
-            for name, path in files_list:
-                files.append((name, (path, open(path, "rb"))))
-            files.append(("data", (None, json.dumps(payload["data"]), "application/json")))
-            response = requests.post(url, headers=headers, cookies=cookies, files=files)
+            # The files are streamed from disk in chunks, each file is closed as soon as it was sent
+            body = MultipartStream(files_list, fields=[("data", json.dumps(payload["data"]), "application/json")])
+            try:
+                response = self._session.post(url, data=body, headers={**headers, "Content-Type": body.content_type},
+                                              cookies=cookies, verify=check_certificate)
+            finally:
+                body.close()
         elif http_method == HTTP.POST:
-            response = requests.post(url, json=payload, headers=headers, cookies=cookies, verify=check_certificate)
+            response = self._session.post(url, json=payload, headers=headers, cookies=cookies, verify=check_certificate)
         elif http_method == HTTP.PUT:
-            response = requests.put(url, json=payload, headers=headers, cookies=cookies, verify=check_certificate)
+            response = self._session.put(url, json=payload, headers=headers, cookies=cookies, verify=check_certificate)
         elif http_method == HTTP.DELETE:
-            response = requests.delete(url, json=payload, headers=headers, cookies=cookies, verify=check_certificate)
-        return self._parse_response(response)
+            response = self._session.delete(url, json=payload, headers=headers, cookies=cookies,
+                                            verify=check_certificate)
+        return self._parse_response(response, response_mode, stream_key)
 
     def _build_headers(self, headers, is_file):
         """
@@ -97,14 +198,21 @@ class Proxy:
         full_headers['Source'] = "sdk_v2"
         return full_headers
 
-    def _parse_response(self, response):
+    def _parse_response(self, response, response_mode=RESPONSE_MODE.EAGER, stream_key=None):
         """
         This function handles the response from the api, decodes the json and returns the appropriate object
         @param response: Response object to handle
+        @param response_mode: [RESPONSE_MODE] How the response body is decoded
+        @param stream_key: [String] In STREAM mode, the top level key of the streamed array
         @raise HttpError: if got error from the server
-        @return: None or a json object
+        @return: None or a json object (a LazyJSON in LAZY mode, an items generator in STREAM mode)
         """
         if response.status_code == requests.codes.ok:
+            if response_mode == RESPONSE_MODE.LAZY:
+                return LazyJSON(response.content)
+            if response_mode == RESPONSE_MODE.STREAM:
+                return iter_response_array(response, key=stream_key)
+
             try:
                 # Convert to ordered dict in order to keep the json ordering from the server
                 response_decoded = response.json(object_pairs_hook=OrderedDict)
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Bytes read from disk at a time
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Bytes sent in a single resumable part
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_PART_WORKERS = 4
+DEFAULT_PART_RETRIES = 3
+
+
+class MultipartStream:
+    """
+    A multipart/form-data body that is read from disk in fixed size chunks while it is being sent.
+    The length is known upfront so the request is sent with a Content-Length and not chunked.
+    """
+
+    def __init__(self, files_list, fields=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        @param files_list: list of tuples in the following form: (file_name, file_path)
+        @param fields: list of tuples in the following form: (field_name, value, content_type)
+        @param chunk_size: [Integer] Bytes read from disk at a time
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.chunk_size = chunk_size
+
+        self._files = [(self._file_header(name, path), path) for name, path in files_list]
+        self._fields = [self._field_header(name, content_type) + value.encode() + b"\r\n"
+                        for name, value, content_type in (fields or [])]
+        self._trailer = f"--{self.boundary}--\r\n".encode()
+        self._iterator = None
+
+    def __len__(self):
+        files_length = sum(len(header) + os.path.getsize(path) + 2 for header, path in self._files)
+        return files_length + sum(len(field) for field in self._fields) + len(self._trailer)
+
+    def __iter__(self):
+        self._iterator = self._generate()
+        return self._iterator
+
+    def close(self):
+        """
+        Closes the file that is currently being read (if the upload was interrupted)
+        @return: None
+        """
+        if self._iterator:
+            self._iterator.close()
+
+    def _generate(self):
+        for header, path in self._files:
+            yield header
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                    yield chunk
+            yield b"\r\n"
+
+        yield from self._fields
+        yield self._trailer
+
+    def _file_header(self, name, path):
+        file_name = os.path.basename(path)
+        return (f"--{self.boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{name}\"; filename=\"{file_name}\"\r\n"
+                f"Content-Type: application/octet-stream\r\n\r\n").encode()
+
+    def _field_header(self, name, content_type):
+        return (f"--{self.boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{name}\"\r\n"
+                f"Content-Type: {content_type}\r\n\r\n").encode()
+
+
+class FilePartReader:
+    """
+    Streams a byte range of a file in fixed size chunks
+    """
+
+    def __init__(self, path, offset, length, chunk_size=DEFAULT_CHUNK_SIZE, on_read=None):
+        """
+        @param path: [String] The file path
+        @param offset: [Integer] The first byte of the part
+        @param length: [Integer] The part length in bytes
+        @param chunk_size: [Integer] Bytes read from disk at a time
+        @param on_read: [Function] (bytes_read) called after every chunk
+        """
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.chunk_size = chunk_size
+        self.on_read = on_read
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if self.on_read:
+                    self.on_read(len(chunk))
+                yield chunk
+
+
+class ChunkedUpload:
+    """
+    Uploads a single file as parallel resumable parts.
+    Every part is sent with a Content-Range header, failed parts are retried on their own
+    and already uploaded parts can be skipped to resume an interrupted upload.
+    """
+
+    def __init__(self, session, url, path, headers=None, verify=False, part_size=DEFAULT_PART_SIZE,
+                 chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_PART_WORKERS, retries=DEFAULT_PART_RETRIES,
+                 progress_callback=None, completed_parts=None):
+        """
+        @param session: [requests.Session] The session used to send the parts
+        @param url: [String] The upload url
+        @param path: [String] The file path
+        @param headers: [Dict] Headers to attach to every part
+        @param verify: [Boolean] Check the server certificate
+        @param part_size: [Integer] Bytes per part
+        @param chunk_size: [Integer] Bytes read from disk at a time
+        @param workers: [Integer] Parts uploaded in parallel
+        @param retries: [Integer] Attempts per part before the upload fails
+        @param progress_callback: [Function] (bytes_uploaded, total_bytes) called as data is sent
+        @param completed_parts: [Iterable] Part numbers that were already uploaded (to resume)
+        """
+        self.session = session
+        self.url = url
+        self.path = path
+        self.headers = headers or {}
+        self.verify = verify
+        self.part_size = part_size
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.retries = retries
+        self.progress_callback = progress_callback
+
+        self.total_size = os.path.getsize(path)
+        self.total_parts = max(1, -(-self.total_size // part_size))
+        self.completed_parts = set(completed_parts or [])
+
+        self._uploaded = sum(self._part_length(part) for part in self.completed_parts)
+        self._lock = threading.Lock()
+
+    def run(self):
+        """
+        Uploads the missing parts
+        @raise requests.HTTPError: if a part failed on all of its attempts, completed_parts keeps the parts that
+            made it so the upload can be resumed
+        @return: [Set] The uploaded part numbers
+        """
+        missing = [part for part in range(self.total_parts) if part not in self.completed_parts]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._upload_part, part) for part in missing]
+
+        errors = []
+        for future in futures:
+            if future.exception():
+                errors.append(future.exception())
+            else:
+                self.completed_parts.add(future.result())
+
+        if errors:
+            raise errors[0]
+        return self.completed_parts
+
+    def _upload_part(self, part):
+        offset = part * self.part_size
+        length = self._part_length(part)
+        content_range = f"bytes {offset}-{offset + length - 1}" if length else "bytes *"
+        headers = {
+            **self.headers,
+            "Content-Type": "application/octet-stream",
+            "Content-Range": f"{content_range}/{self.total_size}",
+        }
+
+        for attempt in range(self.retries):
+            sent = []
+            reader = FilePartReader(self.path, offset, length, self.chunk_size,
+                                    on_read=lambda n: self._progress(n, sent))
+            try:
+                response = self.session.put(self.url, params={"part": part}, data=reader, headers=headers,
+                                            verify=self.verify)
+                response.raise_for_status()
+                return part
+            except requests.RequestException:
+                # Roll back the progress of the failed attempt
+                self._progress(-sum(sent))
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def _part_length(self, part):
+        return min(self.part_size, self.total_size - part * self.part_size)
+
+    def _progress(self, length, sent=None):
+        if sent is not None:
+            sent.append(length)
+        with self._lock:
+            self._uploaded += length
+            uploaded = self._uploaded
+        if self.progress_callback:
+            self.progress_callback(uploaded, self.total_size)
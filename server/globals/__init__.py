@@ -1,4 +1,4 @@
-from caml import Caml
+from caml import AsyncCaml
 from .config import CONFIG
 
-caml_sdk = Caml()
+async_caml_sdk = AsyncCaml(routing=CONFIG["CAML_ROUTING"])
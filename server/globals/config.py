@@ -10,3 +10,7 @@ CONFIG = {
 
 CONFIG['CAML_PORT'] = CONFIG.get('CAML_PORT', "3333")
 CONFIG['CAML_DOMAIN'] = CONFIG.get('CAML_DOMAIN', "0.0.0.0")
+CONFIG['SINGLE_FLIGHT_TIMEOUT'] = float(CONFIG.get('SINGLE_FLIGHT_TIMEOUT', "5"))
+# "gateway" creates the workspaces behind the CAML gateway (served on CAML_GATEWAY_PORT) instead of load balancers
+CONFIG['CAML_ROUTING'] = CONFIG.get('CAML_ROUTING', "load_balancer")
+CONFIG['CAML_GATEWAY_PORT'] = CONFIG.get('CAML_GATEWAY_PORT', "8080")
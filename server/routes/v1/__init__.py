@@ -2,8 +2,10 @@ from fastapi import FastAPI
 
 from middlewares.exceptions import catch_exceptions_middleware
 from routes.v1.projects import project_router
+from routes.v1.workspaces import workspace_router
 
 v1 = FastAPI()
 v1.middleware('http')(catch_exceptions_middleware)
 
 v1.include_router(project_router)
+v1.include_router(workspace_router)
@@ -1,16 +1,31 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import status
+from fastapi import Query, Request, Response, status
 
-from globals import caml_sdk
+from caml.kube.query import MAX_PAGE_SIZE
+from globals import CONFIG, async_caml_sdk
 from routes.router import CAMLRouter
 from schemas.project_schemas import ProjectCreateSchema, ProjectSchema
+from utils import SingleFlight, collection_etag, etag_matches, not_modified, resource_etag, set_etag
 
 router = CAMLRouter(
     prefix="/projects",
     tags=["Projects"]
 )
 
+# Holds the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Concurrent identical reads share a single API server call
+projects_flight = SingleFlight("projects", follower_timeout=CONFIG["SINGLE_FLIGHT_TIMEOUT"])
+
+
+async def _get_loaded_project(project_name):
+    project = await async_caml_sdk.projects.get(project_name)
+    # A live get is lazy, load it here so the API server call is the one that is shared
+    await project.get_metadata()
+    return project
+
 
 @router.post("", response_model=ProjectSchema, status_code=status.HTTP_201_CREATED)
 async def create_project(project: ProjectCreateSchema):
@@ -18,26 +33,65 @@ async def create_project(project: ProjectCreateSchema):
     Creates a new CAML project
     """
 
-    project = caml_sdk.projects.create(project.name)
-    return project.to_json()
+    project = await async_caml_sdk.projects.create(project.name)
+    return await project.to_json()
 
 
 @router.get("", response_model=List[ProjectSchema])
-async def get_projects():
+async def get_projects(
+        request: Request,
+        response: Response,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        sort: Optional[str] = Query(None, description="name or created, prefix with - for a descending order"),
+        filters: List[str] = Query([], alias="filter", description="Label or field requirement, e.g. team=ml")
+):
     """
-    Returnes all CAML projects
+    Returns the CAML projects, a page at a time when a limit is given.
+    The cursor of the next page is returned in the X-Next-Cursor header.
+    Supports conditional requests: a matching If-None-Match is answered with 304 (from the cache when it is warm).
     """
-    projects = caml_sdk.projects.list()
-    return [project.to_json() for project in projects]
+    query = [limit, cursor, sort, filters]
+
+    # A warm cache versions the whole collection, so an unchanged list is detected without listing it
+    collection_version = async_caml_sdk.projects.collection_version()
+    if collection_version is not None:
+        etag = collection_etag(query, collection_version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+    page = await projects_flight.do(
+        ("query", limit, cursor, sort, tuple(filters)),
+        lambda: async_caml_sdk.projects.query(limit=limit, cursor=cursor, sort=sort, filters=filters)
+    )
+    # The cache may have changed since the check above, the ETag follows the snapshot the page was cut from
+    if page.version is not None:
+        etag = collection_etag(query, page.version)
+    else:
+        versions = [[project.name, (await project.get_metadata())["resourceVersion"]] for project in page.items]
+        etag = collection_etag(query, versions, page.next_cursor)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    set_etag(response, etag)
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return [await project.to_json() for project in page.items]
 
 
 @router.get("/{project_name}", response_model=ProjectSchema)
-async def get_project(project_name: str):
+async def get_project(project_name: str, request: Request, response: Response):
     """
     Returns a CAML project by name
+    Supports conditional requests: a matching If-None-Match is answered with 304 (from the cache when it is warm).
     """
-    project = caml_sdk.projects.get(project_name)
-    return project.to_json()
+    project = await projects_flight.do(("get", project_name), lambda: _get_loaded_project(project_name))
+    etag = resource_etag((await project.get_metadata())["resourceVersion"])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    set_etag(response, etag)
+    return await project.to_json()
 
 
 @router.delete("/{project_name}", status_code=status.HTTP_204_NO_CONTENT)
@@ -45,4 +99,4 @@ async def delete_project(project_name: str):
     """
     Deletes a CAML project by name
     """
-    caml_sdk.projects.delete(project_name)
+    await async_caml_sdk.projects.delete(project_name)
@@ -0,0 +1 @@
+from routes.v1.workspaces.workspaces import router as workspace_router
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from prometheus_client import Counter, Gauge
+
+from caml.modules.workspaces import SubscriptionEvicted
+from globals import async_caml_sdk
+from routes.router import CAMLRouter
+
+router = CAMLRouter(
+    prefix="/workspaces",
+    tags=["Workspaces"]
+)
+
+# Seconds between SSE comments that keep idle connections (and the proxies in front of them) open
+KEEP_ALIVE_INTERVAL = 15
+# The WebSocket close code of an evicted subscriber ("try again later")
+WS_TRY_AGAIN_LATER = 1013
+
+EVENT_SUBSCRIBERS = Gauge(
+    "caml_workspace_event_subscribers",
+    "Clients currently streaming the workspace events",
+    ["transport"]
+)
+EVENT_EVICTIONS = Counter(
+    "caml_workspace_event_evictions_total",
+    "Clients that fell behind the workspace events and were disconnected",
+    ["transport"]
+)
+
+
+async def _sse_stream(subscription):
+    subscribers = EVENT_SUBSCRIBERS.labels("sse")
+    subscribers.inc()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), KEEP_ALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            except SubscriptionEvicted as e:
+                EVENT_EVICTIONS.labels("sse").inc()
+                yield f"event: evicted\ndata: {json.dumps({'error': str(e)})}\n\n"
+                return
+
+            if event is None:
+                return
+            yield f"event: workspace\ndata: {json.dumps(event.to_dict())}\n\n"
+    finally:
+        subscription.close()
+        subscribers.dec()
+
+
+@router.get("/events")
+async def stream_workspace_events(project: Optional[str] = None, workspace: Optional[str] = None):
+    """
+    Streams the workspace lifecycle events as server-sent events (text/event-stream).
+    The stream starts with the current phase of every matching workspace, then sends every phase change.
+    A client that falls behind receives an "evicted" event and the stream ends, reconnect to resume.
+    """
+    subscription = async_caml_sdk.workspace_events.subscribe(project=project, name=workspace)
+    return StreamingResponse(
+        _sse_stream(subscription),
+        media_type="text/event-stream",
+        # Proxies must pass the events through as they are sent
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/events/ws")
+async def workspace_events_socket(websocket: WebSocket, project: Optional[str] = None,
+                                  workspace: Optional[str] = None):
+    """
+    Streams the workspace lifecycle events as JSON messages over a WebSocket.
+    A client that falls behind is disconnected with close code 1013, reconnect to resume.
+    """
+    await websocket.accept()
+    subscription = async_caml_sdk.workspace_events.subscribe(project=project, name=workspace)
+    # The client only ever closes the socket, noticing it ends the subscription without waiting for an event
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket, subscription))
+    subscribers = EVENT_SUBSCRIBERS.labels("websocket")
+    subscribers.inc()
+    try:
+        async for event in subscription:
+            await websocket.send_json(event.to_dict())
+        if not disconnected.done():
+            await websocket.close()
+    except SubscriptionEvicted:
+        EVENT_EVICTIONS.labels("websocket").inc()
+        await websocket.close(code=WS_TRY_AGAIN_LATER)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        subscription.close()
+        subscribers.dec()
+
+
+async def _wait_for_disconnect(websocket, subscription):
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        subscription.close()
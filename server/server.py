@@ -10,9 +10,11 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.responses import FileResponse
 from starlette_exporter import PrometheusMiddleware, handle_metrics
 
-from globals import CONFIG
+from caml.modules.workspaces import ROUTING_MODE, run_gateway
+from globals import CONFIG, async_caml_sdk
 from middlewares.logger import log_requests
 from routes.v1 import v1
+from routes.v1.projects.projects import NEXT_CURSOR_HEADER
 
 # from metrics import test_database_connection
 
@@ -38,6 +40,23 @@ async def custom_http_exception_handler(request, exc):
     return FileResponse('static/index.html')
 
 
+@app.on_event("startup")
+async def connect_caml() -> None:
+    await async_caml_sdk.connect()
+    if async_caml_sdk.routing == ROUTING_MODE.GATEWAY:
+        # Served from the same event loop, on its own port so the workspace paths never clash with the api and the ui
+        app.state.gateway = await run_gateway(async_caml_sdk.create_gateway(), host=CONFIG["CAML_DOMAIN"],
+                                              port=int(CONFIG["CAML_GATEWAY_PORT"]))
+
+
+@app.on_event("shutdown")
+async def close_caml() -> None:
+    gateway = getattr(app.state, "gateway", None)
+    if gateway is not None:
+        await gateway.cleanup()
+    await async_caml_sdk.close()
+
+
 # @app.on_event("startup")
 # @repeat_every(seconds=60 * CONFIG['HEALTH_CHECK_INTERVAL'])  # in minutes
 # def perform_health_check() -> None:
@@ -53,6 +72,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 if __name__ == "__main__":
@@ -0,0 +1,2 @@
+from utils.etags import collection_etag, etag_matches, not_modified, resource_etag, set_etag
+from utils.single_flight import SingleFlight
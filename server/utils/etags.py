@@ -0,0 +1,63 @@
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+# Lets browsers keep the response but revalidate it (with If-None-Match) on every request
+CACHE_CONTROL = "no-cache"
+
+
+def resource_etag(resource_version: str) -> str:
+    """
+    A strong ETag of a single resource, the resourceVersion changes on every write to the resource
+    :param resource_version: The kubernetes resourceVersion
+    :return: The quoted ETag
+    """
+    return f'"{resource_version}"'
+
+
+def collection_etag(*parts) -> str:
+    """
+    A strong ETag of a list response, hashed from the collection version (or the items' versions) and the query
+    :param parts: JSON serializable values that identify the response
+    :return: The quoted ETag
+    """
+    digest = hashlib.sha256(json.dumps(parts, separators=(",", ":")).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Checks the request's If-None-Match header against the current ETag (weak comparison, as required for GET)
+    :param request: The incoming request
+    :param etag: The current quoted ETag
+    :return: True if the client's copy is up to date
+    """
+    if_none_match: Optional[str] = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any((candidate[2:] if candidate.startswith("W/") else candidate) == etag for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    """
+    :param etag: The current quoted ETag
+    :return: An empty 304 response
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: str) -> None:
+    """
+    Attaches the ETag to a full response
+    :param response: The route's response
+    :param etag: The current quoted ETag
+    :return: None
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,87 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from prometheus_client import Counter
+
+# Max seconds a follower waits for the leader's result before it makes its own call
+DEFAULT_FOLLOWER_TIMEOUT = 5
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "caml_single_flight_calls_total",
+    "Reads that went through a single-flight group, by role (leader calls upstream, followers share its result)",
+    ["group", "role"]
+)
+SINGLE_FLIGHT_FOLLOWER_TIMEOUTS = Counter(
+    "caml_single_flight_follower_timeouts_total",
+    "Followers that stopped waiting for the leader and called upstream on their own",
+    ["group"]
+)
+
+
+class LeaderCancelled(Exception):
+    """
+    Raised to the followers when the leader's request was cancelled (for example the client disconnected)
+    """
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads: the first caller of a key (the leader) makes the upstream call,
+    callers that arrive while it is in flight (the followers) await the same result instead of calling again.
+    Nothing is cached, the key is released as soon as the leader's call completes.
+    """
+
+    def __init__(self, group: str, follower_timeout: float = DEFAULT_FOLLOWER_TIMEOUT):
+        """
+        :param group: The metrics label of the group
+        :param follower_timeout: Max seconds a follower waits for the leader before calling upstream itself
+        """
+        self.group = group
+        self.follower_timeout = follower_timeout
+
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._leaders = SINGLE_FLIGHT_CALLS.labels(group, "leader")
+        self._followers = SINGLE_FLIGHT_CALLS.labels(group, "follower")
+        self._timeouts = SINGLE_FLIGHT_FOLLOWER_TIMEOUTS.labels(group)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Calls func once for all of the concurrent callers of the same key
+        :param key: Identifies the read, callers with an equal key share the result
+        :param func: The upstream call
+        :return: The (shared, treat as read only) result of func
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            return await self._follow(future, func)
+
+        future = asyncio.get_running_loop().create_future()
+        # Errors without followers must not be reported as never retrieved
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[key] = future
+        self._leaders.inc()
+
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelled())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    async def _follow(self, future: asyncio.Future, func: Callable[[], Awaitable[Any]]) -> Any:
+        self._followers.inc()
+        try:
+            # Shielded, so a follower that gives up never cancels the leader's call
+            return await asyncio.wait_for(asyncio.shield(future), self.follower_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts.inc()
+        except LeaderCancelled:
+            pass
+        return await func()
@@ -0,0 +1,74 @@
+"""
+Compares the decode time and peak memory of the proxy response modes on a large list response:
+EAGER (the full body into OrderedDicts), LAZY (LazyJSON, a single field is read) and STREAM (iter_json_array).
+Run from the repository root: python tests/benchmarks/bench_decoders.py
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+
+from caml.proxy.decoders import DEFAULT_STREAM_CHUNK_SIZE, LazyJSON, iter_json_array  # noqa: E402
+
+ITEMS = 20000
+ROUNDS = 3
+
+
+def build_body():
+    items = [{
+        "id": index,
+        "title": f"experiment-{index}",
+        "status": "success",
+        "tags": ["nightly", "gpu"],
+        "parameters": {"learning_rate": 0.001, "epochs": 30, "batch_size": 64},
+        "metrics": [{"name": "loss", "value": 0.1 * index}, {"name": "accuracy", "value": 0.9}],
+    } for index in range(ITEMS)]
+    return json.dumps({"items": items, "meta": {"total": ITEMS}}).encode()
+
+
+def eager(body):
+    return len(json.loads(body, object_pairs_hook=OrderedDict)["items"])
+
+
+def lazy(body):
+    return LazyJSON(body)["meta"]["total"]
+
+
+def stream(body):
+    chunks = (body[start:start + DEFAULT_STREAM_CHUNK_SIZE] for start in range(0, len(body), DEFAULT_STREAM_CHUNK_SIZE))
+    return sum(1 for _ in iter_json_array(chunks, key="items"))
+
+
+def measure(func, body):
+    """
+    @return: (result, [Float] best decode seconds, [Integer] peak bytes allocated), tracing memory slows the decode
+             down so it is measured in a separate run
+    """
+    elapsed = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = func(body)
+        elapsed.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(elapsed), peak
+
+
+def main():
+    body = build_body()
+    print(f"body: {len(body) / 2 ** 20:.1f}MB, {ITEMS} items")
+    for func in (eager, lazy, stream):
+        result, elapsed, peak = measure(func, body)
+        assert result == ITEMS
+        print(f"{func.__name__}: {elapsed * 1000:.0f}ms, peak {peak / 2 ** 20:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
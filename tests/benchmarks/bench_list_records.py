@@ -0,0 +1,94 @@
+"""
+Compares WorkspacesClient.list() (kubernetes models) with list_records() (raw json into __slots__ records)
+on a list of 10k workspace deployments, served from memory so only the client side is measured.
+Run from the repository root: python tests/benchmarks/bench_list_records.py
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from kubernetes import client
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+
+from caml.modules.workspaces import WorkspacesClient  # noqa: E402
+from caml.modules.workspaces.jupyter_notebook.jupyter_notebook import JupyterNotebook  # noqa: E402
+
+PROJECT = "bench"
+WORKSPACES = 10000
+ROUNDS = 3
+
+
+class _Response:
+    """
+    The part of a urllib3 response the kubernetes client reads
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def release_conn(self):
+        pass
+
+
+class _AppsApi:
+    def __init__(self, body):
+        self.body = body
+        self.api_client = client.ApiClient()
+
+    def list_namespaced_deployment(self, _preload_content=True, **kwargs):
+        response = _Response(self.body)
+        if not _preload_content:
+            return response
+        return self.api_client.deserialize(response, "V1DeploymentList")
+
+
+class _Api:
+    def __init__(self, body):
+        self.apps = _AppsApi(body)
+        self.core = None
+
+
+def build_body():
+    items = []
+    for index in range(WORKSPACES):
+        deployment = JupyterNotebook(project=PROJECT, name=f"notebook-{index}").deployment
+        deployment["metadata"]["creationTimestamp"] = "2026-01-01T00:00:00Z"
+        deployment["status"] = {"replicas": 1, "readyReplicas": 1, "availableReplicas": 1}
+        items.append(deployment)
+    return json.dumps({"apiVersion": "apps/v1", "kind": "DeploymentList", "metadata": {}, "items": items}).encode()
+
+
+def measure(func):
+    """
+    @return: (result, [Float] best seconds, [Integer] peak bytes allocated), tracing memory slows the list down so
+             it is measured in a separate run
+    """
+    elapsed = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = func()
+        elapsed.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(elapsed), peak
+
+
+def main():
+    body = build_body()
+    workspaces = WorkspacesClient(project=PROJECT, api=_Api(body))
+    print(f"body: {len(body) / 2 ** 20:.1f}MB, {WORKSPACES} deployments")
+
+    for func in (workspaces.list, workspaces.list_records):
+        result, elapsed, peak = measure(func)
+        assert len(result) == WORKSPACES
+        print(f"{func.__name__}: {elapsed * 1000:.0f}ms, peak {peak / 2 ** 20:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
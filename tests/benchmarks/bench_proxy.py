@@ -0,0 +1,94 @@
+"""
+Compares the request throughput of the pooled Proxy session with per call module level requests (the previous
+Proxy), sequential and from concurrent threads, against a local keep-alive HTTP server.
+The requests go through Proxy._http_method_switch, the part of call_api that sends the request and decodes the
+response (call_api itself also builds the cnvrg headers).
+Run from the repository root: python tests/benchmarks/bench_proxy.py
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+
+from caml.proxy.decoders import RESPONSE_MODE, LazyJSON  # noqa: E402
+from caml.proxy.proxy import HTTP, Proxy  # noqa: E402
+
+CALLS = 1000
+THREADS = 16
+BODY = b'{"data": {"id": "1", "attributes": {"title": "bench"}}}'
+HEADERS = {"Content-Type": "application/json"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are separate writes, with Nagle a kept alive connection waits for the delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def unpooled_call(url):
+    # The previous Proxy: a module level request (and a new connection) per call
+    response = requests.get(url, headers=HEADERS, cookies={}, verify=False)
+    return LazyJSON(response.content)["data"]["id"]
+
+
+def throughput(call):
+    """
+    @return: ([Float] sequential calls/s, [Float] concurrent calls/s)
+    """
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        call()
+    sequential = CALLS / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(lambda _: call(), range(CALLS)))
+    concurrent = CALLS / (time.perf_counter() - started)
+    return sequential, concurrent
+
+
+def main():
+    server = _HTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    url = f"http://{host}:{port}/api/v2/bench"
+
+    context = SimpleNamespace(domain=f"http://{host}:{port}", token="token", is_capi=False)
+    with Proxy(context, pool_maxsize=THREADS, check_certificate=False) as proxy:
+        def pooled_call():
+            return proxy._http_method_switch(HTTP.GET, url, None, HEADERS, {},
+                                             response_mode=RESPONSE_MODE.LAZY)["data"]["id"]
+
+        assert unpooled_call(url) == pooled_call() == "1"
+        for name, call in (("per call requests", lambda: unpooled_call(url)), ("pooled session", pooled_call)):
+            sequential, concurrent = throughput(call)
+            print(f"{name}: sequential {sequential:.0f} calls/s, "
+                  f"concurrent ({THREADS} threads) {concurrent:.0f} calls/s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Compares the cached manifest templates (caml.kube.templates) with the re-parsing replace_yaml_placeholders.
+Run from the repository root: python tests/benchmarks/bench_templates.py
+"""
+import os
+import pathlib
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+
+from caml.kube.templates import render_template  # noqa: E402
+from caml.kube.utils import replace_yaml_placeholders  # noqa: E402
+
+SCHEMA_PATH = os.path.join(pathlib.Path(__file__).parents[2], "caml/modules/workspaces/jupyter_notebook/schemas",
+                           "deployment.yaml")
+PLACEHOLDERS = {
+    "APP_LABEL": "jupyter-notebook",
+    "PROJECT_LABEL": "bench",
+    "COMPONENT_LABEL": "workspace",
+    "DEPLOYMENT_NAME": "workspace-bench-notebook",
+    "DEPLOYMENT_IMAGE": "jupyter/datascience-notebook",
+    "IMAGE_PULL_POLICY": "Always",
+    "BASE_URL": "/",
+    "ENV": [],
+    "WRAPPER_PORT": 8888,
+    "DEPLOYMENT_CPU_LIMIT": 2,
+    "DEPLOYMENT_CPU_REQUEST": 2,
+    "DEPLOYMENT_MEMORY_LIMIT": "2G",
+    "DEPLOYMENT_MEMORY_REQUEST": "2G",
+}
+# replace_yaml_placeholders substitutes text, the values are written as yaml
+TEXT_PLACEHOLDERS = {key: "[]" if value == [] else str(value) for key, value in PLACEHOLDERS.items()}
+
+ROUNDS = 1000
+
+
+def main():
+    assert render_template(SCHEMA_PATH, PLACEHOLDERS) == replace_yaml_placeholders(SCHEMA_PATH, TEXT_PLACEHOLDERS)
+
+    results = {
+        "replace_yaml_placeholders": timeit.timeit(lambda: replace_yaml_placeholders(SCHEMA_PATH, TEXT_PLACEHOLDERS),
+                                                   number=ROUNDS),
+        "render_template": timeit.timeit(lambda: render_template(SCHEMA_PATH, PLACEHOLDERS), number=ROUNDS),
+    }
+    for name, seconds in results.items():
+        print(f"{name}: {seconds / ROUNDS * 1e6:.1f}us per manifest, {ROUNDS / seconds:.0f} manifests/s")
+    print(f"speedup: {results['replace_yaml_placeholders'] / results['render_template']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
+import json
 import os
 import sys
 import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 import random
 
@@ -26,3 +31,93 @@ def get_domain():
 @pytest.fixture(scope="package")
 def domain():
     return get_domain()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops the connects of a burst of concurrent clients
+    request_queue_size = 128
+
+
+class FakeApiServer:
+    """
+    A local stand-in for the kubernetes API server that answers every list with the projects after a delay (and
+    every watch with an empty stream), and records how many requests it served at the same time
+    """
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.projects = [self.project(name) for name in ("alpha", "beta", "gamma")]
+        self.requests = 0
+        self.lists = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = _HTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @staticmethod
+    def project(name):
+        return {
+            "apiVersion": "extensions.caml.io/v1",
+            "kind": "Project",
+            "metadata": {"name": name, "namespace": "caml-compute", "resourceVersion": "1"},
+            "spec": {"name": name, "namespace": "caml-compute"},
+        }
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                # A watch ends after the delay without events, the informer then starts its next watch
+                is_watch = "watch=true" in self.path.lower()
+                with server._lock:
+                    server.requests += 1
+                    server.lists += not is_watch
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.delay)
+                    body = b"" if is_watch else json.dumps({
+                        "apiVersion": "extensions.caml.io/v1",
+                        "kind": "ProjectList",
+                        "metadata": {"resourceVersion": "1"},
+                        "items": server.projects,
+                    }).encode()
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture(scope="function")
+def fake_api_server():
+    server = FakeApiServer()
+    server.start()
+    yield server
+    server.stop()
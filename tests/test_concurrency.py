@@ -0,0 +1,69 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kubernetes import client
+from kubernetes_asyncio import client as async_client
+
+from caml.kube.api import KubeApi
+from caml.kube.informer import CONSISTENCY
+from caml.modules.projects import AsyncProjectsClient, ProjectsClient
+
+CONCURRENT_CALLS = 10
+
+
+def test_sync_clients_share_the_connection_pool(fake_api_server):
+    api = KubeApi(configuration=client.Configuration(host=fake_api_server.url), pool_size=CONCURRENT_CALLS)
+    projects = ProjectsClient(consistency=CONSISTENCY.LIVE, api=api)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=CONCURRENT_CALLS) as executor:
+        results = list(executor.map(lambda _: projects.list(), range(CONCURRENT_CALLS)))
+    elapsed = time.monotonic() - started
+
+    assert all([project.name for project in result] == ["alpha", "beta", "gamma"] for result in results)
+    assert fake_api_server.max_in_flight > 1
+    # Serialized calls would take CONCURRENT_CALLS * delay
+    assert elapsed < CONCURRENT_CALLS * fake_api_server.delay / 2
+
+
+def test_async_clients_run_concurrently(fake_api_server):
+    async def list_concurrently():
+        api_client = async_client.ApiClient(async_client.Configuration(host=fake_api_server.url))
+        try:
+            projects = AsyncProjectsClient(api_client, consistency=CONSISTENCY.LIVE)
+            started = time.monotonic()
+            results = await asyncio.gather(*[projects.list() for _ in range(CONCURRENT_CALLS)])
+            return results, time.monotonic() - started
+        finally:
+            await api_client.close()
+
+    results, elapsed = asyncio.run(list_concurrently())
+
+    assert all([project.name for project in result] == ["alpha", "beta", "gamma"] for result in results)
+    assert fake_api_server.max_in_flight > 1
+    assert elapsed < CONCURRENT_CALLS * fake_api_server.delay / 2
+
+
+def test_async_clients_do_not_block_the_event_loop(fake_api_server):
+    async def list_while_ticking():
+        api_client = async_client.ApiClient(async_client.Configuration(host=fake_api_server.url))
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        try:
+            projects = AsyncProjectsClient(api_client, consistency=CONSISTENCY.LIVE)
+            await projects.list()
+            return ticks
+        finally:
+            ticker.cancel()
+            await api_client.close()
+
+    # A blocking call would starve the ticker for the whole delay
+    assert asyncio.run(list_while_ticking()) >= fake_api_server.delay / 0.01 / 2
@@ -0,0 +1,30 @@
+import time
+
+from kubernetes import client
+
+from caml.kube.api import KubeApi
+from caml.modules.projects import ProjectsClient
+from caml.modules.projects.projects_client import INFORMER_SYNC_TIMEOUT
+
+
+def test_cached_reads_resync_after_close(fake_api_server):
+    projects = ProjectsClient(api=KubeApi(configuration=client.Configuration(host=fake_api_server.url)))
+    try:
+        assert [project.name for project in projects.list()] == ["alpha", "beta", "gamma"]
+        assert projects.informer.is_synced
+
+        projects.close()
+        assert not projects.informer.is_synced
+        assert projects.informer.list() == []
+
+        fake_api_server.projects = fake_api_server.projects[:1]
+        started = time.monotonic()
+        projects.informer.start()
+        assert projects.informer.wait_for_sync(INFORMER_SYNC_TIMEOUT)
+        assert time.monotonic() - started < INFORMER_SYNC_TIMEOUT / 2
+
+        # The restarted informer lists again instead of resuming the stopped watch
+        assert fake_api_server.lists == 2
+        assert [project.name for project in projects.list()] == ["alpha"]
+    finally:
+        projects.close()